@@ -1,3 +1,5 @@
+import os
+import sys
 import numpy as np
 import pandas as pd
 
@@ -12,6 +14,9 @@ from ta.momentum import ROCIndicator
 from ta.volume import ChaikinMoneyFlowIndicator
 from ta.trend import ADXIndicator
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Gui'))
+from indicator_engine import rsi_smooth
+
 
 #Simple Moving Average - SMA
 def get_SMA(df, window):
@@ -37,50 +42,11 @@ def get_MFI(df, window):
     for i in window:
         df[f"money_flow_index_{i}"] = money_flow_index(df['High'], df['Low'], df['Close'], df['Volume'], window=i)  
 
-#Relative Strength Index - RSI
+#Relative Strength Index - RSI (smoothed, vectorized kernel in Gui/indicator_engine.py)
 def get_RSI_smooth(df, window):
-
-    prev_rsi = np.inf
-    prev_avg_gain = np.inf
-    prev_avg_loss = np.inf
-    rolling_count = 0
-
-    def calculate_RSI(series, period):
-        # nonlocal rolling_count
-        nonlocal prev_avg_gain
-        nonlocal prev_avg_loss
-        nonlocal rolling_count
-
-        curr_gains = series.where(series >= 0, 0)  # replace 0 where series not > 0
-        curr_losses = np.abs(series.where(series < 0, 0))
-        avg_gain = curr_gains.sum() / period  # * 100
-        avg_loss = curr_losses.sum() / period  # * 100
-        rsi = -1
-
-        if rolling_count == 0:
-            # first RSI calculation
-            rsi = 100 - (100 / (1 + (avg_gain / avg_loss)))
-            # print(rolling_count,"rs1=",rs, rsi)
-        else:
-            # smoothed RSI
-            # current gain and loss should be used, not avg_gain & avg_loss
-            rsi = 100 - (100 / (1 + ((prev_avg_gain * (period - 1) + curr_gains.iloc[-1]) /
-                                     (prev_avg_loss * (period - 1) + curr_losses.iloc[-1]))))
-            # print(rolling_count,"rs2=",rs, rsi)
-
-        # df['rsi_'+str(period)+'_own'][period + rolling_count] = rsi
-        rolling_count = rolling_count + 1
-        prev_avg_gain = avg_gain
-        prev_avg_loss = avg_loss
-        return rsi
-
-    diff = df['Close'].diff()[1:]  # skip na
-    for i in window:
-        df['rsi_' + str(i)] = np.nan
-        # df['rsi_'+str(period)+'_own_1'] = np.nan
-        rolling_count = 0
-        res = diff.rolling(i).apply(calculate_RSI, args=(i,), raw=False)
-        df['rsi_' + str(i)][1:] = res
+    rsi = rsi_smooth(df['Close'].to_numpy(dtype=float), window)
+    for k, i in enumerate(window):
+        df['rsi_' + str(i)] = rsi[:, k]
     return df
 
 #Williams %R
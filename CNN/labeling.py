@@ -0,0 +1,124 @@
+import numpy as np
+
+
+def sliding_max(values, window):
+    """
+    Maximum jedes Fensters values[i:i + window] in O(n), unabhängig von der Fenstergrösse
+    (van Herk/Gil-Werman: Präfix- und Suffix-Maxima in Blöcken der Länge window).
+
+    Parameter:
+    - values: 1D array ohne NaN
+    - window: Fenstergrösse >= 1
+
+    Rückgabewert:
+    - maxima: array mit len(values) - window + 1 Werten (leer, falls das Fenster länger ist)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if window > n:
+        return np.empty(0)
+    blocks = np.concatenate([values, np.full(-n % window, -np.inf)]).reshape(-1, window)
+    prefix = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    # window i..i+window-1 = end of the block of i (suffix) + start of the block of i+window-1 (prefix)
+    return np.maximum(suffix[:n - window + 1], prefix[window - 1:n])
+
+
+def sliding_min(values, window):
+    return -sliding_max(-np.asarray(values, dtype=np.float64), window)
+
+
+def label_codes_MID(close, window_size=11):
+    """
+    Labels von get_labels_MID als Zahlen: SELL => 0, BUY => 1, HOLD => 2, NaN am Anfang und Ende.
+
+    Das Label gehört zur Mitte jedes Fensters. Die Schleife im Notebook sucht das erste Maximum und das erste
+    Minimum im Fenster (NaN wird übersprungen). Die Mitte ist das erste Maximum, wenn sie grösser als alles links
+    von ihr und mindestens so gross wie das ganze Fenster ist (Minimum analog).
+
+    Parameter:
+    - close: 1D array mit den Preisen eines Tickers
+    - window_size: beliebige Fenstergrösse >= 1
+
+    Rückgabewert:
+    - labels: float array mit len(close) Werten
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    labels = np.full(n, np.nan)
+    if window_size > n:
+        return labels
+
+    half = (window_size - 1) // 2
+    middle = close[half:n - window_size + 1 + half]
+    high = np.where(np.isnan(close), -np.inf, close)
+    low = np.where(np.isnan(close), np.inf, close)
+    if half > 0:
+        left_max = sliding_max(high, half)[:len(middle)]
+        left_min = sliding_min(low, half)[:len(middle)]
+    else:
+        left_max = np.full(len(middle), -np.inf)
+        left_min = np.full(len(middle), np.inf)
+    is_max = (middle > left_max) & (middle >= sliding_max(high, window_size))
+    is_min = (middle < left_min) & (middle <= sliding_min(low, window_size))
+
+    labels[half:n - window_size + 1 + half] = np.where(is_max, 0, np.where(is_min, 1, 2))
+    return labels
+
+
+def labels_END(close, windowSize=11):
+    """
+    Labels von get_labels_END: Zeile i bekommt das Label des Fensters close[i:i + windowSize + 1].
+    SELL wenn der letzte Wert ein neues Minimum ist, BUY wenn er ein neues Maximum ist, sonst HOLD
+    (wie in der Schleife im Notebook: ist der erste Wert NaN, bleibt es HOLD). Die letzten windowSize Zeilen sind 999.
+
+    Rückgabewert:
+    - labels: object array mit 'SELL', 'BUY', 'HOLD' und 999
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    labels = np.full(n, 999, dtype=object)
+    if windowSize >= n:
+        return labels
+
+    last = close[windowSize:]
+    # the loop starts with the first value of the window and ignores NaN, the last value is compared to the rest
+    before_max = sliding_max(np.where(np.isnan(close), -np.inf, close)[:-1], windowSize)
+    before_min = sliding_min(np.where(np.isnan(close), np.inf, close)[:-1], windowSize)
+    first_valid = ~np.isnan(close[:n - windowSize])
+    sell = first_valid & (last < before_min)
+    buy = first_valid & (last > before_max)
+
+    labels[:n - windowSize] = np.where(sell, 'SELL', np.where(buy, 'BUY', 'HOLD'))
+    return labels
+
+
+def get_labels_END(df, windowSize=11):
+    """
+    Vektorisierte Version von get_labels_END aus den Notebooks (gleiche Spalte Labels_END).
+    """
+    # assigned as a list like in the notebook, pandas infers the same dtype
+    df['Labels_END'] = labels_END(df['Close'].to_numpy(), windowSize).tolist()
+
+    # Replace the 999 with NaN
+    df['Labels_END'] = df['Labels_END'].replace(999, np.nan)
+
+    print('Labeling END done!')
+
+    return df
+
+
+def get_labels_MID(df, col_name, window_size=11):
+    """
+    Vektorisierte Version von get_labels_MID aus den Notebooks (gleiche Spalte Labels_MID).
+
+    Parameter:
+    - df: DataFrame eines Tickers, wird direkt verändert
+    - col_name: Spalte mit den Preisen, z.B. 'Close'
+    """
+    df['Labels_MID'] = label_codes_MID(df[col_name].to_numpy(), window_size)
+
+    # Replace the 0, 1, 2 with BUY, SELL, HOLD
+    df['Labels_MID'] = df['Labels_MID'].replace(0, 'SELL')
+    df['Labels_MID'] = df['Labels_MID'].replace(1, 'BUY')
+    df['Labels_MID'] = df['Labels_MID'].replace(2, 'HOLD')
@@ -0,0 +1,395 @@
+import os
+import sys
+import time
+import argparse
+from collections import Counter
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+from sklearn.model_selection import train_test_split
+import tensorflow as tf
+from tensorflow import keras
+
+from labeling import label_codes_MID
+
+# feature store, model bundles and the scaling of predict_test_data.py are shared with the GUI
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Gui'))
+from feature_store import iter_table, table_columns, find_table
+from model_registry import save_bundle, SelectedFeatureScaler, CLASSES
+from predict_test_data import feature_columns
+
+# the models are channels_last (the GUI modules set channels_first for loading)
+keras.backend.set_image_data_format('channels_last')
+
+
+TRAIN, VALIDATION, TEST = 0, 1, 2
+
+
+def label_rows(data_path, window_size=11, chunk_size=100000):
+    """
+    Labels_MID für alle Zeilen der Feature-Tabelle (Reihenfolge wie iter_table), pro Ticker nach Datum sortiert.
+    Hat die Tabelle bereits eine Spalte Labels_MID (merged_data_large_{version}.csv der Notebooks), wird diese verwendet.
+
+    Rückgabewert:
+    - y: float array mit BUY: 0 | SELL: 1 | HOLD: 2 und NaN für Zeilen ohne Label (Rand jedes Tickers)
+    - dates: Datum jeder Zeile (datetime64)
+    """
+    path = find_table(data_path)
+    if path is None:
+        raise FileNotFoundError(f"no feature table at {data_path} (.parquet, parquet folder or .csv)")
+    names = list(pd.read_csv(path, nrows=0).columns) if path.endswith('.csv') else table_columns(path)
+    columns = ['Ticker', 'Date', 'Close'] + (['Labels_MID'] if 'Labels_MID' in names else [])
+    df = pd.concat(list(iter_table(data_path, chunk_size, columns=columns)), ignore_index=True)
+    dates = pd.to_datetime(df['Date']).to_numpy()
+    if 'Labels_MID' in df.columns:
+        return df['Labels_MID'].map({name: code for code, name in enumerate(CLASSES)}).to_numpy(dtype=np.float64), dates
+
+    tickers = df['Ticker'].to_numpy()
+    order = np.lexsort((dates, tickers))
+    bounds = np.flatnonzero(tickers[order][1:] != tickers[order][:-1]) + 1
+    close = df['Close'].to_numpy(dtype=np.float64)[order]
+    codes = np.concatenate([label_codes_MID(part, window_size) for part in np.split(close, bounds)])
+    # labeling.py codes SELL: 0 | BUY: 1 (as in the notebook), the model uses BUY: 0 | SELL: 1
+    y = np.empty(len(df))
+    y[order] = np.where(codes == 0, 1, np.where(codes == 1, 0, codes))
+    return y, dates
+
+
+def split_rows(y, dates, start=None, end=None, test_size=0.2, cv_size=0.2, seed=2):
+    """
+    Train/Validierung/Test wie im Notebook: zwei stratifizierte train_test_split (80/20, dann 80/20 von Train)
+    mit random_state=2, aber auf Zeilennummern statt auf dem DataFrame (gleiche Aufteilung, ohne Features im Speicher).
+
+    Rückgabewert:
+    - split: int8 array, TRAIN: 0 | VALIDATION: 1 | TEST: 2 | -1 = nicht verwendet (kein Label oder ausserhalb start-end)
+    """
+    use = ~np.isnan(y)
+    if start:
+        use &= dates >= np.datetime64(pd.to_datetime(start))
+    if end:
+        use &= dates <= np.datetime64(pd.to_datetime(end))
+    rows = np.flatnonzero(use)
+    train, test = train_test_split(rows, train_size=1 - test_size, test_size=test_size, random_state=seed,
+                                   shuffle=True, stratify=y[rows])
+    train, cv = train_test_split(train, train_size=1 - cv_size, test_size=cv_size, random_state=seed,
+                                 shuffle=True, stratify=y[train])
+    split = np.full(len(y), -1, dtype=np.int8)
+    split[train], split[cv], split[test] = TRAIN, VALIDATION, TEST
+    return split
+
+
+def split_chunks(data_path, columns, split, part, chunk_size=100000):
+    # rows of one part in storage order: (row numbers, DataFrame with the columns in the given order)
+    offset = 0
+    for chunk in iter_table(data_path, chunk_size, columns=columns):
+        mask = split[offset:offset + len(chunk)] == part
+        if mask.any():
+            yield offset + np.flatnonzero(mask), chunk.loc[mask, columns]
+        offset += len(chunk)
+
+
+def fit_scaler(data_path, columns, split, chunk_size=100000):
+    # MinMaxScaler on the training rows, fitted chunk by chunk (same min/max as fit on all rows)
+    scaler = MinMaxScaler(feature_range=(0, 1))
+    for _, chunk in split_chunks(data_path, columns, split, TRAIN, chunk_size):
+        scaler.partial_fit(chunk.astype(np.float64))
+    return scaler
+
+
+def select_k_best(data_path, columns, scaler, split, y, k=100, chunk_size=100000):
+    """
+    SelectKBest(chi2, k) wie im Notebook, über die skalierten Trainingszeilen aufsummiert:
+    chi2 braucht nur die Summe jedes Features pro Klasse.
+
+    Rückgabewert:
+    - feature_indices: Indizes der k Features mit dem grössten chi2 (aufsteigend, wie get_support(indices=True))
+    """
+    observed = np.zeros((len(CLASSES), len(columns)))
+    counts = np.zeros(len(CLASSES))
+    for rows, chunk in split_chunks(data_path, columns, split, TRAIN, chunk_size):
+        one_hot = np.eye(len(CLASSES))[y[rows].astype(int)]
+        observed += one_hot.T @ scaler.transform(chunk.astype(np.float64))
+        counts += one_hot.sum(axis=0)
+    present = counts > 0
+    observed, counts = observed[present], counts[present]
+
+    # same formula as sklearn.feature_selection.chi2
+    expected = np.outer(counts / counts.sum(), observed.sum(axis=0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scores = ((observed - expected) ** 2 / expected).sum(axis=0)
+    scores = np.where(np.isnan(scores), np.finfo(scores.dtype).min, scores)
+    return np.sort(np.argsort(scores, kind='mergesort')[-k:])
+
+
+def smote_training_set(data_path, columns, split, y, k=100, seed=2, chunk_size=100000):
+    """
+    Ablauf des Notebooks mit SMOTE: Scaler, SMOTE und SelectKBest auf allen Trainingszeilen im Speicher
+    (SMOTE braucht die Nachbarn aller Zeilen, das Trainingsset muss in den Speicher passen).
+
+    Rückgabewert:
+    - scaler, feature_indices, x_train (skaliert, nur ausgewählte Features), y_train (inkl. künstlicher Zeilen)
+    """
+    from imblearn.over_sampling import SMOTE
+    from sklearn.feature_selection import SelectKBest, chi2
+
+    parts = list(split_chunks(data_path, columns, split, TRAIN, chunk_size))
+    x_train = pd.concat([chunk for _, chunk in parts]).astype(np.float64)
+    y_train = y[np.concatenate([rows for rows, _ in parts])].astype(int)
+    scaler = MinMaxScaler(feature_range=(0, 1))
+    x_train = scaler.fit_transform(x_train)
+    x_train, y_train = SMOTE(random_state=seed).fit_resample(x_train, y_train)
+    print(f"SMOTE: {Counter(y_train)}")
+    feature_indices = SelectKBest(chi2, k=k).fit(x_train, y_train).get_support(indices=True)
+    return scaler, feature_indices, x_train[:, feature_indices], y_train
+
+
+def class_weights(y_train):
+    # same weights as the notebook: largest class / class size
+    counter = Counter(y_train.tolist())
+    max_val = float(max(counter.values()))
+    return {int(class_id): max_val / num_images for class_id, num_images in counter.items()}
+
+
+def finish_dataset(ds, batch_size=64, one_hot=False, shuffle_buffer=0, seed=2, threads=0):
+    # shuffle, float32 batches with 3 (identical) channels, prefetch the next batch while the model trains
+    if shuffle_buffer:
+        ds = ds.shuffle(shuffle_buffer, seed=seed)
+
+    def add_channels(x, labels):
+        x = tf.repeat(x[..., tf.newaxis], 3, axis=-1)
+        return x, tf.one_hot(labels, len(CLASSES)) if one_hot else labels
+
+    ds = ds.batch(batch_size).map(add_channels, num_parallel_calls=tf.data.AUTOTUNE)
+    if threads:
+        # own thread pool of this size instead of one thread per CPU (parallel trainings, see walk_forward.py)
+        options = tf.data.Options()
+        options.threading.private_threadpool_size = threads
+        ds = ds.with_options(options)
+    return ds.prefetch(tf.data.AUTOTUNE)
+
+
+def make_dataset(data_path, selected, dtype, split, y, part, batch_size=64, one_hot=False, cache='', shuffle_buffer=0,
+                 seed=2, chunk_size=100000, threads=0):
+    """
+    tf.data Pipeline für einen Teil (TRAIN, VALIDATION oder TEST): liest nur die ausgewählten Spalten chunkweise
+    aus dem Feature Store, skaliert und formt die Bilder parallel (map), cached die Bilder, mischt und liefert
+    float32 Batches mit prefetch. Die Bilder sind bytegleich zu den Bildern in predict_test_data.py.
+
+    Parameter:
+    - selected: SelectedFeatureScaler mit Scaler, ausgewählten Features und ihren Spaltennamen
+    - dtype: Datentyp der Features im Speicher (np.float32 für Parquet, siehe feature_columns)
+    - cache: '' = Bilder im Arbeitsspeicher cachen, sonst Dateipfad (für Daten grösser als der Arbeitsspeicher), None = kein Cache
+    """
+    dim = int(np.sqrt(len(selected.columns)))
+    scale, minimum = tf.constant(selected.scale), tf.constant(selected.min)
+
+    def chunks():
+        for rows, chunk in split_chunks(data_path, selected.columns, split, part, chunk_size):
+            yield chunk.to_numpy(dtype=dtype), y[rows].astype(np.int32)
+
+    def scale_and_reshape(x, labels):
+        # same arithmetic as MinMaxScaler.transform: float32 input is rounded to float32 after the multiplication
+        x = tf.cast(x, tf.float64) * scale
+        if dtype == np.float32:
+            x = tf.cast(tf.cast(x, tf.float32), tf.float64)
+        x = tf.cast(x + minimum, tf.float32)
+        return tf.reshape(x, (-1, dim, dim)), labels
+
+    signature = (tf.TensorSpec((None, len(selected.columns)), tf.as_dtype(dtype)), tf.TensorSpec((None,), tf.int32))
+    ds = tf.data.Dataset.from_generator(chunks, output_signature=signature)
+    ds = ds.map(scale_and_reshape, num_parallel_calls=tf.data.AUTOTUNE).unbatch()
+    # known number of rows: keras knows the steps per epoch from the first epoch on
+    ds = ds.apply(tf.data.experimental.assert_cardinality(int(np.sum(split == part))))
+    if cache is not None:
+        ds = ds.cache(f'{cache}_{part}' if cache else '')
+    return finish_dataset(ds, batch_size, one_hot, shuffle_buffer, seed, threads)
+
+
+def build_model(model_type, dim):
+    """
+    Modelle aus CNN_based_TradingBot_V2.ipynb: 1 = Model1 (softmax), 2 = Model2 (BatchNormalization, sigmoid).
+    """
+    layers = keras.layers
+    if model_type == 1:
+        model = keras.Sequential([
+            keras.Input((dim, dim, 3)),
+            layers.Conv2D(32, kernel_size=(3, 3), activation='relu'),
+            layers.MaxPooling2D(pool_size=(2, 2)),
+            layers.Dropout(0.25),
+            layers.Conv2D(16, kernel_size=(3, 3), activation='relu'),
+            layers.MaxPooling2D(pool_size=(2, 2)),
+            layers.Dropout(0.25),
+            layers.Flatten(),
+            layers.Dense(128, activation='relu'),
+            layers.Dropout(0.2),
+            layers.Dense(64, activation='relu'),
+            layers.Dropout(0.2),
+            layers.Dense(3, activation='softmax'),
+        ])
+        model.compile(optimizer='adam', loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+        return model
+
+    model = keras.Sequential([keras.Input((dim, dim, 3))])
+    for filters in (16, 32, 64):
+        model.add(layers.Conv2D(filters, (2, 2), activation='relu', padding='same'))
+        model.add(layers.BatchNormalization())
+        model.add(layers.MaxPooling2D(pool_size=(2, 2)))
+        model.add(layers.Dropout(0.2))
+    model.add(layers.Flatten())
+    model.add(layers.Dense(512, activation='relu'))
+    model.add(layers.BatchNormalization())
+    model.add(layers.Dropout(0.2))
+    model.add(layers.Dense(3, activation='sigmoid'))
+    model.compile(loss='binary_crossentropy', optimizer='adam', metrics=['accuracy'])
+    return model
+
+
+def accuracy(model, ds):
+    # accuracy from the predicted class (model.evaluate reports binary accuracy for Model2)
+    correct = total = 0
+    for x, labels in ds:
+        y_pred = np.argmax(model.predict_on_batch(x), axis=1)
+        correct += int(np.sum(y_pred == labels.numpy()))
+        total += len(y_pred)
+    return correct / total if total else float('nan')
+
+
+def fit_model(data_path, columns, dtype, split, y, model_type=1, smote=False, k=100, batch_size=64, epochs=300,
+              patience=20, shuffle_buffer=100000, cache='', seed=2, chunk_size=100000, threads=0):
+    """
+    Scaler, Feature-Auswahl und Training auf den Zeilen TRAIN von split, EarlyStopping auf den Zeilen VALIDATION.
+
+    Parameter:
+    - columns, dtype: Feature-Spalten des Feature Store (siehe feature_columns)
+    - split: TRAIN/VALIDATION/TEST pro Zeile (siehe split_rows), y: Labels pro Zeile (siehe label_rows)
+    - threads: Anzahl Threads der tf.data Pipelines (0 = alle CPUs)
+
+    Rückgabewert:
+    - model, scaler, selected (SelectedFeatureScaler mit den ausgewählten Features), history, weights (Class Weights)
+    """
+    start_time = time.perf_counter()
+    one_hot = model_type == 2
+    if smote:
+        scaler, feature_indices, x_train, y_train = smote_training_set(data_path, columns, split, y, k, seed, chunk_size)
+        dim = int(np.sqrt(len(feature_indices)))
+        images = np.ascontiguousarray(x_train, dtype=np.float32).reshape(len(x_train), dim, dim)
+        train_ds = finish_dataset(tf.data.Dataset.from_tensor_slices((images, y_train.astype(np.int32))),
+                                  batch_size, one_hot, shuffle_buffer, seed, threads)
+    else:
+        scaler = fit_scaler(data_path, columns, split, chunk_size)
+        feature_indices = select_k_best(data_path, columns, scaler, split, y, k, chunk_size)
+        y_train = y[split == TRAIN].astype(int)
+    selected = SelectedFeatureScaler(scaler, feature_indices, columns)
+    dim = int(np.sqrt(len(feature_indices)))
+    print(f"Scaler fitted, {len(feature_indices)} features selected ({time.perf_counter() - start_time:.1f}s)")
+
+    if not smote:
+        train_ds = make_dataset(data_path, selected, dtype, split, y, TRAIN, batch_size, one_hot, cache, shuffle_buffer,
+                                seed, chunk_size, threads)
+    validation_ds = make_dataset(data_path, selected, dtype, split, y, VALIDATION, batch_size, one_hot, cache, 0, seed,
+                                 chunk_size, threads)
+
+    weights = class_weights(y_train)
+    print('Class weights: ', weights)
+    model = build_model(model_type, dim)
+    if model_type == 1:
+        early_stopping = keras.callbacks.EarlyStopping(monitor='val_loss', patience=patience, verbose=1, mode='auto',
+                                                       restore_best_weights=True, start_from_epoch=50)
+    else:
+        early_stopping = keras.callbacks.EarlyStopping(monitor='val_loss', patience=patience, verbose=1, mode='auto')
+    history = model.fit(train_ds, validation_data=validation_ds, epochs=epochs, callbacks=[early_stopping],
+                        class_weight=weights, verbose=2)
+    return model, scaler, selected, history, weights
+
+
+def train(data_path, version, model_type=1, smote=False, k=100, window_size=11, start=None, end=None, batch_size=64,
+          epochs=300, patience=20, shuffle_buffer=100000, cache='', seed=2, chunk_size=100000,
+          registry='../Gui/registry', models_folder=None):
+    """
+    Trainiert eine Modellversion aus dem Feature Store (merged_data von prepare_test_data.py) und speichert
+    Modell, Scaler und ausgewählte Features als Bundle in der Registry (wie model_registry.py build).
+
+    Ablauf wie im Notebook: Labels_MID, stratifizierter Split, MinMaxScaler auf Train, optional SMOTE,
+    SelectKBest(chi2, k), Bilder (dim x dim x 3), Class Weights, EarlyStopping auf val_loss.
+    Ohne SMOTE wird nie die ganze Feature-Matrix geladen: jeder Schritt liest den Feature Store chunkweise.
+
+    Rückgabewert:
+    - manifest: Manifest des gespeicherten Bundles (info enthält Parameter, Anzahl Zeilen und Accuracy)
+    """
+    keras.utils.set_random_seed(seed)
+    start_time = time.perf_counter()
+    columns, dtype = feature_columns(data_path)
+
+    y, dates = label_rows(data_path, window_size, chunk_size)
+    split = split_rows(y, dates, start, end, seed=seed)
+    rows = {name: int(np.sum(split == part)) for name, part in (('train', TRAIN), ('validation', VALIDATION), ('test', TEST))}
+    print(f"Rows: {rows} ({time.perf_counter() - start_time:.1f}s)")
+
+    model, scaler, selected, history, weights = fit_model(data_path, columns, dtype, split, y, model_type, smote, k,
+                                                          batch_size, epochs, patience, shuffle_buffer, cache, seed,
+                                                          chunk_size)
+    feature_indices = selected.feature_indices
+
+    # the test set is read once, it is not cached
+    test_ds = make_dataset(data_path, selected, dtype, split, y, TEST, batch_size, cache=None, chunk_size=chunk_size)
+    test_accuracy = accuracy(model, test_ds)
+    print(f"Accuracy on test data: {test_accuracy:.4f} ({time.perf_counter() - start_time:.1f}s)")
+
+    info = {
+        'data': data_path,
+        'model': model_type,
+        'smote': smote,
+        'k': int(k),
+        'window_size': window_size,
+        'start': start,
+        'end': end,
+        'seed': seed,
+        'batch_size': batch_size,
+        'rows': rows,
+        'class_weights': {CLASSES[class_id]: weight for class_id, weight in sorted(weights.items())},
+        'epochs': len(history.history['loss']),
+        'val_accuracy': float(history.history['val_accuracy'][-1]),
+        'test_accuracy': test_accuracy,
+    }
+    manifest = save_bundle(version, model, scaler, feature_indices, registry, feature_columns=columns, info=info)
+    print(f"Bundle saved to: {os.path.join(registry, version)} ({manifest['checksum'][:12]})")
+
+    if models_folder:
+        # the three files of the notebooks, for older scripts
+        os.makedirs(models_folder, exist_ok=True)
+        model.save(os.path.join(models_folder, f'stock_prediction_model_{version}.keras'))
+        joblib.dump(scaler, os.path.join(models_folder, f'scaler_{version}.pkl'))
+        np.savetxt(os.path.join(models_folder, f'selected_features_{version}.txt'), feature_indices, fmt='%d')
+        print("Model files saved to:", models_folder)
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train a CNN model version from the feature store and save it as a registry bundle.")
+    parser.add_argument("--data", default='../Gui/merged_data/merged_data_large', help="merged features without file ending (parquet or csv)")
+    parser.add_argument("--version", required=True, help="name of the model version, e.g. V4_Model1_ohneSmote")
+    parser.add_argument("--model", type=int, choices=[1, 2], default=1, help="1 = Model1 (softmax), 2 = Model2 (BatchNormalization)")
+    parser.add_argument("--smote", action='store_true', help="oversample the training set with SMOTE (in memory, needs imbalanced-learn)")
+    parser.add_argument("--k", type=int, default=100, help="number of features selected with chi2 (square number, default: 100)")
+    parser.add_argument("--window", type=int, default=11, help="window size of the labels (default: 11)")
+    parser.add_argument("--start", default=None, help="only use rows from this date")
+    parser.add_argument("--end", default=None, help="only use rows until this date")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--epochs", type=int, default=300)
+    parser.add_argument("--patience", type=int, default=20, help="early stopping patience on val_loss (default: 20)")
+    parser.add_argument("--shuffle-buffer", type=int, default=100000, help="rows in the shuffle buffer (default: 100000)")
+    parser.add_argument("--cache", default='', help="cache the images in files with this prefix instead of in memory")
+    parser.add_argument("--seed", type=int, default=2, help="random state of the split, SMOTE, shuffling and weights (default: 2)")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="rows read from the feature store at once (default: 100000)")
+    parser.add_argument("--deterministic", action='store_true', help="deterministic TensorFlow ops (slower, same model on every run)")
+    parser.add_argument("--registry", default='../Gui/registry')
+    parser.add_argument("--models-folder", default=None, help="also save the .keras, scaler .pkl and selected features .txt files here")
+    args = parser.parse_args()
+
+    if args.deterministic:
+        tf.config.experimental.enable_op_determinism()
+    train(args.data, args.version, args.model, args.smote, args.k, args.window, args.start, args.end, args.batch_size,
+          args.epochs, args.patience, args.shuffle_buffer, args.cache, args.seed, args.chunk_size, args.registry,
+          args.models_folder)
@@ -0,0 +1,280 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from tensorflow import keras
+from sklearn.metrics import precision_recall_fscore_support
+
+from train import TRAIN, VALIDATION, TEST, label_rows, fit_model, make_dataset, split_chunks, feature_columns
+# train.py adds the Gui folder to sys.path
+from feature_store import load_table
+from model_registry import CLASSES
+from backtest import Backtest, MODES, performance
+from membership_index import MembershipIndex
+from signal_index import sort_signals
+
+
+def date_folds(dates, n_folds=4, test_months=6, train_months=0, gap_days=10, cv_size=0.2, window_size=11):
+    """
+    Walk-forward Folds nach Datum statt train_test_split über alle Zeilen: die letzten n_folds * test_months Monate
+    werden in n_folds Testperioden geteilt, das Modell jedes Folds sieht nur Tage vor seiner Testperiode.
+    Die letzten cv_size der Trainingstage sind die Validierung für EarlyStopping.
+    Vor Validierung und Test fällt eine Lücke weg, weil Labels_MID window_size // 2 Handelstage in die Zukunft schaut:
+    mindestens gap_days Kalendertage und mindestens window_size // 2 Handelstage (Tage in dates).
+
+    Parameter:
+    - dates: Datum jeder Zeile (datetime64)
+    - train_months: 0 = alle Tage vor dem Test (wachsendes Fenster), sonst gleitendes Fenster dieser Länge
+    - window_size: Fenstergrösse der Labels (wie label_rows)
+
+    Rückgabewert:
+    - folds: Liste von Dictionaries mit fold und train/validation/test _start und _end (Timestamps, start <= Date < end)
+    """
+    days = np.unique(np.asarray(dates, dtype='datetime64[D]'))
+    first = pd.Timestamp(days[0])
+    end = pd.Timestamp(days[-1]) + pd.Timedelta(days=1)
+    horizon = window_size // 2
+
+    def gap_start(cut):
+        # the last `horizon` trading days before cut are left out, at least gap_days calendar days
+        start = days[max(np.searchsorted(days, np.datetime64(cut.date()), side='left') - horizon, 0)]
+        return min(pd.Timestamp(start), cut - pd.Timedelta(days=gap_days))
+
+    folds = []
+    for i in range(n_folds):
+        test_end = end - pd.DateOffset(months=test_months * (n_folds - 1 - i))
+        test_start = test_end - pd.DateOffset(months=test_months)
+        validation_end = gap_start(test_start)
+        train_start = max(first, validation_end - pd.DateOffset(months=train_months)) if train_months else first
+        validation_start = (train_start + (validation_end - train_start) * (1 - cv_size)).normalize()
+        train_end = gap_start(validation_start)
+        if train_end <= train_start:
+            raise ValueError(f"fold {i}: no training days before {test_start.date()}")
+        folds.append({'fold': i, 'train_start': train_start, 'train_end': train_end,
+                      'validation_start': validation_start, 'validation_end': validation_end,
+                      'test_start': test_start, 'test_end': test_end})
+    return folds
+
+
+def fold_split(y, dates, fold):
+    """
+    Rückgabewert:
+    - split: int8 array wie split_rows, TRAIN und VALIDATION nur Zeilen mit Label,
+      TEST alle Zeilen der Testperiode (der Backtest handelt an jedem Tag)
+    """
+    labeled = ~np.isnan(y)
+    split = np.full(len(y), -1, dtype=np.int8)
+    for part, name, rows in ((TRAIN, 'train', labeled), (VALIDATION, 'validation', labeled), (TEST, 'test', True)):
+        start, end = np.datetime64(fold[f'{name}_start']), np.datetime64(fold[f'{name}_end'])
+        split[rows & (dates >= start) & (dates < end)] = part
+    return split
+
+
+def classification_metrics(labels, probabilities):
+    """
+    Accuracy, Macro-F1 und Precision/Recall/F1 pro Klasse auf den Zeilen mit Label (labels >= 0).
+    """
+    known = labels >= 0
+    y_true = labels[known]
+    y_pred = np.argmax(probabilities[known], axis=1)
+    precision, recall, f1, _ = precision_recall_fscore_support(y_true, y_pred, labels=list(range(len(CLASSES))),
+                                                               zero_division=0)
+    metrics = {'accuracy': float(np.mean(y_true == y_pred)) if len(y_true) else float('nan'), 'f1_macro': float(f1.mean())}
+    for class_id, name in enumerate(CLASSES):
+        metrics[f'precision_{name}'] = float(precision[class_id])
+        metrics[f'recall_{name}'] = float(recall[class_id])
+        metrics[f'f1_{name}'] = float(f1[class_id])
+    return metrics
+
+
+def backtest_metrics(signals, settings, starting_balance=1000, index_df=None):
+    """
+    Backtest der Testperiode mit der Handelslogik von update_portfolio (backtest.py).
+
+    Parameter:
+    - signals: DataFrame mit Ticker, Date, Close, Prediction_0..2 der Testperiode
+    - settings: Argumente für Backtest (threshhold, mode, only_one_of_each_stock, available_per_day, membership)
+    - index_df: Index mit Date und Close, die Handelstage kommen wie in der GUI aus diesem DataFrame
+      (None = alle Tage mit Signalen)
+
+    Rückgabewert:
+    - Dictionary mit return, std, sharpe, max_drawdown und trades des Bots (und des Index)
+    """
+    signals = sort_signals(signals)
+    if index_df is not None:
+        signal_dates = pd.to_datetime(signals['Date'])
+        index_dates = pd.to_datetime(index_df['Date'])
+        index_df = index_df[(index_dates >= signal_dates.min()) & (index_dates <= signal_dates.max())]
+        days = index_df['Date'].tolist()
+    else:
+        days = signals['Date'].drop_duplicates().tolist()
+    equity, trades = Backtest(signals, starting_balance=starting_balance, **settings).run(days)
+    metrics = {f'bot_{name}': value for name, value in performance(equity['Value']).items()}
+    metrics['trades'] = len(trades)
+    if index_df is not None and len(index_df) > 1:
+        metrics.update({f'index_{name}': value for name, value in performance(index_df['Close']).items()})
+    return metrics
+
+
+def init_worker(threads):
+    # CPU budget of one fold process, set before tensorflow runs its first op
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(min(2, threads))
+
+
+def run_fold(task):
+    # runs in a worker process: trains the model of one fold and scores it on its test period
+    fold, shared_folder, data_path, training, settings, starting_balance, index_path, threads, chunk_size, predictions_folder = task
+    start_time = time.perf_counter()
+    y = np.load(os.path.join(shared_folder, 'y.npy'), mmap_mode='r')
+    dates = np.load(os.path.join(shared_folder, 'dates.npy'), mmap_mode='r')
+    split = fold_split(y, dates, fold)
+    rows = {f'rows_{name}': int(np.sum(split == part)) for name, part in (('train', TRAIN), ('validation', VALIDATION), ('test', TEST))}
+    print(f"Fold {fold['fold']}: {rows}")
+
+    keras.utils.set_random_seed(training.get('seed', 2))
+    columns, dtype = feature_columns(data_path)
+    model, scaler, selected, history, weights = fit_model(data_path, columns, dtype, split, y, chunk_size=chunk_size,
+                                                          threads=threads, **training)
+
+    # test rows in storage order: unlabeled rows (end of each ticker) get -1 and are only used for the backtest
+    labels = np.where(np.isnan(y), -1, y)
+    test_ds = make_dataset(data_path, selected, dtype, split, labels, TEST, batch_size=8192, cache=None,
+                           chunk_size=chunk_size, threads=threads)
+    probabilities, test_labels = [], []
+    for x, batch_labels in test_ds:
+        probabilities.append(model.predict_on_batch(x))
+        test_labels.append(batch_labels.numpy())
+    probabilities, test_labels = np.concatenate(probabilities), np.concatenate(test_labels)
+
+    signals = pd.concat([chunk for _, chunk in split_chunks(data_path, ['Ticker', 'Date', 'Close'], split, TEST, chunk_size)],
+                        ignore_index=True)
+    for j in range(probabilities.shape[1]):
+        signals[f'Prediction_{j}'] = probabilities[:, j]
+    if predictions_folder:
+        signals.to_parquet(os.path.join(predictions_folder, f"predicted_data_fold{fold['fold']}.parquet"), index=False)
+    index_df = load_table(index_path) if index_path else None
+
+    result = {
+        **{name: value.date() if isinstance(value, pd.Timestamp) else value for name, value in fold.items()},
+        **rows,
+        'epochs': len(history.history['loss']),
+        **classification_metrics(test_labels, probabilities),
+        **backtest_metrics(signals, settings, starting_balance, index_df),
+    }
+    print(f"Fold {fold['fold']} done: accuracy {result['accuracy']:.4f}, return {result['bot_return']:.2f} % "
+          f"({time.perf_counter() - start_time:.1f}s)")
+    return result
+
+
+def run_walk_forward(data_path, settings, n_folds=4, test_months=6, train_months=0, gap_days=10, window_size=11,
+                     starting_balance=1000, index_path=None, workers=None, threads=None, chunk_size=100000,
+                     predictions_folder=None, **training):
+    """
+    Walk-forward Evaluation: ein CNN pro Fold (siehe date_folds), bewertet mit Klassifikationsmetriken und einem
+    Backtest der Testperiode. Die Folds laufen parallel in eigenen Prozessen mit je threads CPU-Threads.
+
+    Labels und Datum werden einmal berechnet und als .npy Dateien gespeichert, die Prozesse lesen sie als Memmap;
+    die Features liest jeder Prozess chunkweise selbst aus dem Feature Store.
+
+    Parameter:
+    - data_path: Feature Store ohne Dateiendung (merged_data von prepare_test_data.py)
+    - settings: Argumente für Backtest (threshhold, mode, only_one_of_each_stock, available_per_day)
+    - workers: Anzahl paralleler Folds (None = so viele wie möglich), threads: Threads pro Fold (None = CPUs / workers)
+    - training: weitere Argumente für fit_model (model_type, smote, k, batch_size, epochs, patience, ...)
+
+    Rückgabewert:
+    - results: DataFrame mit einer Zeile pro Fold (Perioden, Anzahl Zeilen, Epochen, Metriken, Backtest)
+    """
+    y, dates = label_rows(data_path, window_size, chunk_size)
+    folds = date_folds(dates, n_folds, test_months, train_months, gap_days, window_size=window_size)
+    cpus = os.cpu_count() or 1
+    workers = workers or min(len(folds), cpus)
+    threads = threads or max(1, cpus // workers)
+    print(f"{len(folds)} folds, {workers} processes with {threads} threads each")
+    if predictions_folder:
+        os.makedirs(predictions_folder, exist_ok=True)
+
+    shared_folder = tempfile.mkdtemp(prefix='walk_forward_')
+    try:
+        np.save(os.path.join(shared_folder, 'y.npy'), y)
+        np.save(os.path.join(shared_folder, 'dates.npy'), dates)
+        tasks = []
+        for fold in folds:
+            fold_training = dict(training)
+            if fold_training.get('cache'):
+                fold_training['cache'] = f"{fold_training['cache']}_fold{fold['fold']}"
+            tasks.append((fold, shared_folder, data_path, fold_training, settings, starting_balance, index_path, threads,
+                          chunk_size, predictions_folder))
+
+        # spawn: every fold gets its own tensorflow with its own thread pools
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                                 initargs=(threads,)) as executor:
+            results = list(executor.map(run_fold, tasks))
+    finally:
+        shutil.rmtree(shared_folder, ignore_errors=True)
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward evaluation: one CNN per date fold, scored with metrics and a backtest.")
+    parser.add_argument("--data", default='../Gui/merged_data/merged_data_large', help="merged features without file ending (parquet or csv)")
+    parser.add_argument("--folds", type=int, default=4, help="number of test periods (default: 4)")
+    parser.add_argument("--test-months", type=int, default=6, help="length of each test period (default: 6)")
+    parser.add_argument("--train-months", type=int, default=0, help="rolling training window, 0 = all days before the test period")
+    parser.add_argument("--gap-days", type=int, default=10,
+                        help="calendar days left out before validation and test, at least window // 2 trading days (default: 10)")
+    parser.add_argument("--window", type=int, default=11, help="window size of the labels (default: 11)")
+    parser.add_argument("--model", type=int, choices=[1, 2], default=1, help="1 = Model1 (softmax), 2 = Model2 (BatchNormalization)")
+    parser.add_argument("--smote", action='store_true', help="oversample the training set with SMOTE (needs imbalanced-learn)")
+    parser.add_argument("--k", type=int, default=100, help="number of features selected with chi2 (default: 100)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--epochs", type=int, default=300)
+    parser.add_argument("--patience", type=int, default=20)
+    parser.add_argument("--shuffle-buffer", type=int, default=100000)
+    parser.add_argument("--cache", default='', help="cache the images in files with this prefix instead of in memory")
+    parser.add_argument("--seed", type=int, default=2)
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    parser.add_argument("--index", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_data', '^GSPC'),
+                        help="index prices, the trading days come from this file (default: CNN/test_data/^GSPC)")
+    parser.add_argument("--balance", type=float, default=1000, help="starting balance ($)")
+    parser.add_argument("--threshhold", type=float, default=0.75, help="minimum CNN prediction probability to trade")
+    parser.add_argument("--mode", choices=MODES, default='buy1perDay')
+    parser.add_argument("--only-one", action='store_true', help="buy1perDay: hold maximum 1 of each stock or crypto")
+    parser.add_argument("--budget", type=int, default=3, help="buybyBudget_SellFriday: available budget per day (x/10)")
+    parser.add_argument("--membership", default=None, help="only buy tickers that were in the index on that day (membership csv)")
+    parser.add_argument("--workers", type=int, default=None, help="folds trained in parallel (default: all folds, max. CPUs)")
+    parser.add_argument("--threads", type=int, default=None, help="CPU threads per fold (default: CPUs / workers)")
+    parser.add_argument("--predictions", default=None, help="save the predictions of each test period to this folder")
+    parser.add_argument("--output", default='walk_forward_results.csv')
+    args = parser.parse_args()
+
+    index_path = args.index if load_table(args.index, columns=['Date']) is not None else None
+    if index_path is None:
+        print(f"No index at {args.index}, trading days come from the predictions")
+    settings = {'threshhold': args.threshhold, 'mode': args.mode, 'only_one_of_each_stock': args.only_one,
+                'available_per_day': args.budget}
+    if args.membership:
+        settings['membership'] = MembershipIndex.load(args.membership)
+
+    start = time.perf_counter()
+    results = run_walk_forward(args.data, settings, args.folds, args.test_months, args.train_months, args.gap_days,
+                               args.window, args.balance, index_path, args.workers, args.threads, args.chunk_size,
+                               args.predictions, model_type=args.model, smote=args.smote, k=args.k,
+                               batch_size=args.batch_size, epochs=args.epochs, patience=args.patience,
+                               shuffle_buffer=args.shuffle_buffer, cache=args.cache, seed=args.seed)
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+    results.to_csv(args.output, index=False)
+    columns = ['fold', 'test_start', 'test_end', 'rows_train', 'epochs', 'accuracy', 'f1_macro', 'bot_return',
+               'bot_sharpe', 'bot_max_drawdown', 'trades']
+    print(results[[column for column in columns if column in results.columns]].to_string(index=False))
+    print("Results saved to:", args.output)
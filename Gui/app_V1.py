@@ -9,6 +9,9 @@ import random
 import os
 import yfinance as yf
 from concurrent.futures import ThreadPoolExecutor
+from feature_store import load_table, table_version, PREDICTION_COLUMNS
+from backtest import Backtest
+from signal_index import SignalIndex
 
 
 st.set_page_config(
@@ -18,12 +21,16 @@ st.set_page_config(
 )
 
 @st.cache_data
-def get_dataset(path) -> pd.DataFrame:
-    if os.path.exists(path):
-        df = pd.read_csv(path)
-        return df
-    else:
-        print("Path:", path, "does not exist!")
+def get_dataset(path, columns=None, version=None) -> pd.DataFrame:
+    # reads path.parquet if it exists (only the given columns), otherwise path.csv
+    # version = table_version(path): part of the cache key, a rewritten file is read again
+    return load_table(path, columns=columns)
+
+@st.cache_resource
+def get_signal_index(version, _trading_bot_df) -> SignalIndex:
+    # signals grouped per date, built once per dataset version (path and modification time of the predictions)
+    # and shared by every restart of the bot
+    return SignalIndex(_trading_bot_df)
 
 @st.cache_data
 def filter_dataset_date(df, start_date, end_date) -> pd.DataFrame:
@@ -31,66 +38,11 @@ def filter_dataset_date(df, start_date, end_date) -> pd.DataFrame:
                         (pd.to_datetime(df["Date"]) <= pd.to_datetime(end_date))]
     return df
 
-def get_current_portfolio_value(trading_bot_df, portfolio, cash_balance, date):
-    portfolio_value = cash_balance  # Initialize portfolio value with cash balance
-
-    if portfolio:
-        for stock_symbol, quantity in portfolio.items():
-            stock_data = trading_bot_df[(trading_bot_df['Ticker'] == stock_symbol) & (trading_bot_df['Date'] == date)]  # Filter the DataFrame for the specific stock on the given date
-
-            if not stock_data.empty:
-                close_price = stock_data.iloc[0]['Close']
-                stock_value = close_price * quantity
-                
-                portfolio_value += stock_value  # Add the stock value to the overall portfolio value
-
-    return portfolio_value
-
-def update_portfolio(trading_bot_df, stock_portfolio, cash_balance, date, threshhold, only_one_of_each_stock):
-    '''
-    This function dynamically adjusts a stock portfolio based on predictions and a specified threshhold,
-    executing buy and sell transactions while ensuring available cash balance.
-    '''
-    df_filtered_by_date = trading_bot_df[trading_bot_df['Date'] == date]  # Filter DataFrame for the given date
-    
-    # Iterate over rows in the DataFrame
-    for index, row in df_filtered_by_date.iterrows():
-        ticker = row['Ticker']
-        
-        predictions = {
-            'Buy': row['Prediction_0'],   # Buy
-            'Sell': row['Prediction_1'],  # Sell
-            'Hold': row['Prediction_2']   # Hold
-        }
-
-        max_prediction = max(predictions.values())  # Get max probability
-        best_action = max(predictions, key=predictions.get)  # Get best action with highest probability
-
-        # Decide whether to buy, sell, or hold based on threshhold
-        if best_action == "Buy" and max_prediction >= threshhold and cash_balance-row['Close'] > 0:
-            if not only_one_of_each_stock and ticker in stock_portfolio:
-                stock_portfolio[ticker] += 1
-                cash_balance -= row['Close']  # Deduct the cost of the stock from cash balance
-            elif ticker not in stock_portfolio:
-                stock_portfolio[ticker] = 1
-                cash_balance -= row['Close']  # Deduct the cost of the stock from cash balance
-
-        elif best_action == "Sell" and max_prediction >= threshhold and ticker in stock_portfolio.keys():
-            if ticker in stock_portfolio:
-                if stock_portfolio[ticker] == 1:
-                    del stock_portfolio[ticker]
-                    cash_balance += row['Close']  # Add the selling price to cash balance
-                else:
-                    stock_portfolio[ticker] -= 1
-                    cash_balance += row['Close']  # Add the selling price to cash balance
-    
-    return stock_portfolio, cash_balance
-
-
 ########### Start of Gui ###########
 
-sp500_df = get_dataset(path = '../CNN/test_data/^GSPC.csv')
-trading_bot_df = get_dataset(path = 'predicted_data/predicted_data.csv')
+sp500_df = get_dataset(path = '../CNN/test_data/^GSPC')
+trading_bot_version = table_version('predicted_data/predicted_data')
+trading_bot_df = get_dataset(path = 'predicted_data/predicted_data', columns=PREDICTION_COLUMNS, version=trading_bot_version)
 
 # dashboard title
 st.title("Trading Bot Dashboard")
@@ -137,13 +89,16 @@ plots_placeholder = st.empty()
 if bot_start and (start_date < end_date):
     sp500_filtered_df = filter_dataset_date(sp500_df, start_date, end_date)
     trading_bot_filtered_df = filter_dataset_date(trading_bot_df, start_date, end_date)
+    # trading logic of the bot (same engine as backtest.py)
+    bot = Backtest(get_signal_index(trading_bot_version, trading_bot_df), threshhold=risk_threshhold, mode='buy1perDay', only_one_of_each_stock=only_one_of_each_stock,
+                   starting_balance=starting_balance)
     
     # Initialization of all important variables
     portfolio_value_list = []  # List with portfolio value per tick
     cash_balance_list = []  # List with cash balance per tick
     ticks = 1  # Variable to filter dataframes (every iteration: ticks += 1)
-    stock_portfolio = {}  # stock portfolio: key = ticker, value = quantity
-    cash_balance = starting_balance  # initialize cash balance with starting balance
+    stock_portfolio = bot.portfolio  # stock portfolio: key = ticker, value = quantity
+    cash_balance = bot.cash_balance  # initialize cash balance with starting balance
     dates = sp500_filtered_df['Date'].to_list()  # List of dates for plotting and looping
 
     # near real-time / live feed simulation
@@ -158,7 +113,7 @@ if bot_start and (start_date < end_date):
 
         ##### GET CURRENT BALANCE #####
         # portfolio_value_list = stocks + cash
-        portfolio_value_list.append(get_current_portfolio_value(trading_bot_df, stock_portfolio, cash_balance, date=current_date))  # calculate balance (current porfolio value)
+        portfolio_value_list.append(bot.portfolio_value(current_date))  # calculate balance (current porfolio value)
 
         with plots_placeholder.container():
             
@@ -235,7 +190,8 @@ if bot_start and (start_date < end_date):
                     )
 
             ##### UPDATE PORTFOLIO #####
-            stock_portfolio, cash_balance = update_portfolio(trading_bot_df, stock_portfolio, cash_balance, date=current_date, threshhold=risk_threshhold, only_one_of_each_stock=only_one_of_each_stock)  # Get updated portfolio based on current date
+            bot.trade(current_date)  # Get updated portfolio based on current date
+            stock_portfolio, cash_balance = bot.portfolio, bot.cash_balance
             
             ticks += 1
             time.sleep(tick_rate)
@@ -9,8 +9,9 @@ import random
 import os
 import yfinance as yf
 from concurrent.futures import ThreadPoolExecutor
-import math
-from datetime import datetime
+from feature_store import load_table, table_version, PREDICTION_COLUMNS
+from backtest import Backtest
+from signal_index import SignalIndex, sort_signals
 
 
 st.set_page_config(
@@ -19,133 +20,50 @@ st.set_page_config(
     layout="wide",
 )
 
-@st.cache_data
-def get_dataset(path) -> pd.DataFrame:
-    if os.path.exists(path):
-        df = pd.read_csv(path)
-        return df
-    else:
-        print("Path:", path, "does not exist!")
-
-@st.cache_data
-def filter_dataset_date(df, start_date, end_date) -> pd.DataFrame:
-    df = df[(pd.to_datetime(df["Date"]) >= pd.to_datetime(start_date)) & 
-                        (pd.to_datetime(df["Date"]) <= pd.to_datetime(end_date))]
-    return df
-
-def get_current_portfolio_value(trading_bot_df, portfolio, cash_balance, date):
-    portfolio_value = cash_balance  # Initialize portfolio value with cash balance
-
-    if portfolio:
-        for stock_symbol, quantity in portfolio.items():
-            stock_data = trading_bot_df[(trading_bot_df['Ticker'] == stock_symbol) & (trading_bot_df['Date'] == date)]  # Filter the DataFrame for the specific stock on the given date
-
-            if not stock_data.empty:
-                close_price = stock_data.iloc[0]['Close']
-                stock_value = close_price * quantity
-                
-                portfolio_value += stock_value  # Add the stock value to the overall portfolio value
-
-    return portfolio_value
-
-def update_portfolio(trading_bot_df, stock_portfolio, cash_balance, date, threshhold, only_one_of_each_stock, mode):
-    '''
-    This function dynamically adjusts a stock portfolio based on predictions and a specified threshhold,
-    executing buy and sell transactions while ensuring available cash balance.
-    '''
-    df_filtered_by_date = trading_bot_df[trading_bot_df['Date'] == date]  # Filter DataFrame for the given date
-    
-    # Iterate over rows in the DataFrame
-    for index, row in df_filtered_by_date.iterrows():
-        ticker = row['Ticker']
-        
-        predictions = {
-            'Buy': row['Prediction_0'],   # Buy
-            'Sell': row['Prediction_1'],  # Sell
-            'Hold': row['Prediction_2']   # Hold
-        }
-
-        max_prediction = max(predictions.values())  # Get max probability
-        best_action = max(predictions, key=predictions.get)  # Get best action with highest probability
-
-        # BUY1 MODE
-        if mode == "buy1perDay":
-            # Decide whether to buy, sell, or hold based on threshhold
-            if best_action == "Buy" and max_prediction >= threshhold and cash_balance-row['Close'] > 0:
-                if not only_one_of_each_stock and ticker in stock_portfolio:
-                    stock_portfolio[ticker] += 1
-                    cash_balance -= row['Close']  # Deduct the cost of the stock from cash balance
-                elif ticker not in stock_portfolio:
-                    stock_portfolio[ticker] = 1
-                    cash_balance -= row['Close']  # Deduct the cost of the stock from cash balance
-
-            elif best_action == "Sell" and max_prediction >= threshhold and ticker in stock_portfolio.keys():
-                if ticker in stock_portfolio:
-                    if stock_portfolio[ticker] == 1:
-                        del stock_portfolio[ticker]
-                        cash_balance += row['Close']  # Add the selling price to cash balance
-                    else:
-                        stock_portfolio[ticker] -= 1
-                        cash_balance += row['Close']  # Add the selling price to cash balance
-
-        # SELL_FRIDAY MODE
-        elif mode == "buybyBudget_SellFriday":
-            # Decide whether to buy, sell, or hold based on threshhold
-            if best_action == "Buy" and max_prediction >= threshhold and cash_balance-row['Close'] > 0:
-                if ticker in stock_portfolio:
-                    budget = cash_balance / availablePerDay
-                    stock_amount = math.floor(budget // row['Close'])
-                    if stock_amount > 0:  # Buy only if amount is greater than 0
-                        stock_portfolio[ticker] += stock_amount
-                        cash_balance -= stock_amount * row['Close']  # Deduct the cost of the stock from cash balance
-                else:
-                    budget = cash_balance / availablePerDay
-                    stock_amount = math.floor(budget // row['Close'])
-                    if stock_amount > 0:  # Buy only if amount is greater than 0
-                        stock_portfolio[ticker] = stock_amount
-                        cash_balance -= stock_amount * row['Close']  # Deduct the cost of the stock from cash balance
-
-            conv_date =  datetime.strptime(date, '%Y-%m-%d')
-            if conv_date.weekday() == 4:
-                if ticker in stock_portfolio:
-                    cash_balance += row['Close']*stock_portfolio[ticker]  # Add the selling price to cash balance
-                    del stock_portfolio[ticker]
-        
-    return stock_portfolio, cash_balance
-
+# predicted data per trading algo (path without file ending, parquet or csv)
+DATASETS = {
+    "V1_noSMOTE": 'predicted_data/predicted_data_V1',
+    "V2_withSMOTE": 'predicted_data/predicted_data_V2',
+    "V3_withSMOTE": 'predicted_data/predicted_data_V3',
+}
+
+@st.cache_resource
+def get_index_data(path):
+    # index prices, loaded once; the dates are parsed once (sorted datetime64 array for filter_dataset_date)
+    sp500_df = load_table(path)
+    return sp500_df, pd.to_datetime(sp500_df['Date']).to_numpy()
+
+@st.cache_resource
+def get_trading_data(algo, version=None):
+    # predictions of one algo, only loaded when the algo is selected (parquet: only the needed columns)
+    # version = table_version(DATASETS[algo]): part of the cache key, a rewritten file is read again
+    # Sort for best actions per day (once per algo, not on every rerun)
+    return sort_signals(load_table(DATASETS[algo], columns=PREDICTION_COLUMNS))
+
+@st.cache_resource
+def get_signal_index(algo, version=None) -> SignalIndex:
+    # signals grouped per date, built once per algo and dataset version (table_version) and shared by every restart of the bot
+    return SignalIndex(get_trading_data(algo, version))
+
+def filter_dataset_date(df, dates, start_date, end_date) -> pd.DataFrame:
+    # dates = parsed and sorted df["Date"], the date range is a slice found by binary search
+    start = np.searchsorted(dates, np.datetime64(start_date), side='left')
+    end = np.searchsorted(dates, np.datetime64(end_date), side='right')
+    return df.iloc[start:end]
 
 ########### Start of Gui ###########
 
-sp500_df = get_dataset(path = '../CNN/test_data/^GSPC.csv')
-v1 = get_dataset(path = 'predicted_data/predicted_data_V1.csv')
-v2 = get_dataset(path = 'predicted_data/predicted_data_V2.csv')
-v3 = get_dataset(path = 'predicted_data/predicted_data_V3.csv')
-
+sp500_df, sp500_dates = get_index_data('../CNN/test_data/^GSPC')
 
 # dashboard title
 st.title("Trading Bot Dashboard 💸")
 
 # Dropdown for selecting the algo
-algo = st.selectbox("Select trading Algo", options=["V1_noSMOTE", "V2_withSMOTE", "V3_withSMOTE"])
-
-if algo == "V1_noSMOTE":
-    # Set trading dataframe
-    trading_bot_df = v1
-elif algo == "V2_withSMOTE":
-    # Set trading dataframe
-    trading_bot_df = v2
-elif algo == "V3_withSMOTE":
-    # Set trading dataframe
-    trading_bot_df = v3
-
-# Sort for best actions per day
-trading_bot_df['max_prediction'] = trading_bot_df[['Prediction_0', 'Prediction_1', 'Prediction_2']].max(axis=1)  # Create a new column with the max value of predictions
-trading_bot_df = trading_bot_df.sort_values(by=['Date', 'max_prediction'], ascending=[True, False])  # Sort by date and max_prediction
-trading_bot_df = trading_bot_df.drop(columns=['max_prediction'])  # Drop the temporary max_prediction column
+algo = st.selectbox("Select trading Algo", options=list(DATASETS))
 
 # Determine min and max dates from the DataFrame
-min_date = pd.to_datetime(sp500_df['Date']).min()
-max_date = pd.to_datetime(sp500_df['Date']).max()
+min_date = pd.Timestamp(sp500_dates[0])
+max_date = pd.Timestamp(sp500_dates[-1])
 
 # Date range filters
 date_filter_col1, date_filter_col2 = st.columns(2)
@@ -179,6 +97,7 @@ settings_col2.markdown("")
 settings_col2.markdown("")
 mode = settings_col2.selectbox("Select trading mode", options=["buy1perDay", "buybyBudget_SellFriday"])
 only_one_of_each_stock = False
+availablePerDay = 3
 if mode == "buy1perDay":
     settings_col2.markdown("")
     settings_col2.markdown("")
@@ -192,15 +111,18 @@ elif mode == "buybyBudget_SellFriday":
 plots_placeholder = st.empty()
 
 if bot_start and (start_date < end_date):
-    sp500_filtered_df = filter_dataset_date(sp500_df, start_date, end_date)
-    trading_bot_filtered_df = filter_dataset_date(trading_bot_df, start_date, end_date)
+    sp500_filtered_df = filter_dataset_date(sp500_df, sp500_dates, start_date, end_date)
+    # trading logic of the bot (same engine as backtest.py)
+    bot = Backtest(get_signal_index(algo, table_version(DATASETS[algo])), threshhold=risk_threshhold, mode=mode,
+                   only_one_of_each_stock=only_one_of_each_stock, available_per_day=availablePerDay,
+                   starting_balance=starting_balance)
     
     # Initialization of all important variables
     portfolio_value_list = []  # List with portfolio value per tick
     cash_balance_list = []  # List with cash balance per tick
     ticks = 1  # Variable to filter dataframes (every iteration: ticks += 1)
-    stock_portfolio = {}  # stock portfolio: key = ticker, value = quantity
-    cash_balance = starting_balance  # initialize cash balance with starting balance
+    stock_portfolio = bot.portfolio  # stock portfolio: key = ticker, value = quantity
+    cash_balance = bot.cash_balance  # initialize cash balance with starting balance
     dates = sp500_filtered_df['Date'].to_list()  # List of dates for plotting and looping
 
     # near real-time / live feed simulation
@@ -215,7 +137,7 @@ if bot_start and (start_date < end_date):
 
         ##### GET CURRENT BALANCE #####
         # portfolio_value_list = stocks + cash
-        portfolio_value_list.append(get_current_portfolio_value(trading_bot_df, stock_portfolio, cash_balance, date=current_date))  # calculate balance (current porfolio value)
+        portfolio_value_list.append(bot.portfolio_value(current_date))  # calculate balance (current porfolio value)
 
         with plots_placeholder.container():
             
@@ -302,7 +224,8 @@ if bot_start and (start_date < end_date):
                     )
 
             ##### UPDATE PORTFOLIO #####
-            stock_portfolio, cash_balance = update_portfolio(trading_bot_df, stock_portfolio, cash_balance, date=current_date, threshhold=risk_threshhold, only_one_of_each_stock=only_one_of_each_stock, mode=mode)  # Get updated portfolio based on current date
+            bot.trade(current_date)  # Get updated portfolio based on current date
+            stock_portfolio, cash_balance = bot.portfolio, bot.cash_balance
             
             ticks += 1
             time.sleep(tick_rate)
@@ -9,8 +9,9 @@ import random
 import os
 import yfinance as yf
 from concurrent.futures import ThreadPoolExecutor
-import math
-from datetime import datetime
+from feature_store import load_table, table_version, PREDICTION_COLUMNS
+from backtest import Backtest
+from signal_index import SignalIndex, sort_signals
 
 
 st.set_page_config(
@@ -19,151 +20,136 @@ st.set_page_config(
     layout="wide",
 )
 
-@st.cache_data
-def get_dataset(path) -> pd.DataFrame:
-    if os.path.exists(path):
-        df = pd.read_csv(path)
-        return df
-    else:
-        print("Path:", path, "does not exist!")
-
-@st.cache_data
-def filter_dataset_date(df, start_date, end_date) -> pd.DataFrame:
-    df = df[(pd.to_datetime(df["Date"]) >= pd.to_datetime(start_date)) & 
-                        (pd.to_datetime(df["Date"]) <= pd.to_datetime(end_date))]
-    return df
-
-def get_current_portfolio_value(trading_bot_df, portfolio, cash_balance, date):
-    portfolio_value = cash_balance  # Initialize portfolio value with cash balance
-
-    if portfolio:
-        for stock_symbol, quantity in portfolio.items():
-            stock_data = trading_bot_df[(trading_bot_df['Ticker'] == stock_symbol) & (trading_bot_df['Date'] == date)]  # Filter the DataFrame for the specific stock on the given date
-
-            if not stock_data.empty:
-                close_price = stock_data.iloc[0]['Close']
-                stock_value = close_price * quantity
-                
-                portfolio_value += stock_value  # Add the stock value to the overall portfolio value
-
-    return portfolio_value
-
-def update_portfolio(trading_bot_df, stock_portfolio, cash_balance, date, threshhold, only_one_of_each_stock, mode):
-    '''
-    This function dynamically adjusts a stock/crypto portfolio based on predictions and a specified threshhold,
-    executing buy and sell transactions while ensuring available cash balance.
-    '''
-    df_filtered_by_date = trading_bot_df[trading_bot_df['Date'] == date]  # Filter DataFrame for the given date
+# predicted data per trading algo (path without file ending, parquet or csv)
+DATASETS = {
+    "V1_noSMOTE": 'predicted_data/predicted_data_V1',
+    "V2_withSMOTE": 'predicted_data/predicted_data_V2',
+    "V3_withSMOTE": 'predicted_data/predicted_data_V3',
+    "V1_crypto_noSMOTE": 'predicted_data/predicted_data_crypto_V1',
+    "V2_crypto_withSMOTE": 'predicted_data/predicted_data_crypto_V2',
+    "V3_crypto_withSMOTE": 'predicted_data/predicted_data_crypto_V3',
+}
+
+@st.cache_resource
+def get_index_data(path):
+    # index prices, loaded once; the dates are parsed once (sorted datetime64 array for filter_dataset_date)
+    sp500_df = load_table(path)
+    sp500_df['Return'] = sp500_df['Close'].pct_change() * 100  # Return for each day
+    return sp500_df, pd.to_datetime(sp500_df['Date']).to_numpy()
+
+@st.cache_resource
+def get_trading_data(algo, version=None):
+    # predictions of one algo, only loaded when the algo is selected (parquet: only the needed columns)
+    # version = table_version(DATASETS[algo]): part of the cache key, a rewritten file is read again
+    # Sort for best actions per day (once per algo, not on every rerun)
+    return sort_signals(load_table(DATASETS[algo], columns=PREDICTION_COLUMNS))
+
+@st.cache_resource
+def get_signal_index(algo, version=None) -> SignalIndex:
+    # signals grouped per date, built once per algo and dataset version (table_version) and shared by every restart of the bot
+    return SignalIndex(get_trading_data(algo, version))
+
+def filter_dataset_date(df, dates, start_date, end_date) -> pd.DataFrame:
+    # dates = parsed and sorted df["Date"], the date range is a slice found by binary search
+    start = np.searchsorted(dates, np.datetime64(start_date), side='left')
+    end = np.searchsorted(dates, np.datetime64(end_date), side='right')
+    return df.iloc[start:end]
+
+def candlestick_chart(sp500_stream_df):
+    candlestick_fig = go.Figure(data=[go.Candlestick(x=sp500_stream_df['Date'],
+                                                    open=sp500_stream_df['Open'],
+                                                    high=sp500_stream_df['High'],
+                                                    low=sp500_stream_df['Low'],
+                                                    close=sp500_stream_df['Close'])])
+
+    candlestick_fig.update_layout(title="S&P 500 Candlestick Chart",
+                                xaxis_title="Date",
+                                yaxis_title="Price (USD)")
     
-    # Iterate over rows in the DataFrame
+    # Disable draggable date filter
+    candlestick_fig.update_xaxes(
+        rangeslider_visible=False,
+        rangebreaks=[
+            dict(bounds=["sat", "mon"]),  # hide weekends, eg. hide sat to before mon
+        ]
+    )
+    return candlestick_fig
+
+def portfolio_chart(stock_portfolio):
+    portfolio_fig = go.Figure(data=[go.Pie(labels=list(stock_portfolio.keys()), values=list(stock_portfolio.values()))])
+    portfolio_fig.update_layout(
+        title="Stock Portfolio Distribution (Quantity per stock)"
+    )
+    if len(stock_portfolio.keys())<20:
+        portfolio_fig.update_traces(
+            textinfo='label'
+        )
+    else:
+        portfolio_fig.update_traces(
+            textinfo='none'
+        )
+    return portfolio_fig
+
+def balance_chart(dates, portfolio_value_list, starting_balance):
+    if portfolio_value_list[-1] < starting_balance:
+        color="red"
+    else:
+        color="green"
 
+    balance_fig = px.line(
+        x = dates,
+        y = portfolio_value_list,
+        color_discrete_sequence=[color]
+    )
 
-    for index, row in df_filtered_by_date.iterrows():
-        ticker = row['Ticker']
-        
-        predictions = {
-            'Buy': row['Prediction_0'],   # Buy
-            'Sell': row['Prediction_1'],  # Sell
-            'Hold': row['Prediction_2']   # Hold
-        }
-
-        max_prediction = max(predictions.values())  # Get max probability
-        best_action = max(predictions, key=predictions.get)  # Get best action with highest probability
-
-        # BUY1 MODE
-        if mode == "buy1perDay":
-            # Decide whether to buy, sell, or hold based on threshhold
-            if best_action == "Buy" and max_prediction >= threshhold and cash_balance-row['Close'] > 0:
-                if not only_one_of_each_stock and ticker in stock_portfolio:
-                    stock_portfolio[ticker] += 1
-                    cash_balance -= row['Close']  # Deduct the cost of the stock from cash balance
-                elif ticker not in stock_portfolio:
-                    stock_portfolio[ticker] = 1
-                    cash_balance -= row['Close']  # Deduct the cost of the stock from cash balance
-
-            elif best_action == "Sell" and max_prediction >= threshhold and ticker in stock_portfolio.keys():
-                if ticker in stock_portfolio:
-                    if stock_portfolio[ticker] == 1:
-                        del stock_portfolio[ticker]
-                        cash_balance += row['Close']  # Add the selling price to cash balance
-                    else:
-                        stock_portfolio[ticker] -= 1
-                        cash_balance += row['Close']  # Add the selling price to cash balance
-
-        # SELL_FRIDAY MODE
-        elif mode == "buybyBudget_SellFriday":
-            # Decide whether to buy, sell, or hold based on threshhold
-            if best_action == "Buy" and max_prediction >= threshhold and cash_balance-row['Close'] > 0:
-                if ticker in stock_portfolio:
-                    budget = cash_balance / availablePerDay
-                    stock_amount = math.floor(budget // row['Close'])
-                    if stock_amount > 0:  # Buy only if amount is greater than 0
-                        stock_portfolio[ticker] += stock_amount
-                        cash_balance -= stock_amount * row['Close']  # Deduct the cost of the stock from cash balance
-                else:
-                    budget = cash_balance / availablePerDay
-                    stock_amount = math.floor(budget // row['Close'])
-                    if stock_amount > 0:  # Buy only if amount is greater than 0
-                        stock_portfolio[ticker] = stock_amount
-                        cash_balance -= stock_amount * row['Close']  # Deduct the cost of the stock from cash balance
-
-            conv_date =  datetime.strptime(date, '%Y-%m-%d')
-            if conv_date.weekday() == 4:
-                if ticker in stock_portfolio:
-                    cash_balance += row['Close']*stock_portfolio[ticker]  # Add the selling price to cash balance
-                    del stock_portfolio[ticker]
-        
-    return stock_portfolio, cash_balance
+    balance_fig.update_layout(title="Balance of Trading bot (Cash + Stocks/Crypto value)",
+                xaxis_title="Date",
+                yaxis_title="Balance (USD)"
+                )
+    return balance_fig
 
+def show_metrics(cash_balance_list, portfolio_value_list, return_on_inverstement_i, return_on_inverstement_p):
+    if len(portfolio_value_list) > 1:
+        st.metric(
+            label="Cash balance",
+            value="${:.2f}".format(cash_balance_list[-1]),
+            delta=round(cash_balance_list[-1]-cash_balance_list[-2], 2)
+        )
 
-########### Start of Gui ###########
+        st.metric(
+            label="Stocks/Crypto value",
+            value="${:.2f}".format(portfolio_value_list[-1] - cash_balance_list[-1]),
+            delta=round((portfolio_value_list[-1]-cash_balance_list[-1])-(portfolio_value_list[-2]-cash_balance_list[-2]), 2)
+        )
+
+        st.metric(
+            label="Total Portfolio Value",
+            value="${:.2f}".format(portfolio_value_list[-1]),
+            delta=round(portfolio_value_list[-1]-portfolio_value_list[-2], 2)
+        )
+        st.metric(
+            label="Index Performance",
+            value="{:.2f} %".format(return_on_inverstement_i)
+        )
+
+        st.metric(
+            label="Bot Performance",
+            value="{:.2f} %".format(return_on_inverstement_p)
+        )
 
-sp500_df = get_dataset(path = '../CNN/test_data/^GSPC.csv')
-# Return for each day
-sp500_df['Return'] = sp500_df['Close'].pct_change() * 100
+########### Start of Gui ###########
 
-# stocks
-v1 = get_dataset(path = 'predicted_data/predicted_data_V1.csv')
-v2 = get_dataset(path = 'predicted_data/predicted_data_V2.csv')
-v3 = get_dataset(path = 'predicted_data/predicted_data_V3.csv')
-# crypto
-v1_crypto = get_dataset(path = 'predicted_data/predicted_data_crypto_V1.csv')
-v2_crypto = get_dataset(path = 'predicted_data/predicted_data_crypto_V2.csv')
-v3_crypto = get_dataset(path = 'predicted_data/predicted_data_crypto_V3.csv')
+sp500_df, sp500_dates = get_index_data('../CNN/test_data/^GSPC')
 
 # dashboard title
 st.title("Trading Bot Dashboard 💸")
 
 # Dropdown for selecting the algo
-algo = st.selectbox("Select trading Algo", options=["V1_noSMOTE", "V2_withSMOTE", "V3_withSMOTE", "V1_crypto_noSMOTE", "V2_crypto_withSMOTE", "V3_crypto_withSMOTE"])
-
-if algo == "V1_noSMOTE":
-    # Set trading dataframe
-    trading_bot_df = v1
-elif algo == "V2_withSMOTE":
-    # Set trading dataframe
-    trading_bot_df = v2
-elif algo == "V3_withSMOTE":
-    # Set trading dataframe
-    trading_bot_df = v3
-elif algo == "V1_crypto_noSMOTE":
-    # Set trading dataframe
-    trading_bot_df = v1_crypto
-elif algo == "V2_crypto_withSMOTE":
-    # Set trading dataframe
-    trading_bot_df = v2_crypto
-elif algo == "V3_crypto_withSMOTE":
-    # Set trading dataframe
-    trading_bot_df = v3_crypto
-
-# Sort for best actions per day
-trading_bot_df['max_prediction'] = trading_bot_df[['Prediction_0', 'Prediction_1', 'Prediction_2']].max(axis=1)  # Create a new column with the max value of predictions
-trading_bot_df = trading_bot_df.sort_values(by=['Date', 'max_prediction'], ascending=[True, False])  # Sort by date and max_prediction
-trading_bot_df = trading_bot_df.drop(columns=['max_prediction'])  # Drop the temporary max_prediction column
+algo = st.selectbox("Select trading Algo", options=list(DATASETS))
 
 # Determine min and max dates from the DataFrame
-min_date = pd.to_datetime(sp500_df['Date']).min()
-max_date = pd.to_datetime(sp500_df['Date']).max()
+min_date = pd.Timestamp(sp500_dates[0])
+max_date = pd.Timestamp(sp500_dates[-1])
 
 # Date range filters
 date_filter_col1, date_filter_col2 = st.columns(2)
@@ -172,13 +158,18 @@ end_date = date_filter_col2.date_input("Select end date", value=max_date, min_va
 
 error_placeholder = st.empty()
 
-bot_settings_col1, bot_settings_col2 = st.columns(2)
+bot_settings_col1, bot_settings_col2, bot_settings_col3 = st.columns(3)
 # starting cash balance
 starting_balance = bot_settings_col1.number_input("Select a starting balance ($)", min_value=1000, max_value=1000000)
 
 # tick rate
 tick_rate = bot_settings_col2.number_input("Select tickrate (seconds)", min_value=0.0, max_value=1.0, step=0.1, value=0.4)
 
+# Live: metrics every tick, charts at most redraw_rate times per second
+# Fast forward: no intermediate frames, only the final result (for long date ranges)
+display_mode = bot_settings_col3.selectbox("Display", options=["Live", "Fast forward"])
+redraw_rate = bot_settings_col3.number_input("Chart redraws per second (Live)", min_value=0.1, max_value=10.0, step=0.5, value=2.0)
+
 st.markdown("---")
 
 control_col1, control_col2 = st.columns(2)
@@ -197,6 +188,7 @@ settings_col2.markdown("")
 settings_col2.markdown("")
 mode = settings_col2.selectbox("Select trading mode", options=["buy1perDay", "buybyBudget_SellFriday"])
 only_one_of_each_stock = False
+availablePerDay = 3
 if mode == "buy1perDay":
     settings_col2.markdown("")
     settings_col2.markdown("")
@@ -210,131 +202,76 @@ elif mode == "buybyBudget_SellFriday":
 plots_placeholder = st.empty()
 
 if bot_start and (start_date < end_date):
-    sp500_filtered_df = filter_dataset_date(sp500_df, start_date, end_date)
-    trading_bot_filtered_df = filter_dataset_date(trading_bot_df, start_date, end_date)
+    sp500_filtered_df = filter_dataset_date(sp500_df, sp500_dates, start_date, end_date)
+    # trading logic of the bot (same engine as backtest.py)
+    bot = Backtest(get_signal_index(algo, table_version(DATASETS[algo])), threshhold=risk_threshhold, mode=mode,
+                   only_one_of_each_stock=only_one_of_each_stock, available_per_day=availablePerDay,
+                   starting_balance=starting_balance)
     
     # Initialization of all important variables
     portfolio_value_list = []  # List with portfolio value per tick
     portfolio_return_list = []  # List with portfolio return per tick
     index_return_list = []  # List with index return per tick
     cash_balance_list = []  # List with cash balance per tick
-    ticks = 1  # Variable to filter dataframes (every iteration: ticks += 1)
-    stock_portfolio = {}  # stock portfolio: key = ticker, value = quantity
-    cash_balance = starting_balance  # initialize cash balance with starting balance
     dates = sp500_filtered_df['Date'].to_list()  # List of dates for plotting and looping
+    index_close = sp500_filtered_df['Close'].to_numpy()
+    index_return = sp500_filtered_df['Return'].to_numpy()
+    live = display_mode == "Live"
+    last_redraw = 0.0  # time of the last candlestick / pie chart redraw
+
+    # layout is created once, every tick only replaces the content of the placeholders
+    with plots_placeholder.container():
+        st.markdown("---")
+        fig_col1, fig_col2 = st.columns(2)
+        candlestick_placeholder = fig_col1.empty()
+        portfolio_placeholder = fig_col1.empty()
+        balance_placeholder = fig_col2.empty()
+        metrics_placeholder = fig_col2.empty()
+
+    def draw_charts(ticks):
+        # the charts are sent completely (O(ticks)), therefore only at most redraw_rate times per second
+        # (unique keys: an unchanged figure would otherwise get the same element id as the previous frame)
+        candlestick_placeholder.plotly_chart(candlestick_chart(sp500_filtered_df.iloc[:ticks]), key=f"candlestick_{ticks}")
+        portfolio_placeholder.plotly_chart(portfolio_chart(bot.portfolio), key=f"portfolio_{ticks}")
+        balance_placeholder.plotly_chart(balance_chart(dates[:ticks], portfolio_value_list, starting_balance), key=f"balance_{ticks}")
 
     # near real-time / live feed simulation
-    for current_date in dates:
+    for ticks, current_date in enumerate(dates, start=1):
         
         if bot_stop:
             break
 
-        sp500_stream_df = sp500_filtered_df.iloc[:ticks]
-
-        cash_balance_list.append(cash_balance)
+        cash_balance_list.append(bot.cash_balance)
 
         ##### GET CURRENT BALANCE #####
         # portfolio_value_list = stocks + cash
-        portfolio_value_list.append(get_current_portfolio_value(trading_bot_df, stock_portfolio, cash_balance, date=current_date))  # calculate balance (current porfolio value)
+        portfolio_value_list.append(bot.portfolio_value(current_date))  # calculate balance (current porfolio value)
         if ticks >= 2:
             portfolio_return_list.append((portfolio_value_list[-1] - portfolio_value_list[-2]) / portfolio_value_list[-2]*100)  # calculate return
-            index_return_list.append(sp500_stream_df['Return'].iloc[-1])  # calculate index return
-
-        with plots_placeholder.container():
-            
-            st.markdown("---")
-
-            # create two columns for charts
-            fig_col1, fig_col2 = st.columns(2)
-            with fig_col1:
-                candlestick_fig = go.Figure(data=[go.Candlestick(x=sp500_stream_df['Date'],
-                                                                open=sp500_stream_df['Open'],
-                                                                high=sp500_stream_df['High'],
-                                                                low=sp500_stream_df['Low'],
-                                                                close=sp500_stream_df['Close'])])
-
-                candlestick_fig.update_layout(title="S&P 500 Candlestick Chart",
-                                            xaxis_title="Date",
-                                            yaxis_title="Price (USD)")
-                
-                # Disable draggable date filter
-                candlestick_fig.update_xaxes(
-                    rangeslider_visible=False,
-                    rangebreaks=[
-                        dict(bounds=["sat", "mon"]),  # hide weekends, eg. hide sat to before mon
-                    ]
-                )
-                st.plotly_chart(candlestick_fig)
+            index_return_list.append(index_return[ticks - 1])  # calculate index return
+        return_on_inverstement_i = index_close[ticks - 1]/index_close[0]*100-100
+        return_on_inverstement_p = portfolio_value_list[-1]/(portfolio_value_list[0])*100-100
+
+        if live:
+            # metrics are small, update them every tick
+            with metrics_placeholder.container():
+                show_metrics(cash_balance_list, portfolio_value_list, return_on_inverstement_i, return_on_inverstement_p)
+            if time.perf_counter() - last_redraw >= 1 / redraw_rate or ticks == len(dates):
+                draw_charts(ticks)
+                last_redraw = time.perf_counter()
+
+        ##### UPDATE PORTFOLIO #####
+        bot.trade(current_date)  # Get updated portfolio based on current date
+
+        if live:
+            time.sleep(tick_rate)
 
-                portfolio_fig = go.Figure(data=[go.Pie(labels=list(stock_portfolio.keys()), values=list(stock_portfolio.values()))])
-                portfolio_fig.update_layout(
-                    title="Stock Portfolio Distribution (Quantity per stock)"
-                )
-                if len(stock_portfolio.keys())<20:
-                    portfolio_fig.update_traces(
-                        textinfo='label'
-                    )
-                else:
-                    portfolio_fig.update_traces(
-                        textinfo='none'
-                    )
-                st.plotly_chart(portfolio_fig)
-
-            with fig_col2:
-                if portfolio_value_list[-1] < starting_balance:
-                    color="red"
-                else:
-                    color="green"
-
-                balance_fig = px.line(
-                    x = dates[:ticks],
-                    y = portfolio_value_list[:ticks],
-                    color_discrete_sequence=[color]
-                )
+    if not live and portfolio_value_list:
+        # fast forward: draw only the final state
+        draw_charts(len(portfolio_value_list))
+        with metrics_placeholder.container():
+            show_metrics(cash_balance_list, portfolio_value_list, return_on_inverstement_i, return_on_inverstement_p)
 
-                balance_fig.update_layout(title="Balance of Trading bot (Cash + Stocks/Crypto value)",
-                            xaxis_title="Date",
-                            yaxis_title="Balance (USD)"
-                            )
-
-                st.plotly_chart(balance_fig)
-
-                if len(portfolio_value_list) > 1:
-                    st.metric(
-                        label="Cash balance",
-                        value="${:.2f}".format(cash_balance_list[-1]),
-                        delta=round(cash_balance_list[-1]-cash_balance_list[-2], 2)
-                    )
-
-                    st.metric(
-                        label="Stocks/Crypto value",
-                        value="${:.2f}".format(portfolio_value_list[-1] - cash_balance_list[-1]),
-                        delta=round((portfolio_value_list[-1]-cash_balance_list[-1])-(portfolio_value_list[-2]-cash_balance_list[-2]), 2)
-                    )
-
-                    st.metric(
-                        label="Total Portfolio Value",
-                        value="${:.2f}".format(portfolio_value_list[-1]),
-                        delta=round(portfolio_value_list[-1]-portfolio_value_list[-2], 2)
-                    )
-                    return_on_inverstement_i = sp500_stream_df['Close'].iloc[-1]/(sp500_stream_df['Close'].iloc[0])*100-100
-                    st.metric(
-                        label="Index Performance",
-                        value="{:.2f} %".format(return_on_inverstement_i)
-                    )
-
-                    return_on_inverstement_p = portfolio_value_list[-1]/(portfolio_value_list[0])*100-100
-                    st.metric(
-                        label="Bot Performance",
-                        value="{:.2f} %".format(return_on_inverstement_p)
-                    )
-
-
-            ##### UPDATE PORTFOLIO #####
-            stock_portfolio, cash_balance = update_portfolio(trading_bot_df, stock_portfolio, cash_balance, date=current_date, threshhold=risk_threshhold, only_one_of_each_stock=only_one_of_each_stock, mode=mode)  # Get updated portfolio based on current date
-            
-            ticks += 1
-            time.sleep(tick_rate)
     st.markdown("---")
     st.write("Performance Report")
     report_col1 , report_col2, report_col3, report_col4 = st.columns(4)
@@ -0,0 +1,204 @@
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from feature_store import load_table, PREDICTION_COLUMNS
+from signal_index import SignalIndex, sort_signals
+from membership_index import MembershipIndex
+
+
+MODES = ['buy1perDay', 'buybyBudget_SellFriday']
+RISKFREE_RATE = 4  # Riskfree Rate US 2023 = 4%
+
+
+class Backtest:
+    """
+    Handelslogik von update_portfolio (app_V2/app_V3) ohne GUI, auf den Arrays eines SignalIndex.
+
+    Ein Handelstag betrachtet nur die Zeilen dieses Tages (Slice des SignalIndex) in derselben
+    Reihenfolge wie die GUI, dadurch entstehen dieselben Trades.
+
+    Parameter:
+    - signals: SignalIndex oder DataFrame mit Ticker, Date, Close, Prediction_0..2 (bereits sortiert, siehe sort_signals)
+    - threshhold: minimale Wahrscheinlichkeit für einen Trade
+    - mode: 'buy1perDay' oder 'buybyBudget_SellFriday'
+    - only_one_of_each_stock: buy1perDay kauft höchstens 1 Stück pro Ticker
+    - available_per_day: buybyBudget_SellFriday investiert pro Kauf cash_balance / available_per_day
+    - membership: MembershipIndex, gekauft werden nur Ticker, die an diesem Tag im Index sind
+      (gehaltene Positionen werden weiter bewertet und können verkauft werden)
+    """
+
+    def __init__(self, signals, threshhold=0.75, mode='buy1perDay', only_one_of_each_stock=False,
+                 available_per_day=3, starting_balance=1000, membership=None):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, got {mode!r}")
+        self.threshhold = threshhold
+        self.mode = mode
+        self.only_one_of_each_stock = only_one_of_each_stock
+        self.available_per_day = available_per_day
+        self.signals = signals if isinstance(signals, SignalIndex) else SignalIndex(signals)
+        self.buyable = None
+        if membership is not None:
+            row_dates = np.repeat(self.signals.dates, np.diff(self.signals.starts))
+            self.buyable = membership.mask(self.signals.tickers, row_dates)
+        self.reset(starting_balance)
+
+    def reset(self, starting_balance):
+        self.portfolio = {}  # key = ticker, value = quantity
+        self.cash_balance = starting_balance
+        self.trades = []
+
+    def portfolio_value(self, date):
+        return self.signals.price_matrix.portfolio_value(self.portfolio, self.cash_balance, date)
+
+    def trade(self, date):
+        """
+        Führt alle Trades eines Tages aus (gleiche Regeln wie update_portfolio in der GUI).
+        """
+        start, buy, sell = self.signals.signals(date, self.threshhold)
+        if self.buyable is not None:
+            buy = buy & self.buyable[start:start + len(buy)]
+        sell_friday = self.mode == 'buybyBudget_SellFriday' and self.signals.is_friday(date)
+        # on fridays every row can sell a holding, otherwise only rows with a confident buy or sell signal
+        candidates = start + (np.arange(len(buy)) if sell_friday else np.flatnonzero(buy | sell))
+
+        tickers = self.signals.tickers
+        prices = self.signals.close
+        portfolio = self.portfolio
+        cash_balance = self.cash_balance
+        for k in candidates.tolist():
+            ticker = str(tickers[k])
+            close = float(prices[k])
+
+            # BUY1 MODE
+            if self.mode == 'buy1perDay':
+                if buy[k - start] and cash_balance - close > 0:
+                    if not self.only_one_of_each_stock and ticker in portfolio:
+                        portfolio[ticker] += 1
+                        cash_balance -= close
+                        self.trades.append((date, ticker, 'BUY', 1, close))
+                    elif ticker not in portfolio:
+                        portfolio[ticker] = 1
+                        cash_balance -= close
+                        self.trades.append((date, ticker, 'BUY', 1, close))
+                elif sell[k - start] and ticker in portfolio:
+                    if portfolio[ticker] == 1:
+                        del portfolio[ticker]
+                    else:
+                        portfolio[ticker] -= 1
+                    cash_balance += close
+                    self.trades.append((date, ticker, 'SELL', 1, close))
+
+            # SELL_FRIDAY MODE
+            else:
+                if buy[k - start] and cash_balance - close > 0:
+                    budget = cash_balance / self.available_per_day
+                    stock_amount = int(budget // close)
+                    if stock_amount > 0:  # Buy only if amount is greater than 0
+                        portfolio[ticker] = portfolio.get(ticker, 0) + stock_amount
+                        cash_balance -= stock_amount * close
+                        self.trades.append((date, ticker, 'BUY', stock_amount, close))
+                if sell_friday and ticker in portfolio:
+                    cash_balance += close * portfolio[ticker]
+                    self.trades.append((date, ticker, 'SELL', portfolio[ticker], close))
+                    del portfolio[ticker]
+
+        self.cash_balance = cash_balance
+
+    def run(self, dates, starting_balance=None):
+        """
+        Simuliert alle Tage wie die GUI: Bewertung des Portfolios, danach die Trades des Tages.
+
+        Rückgabewert:
+        - equity: DataFrame mit Date, Cash, Value (Cash + Aktien/Crypto) pro Tag
+        - trades: DataFrame mit Date, Ticker, Action, Quantity, Price
+        """
+        if starting_balance is not None:
+            self.reset(starting_balance)
+        cash_balance_list = []
+        portfolio_value_list = []
+        for date in dates:
+            cash_balance_list.append(self.cash_balance)
+            portfolio_value_list.append(self.portfolio_value(date))
+            self.trade(date)
+
+        equity = pd.DataFrame({'Date': list(dates), 'Cash': cash_balance_list, 'Value': portfolio_value_list})
+        trades = pd.DataFrame(self.trades, columns=['Date', 'Ticker', 'Action', 'Quantity', 'Price'])
+        return equity, trades
+
+
+def performance(values, riskfree_rate=RISKFREE_RATE):
+    """
+    Kennzahlen wie im Performance Report der GUI.
+
+    Parameter:
+    - values: Portfolio-Werte (oder Index-Schlusskurse) pro Tag
+
+    Rückgabewert:
+    - Dictionary mit return (%), std (% der Tagesrenditen), sharpe und max_drawdown (%)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    returns = np.diff(values) / values[:-1] * 100
+    total_return = values[-1] / values[0] * 100 - 100
+    std = np.std(returns)
+    peak = np.maximum.accumulate(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = (total_return - riskfree_rate) / std
+    return {
+        'return': total_return,
+        'std': std,
+        'sharpe': sharpe,
+        'max_drawdown': ((values - peak) / peak).min() * 100,
+    }
+
+
+def run_backtest(trading_bot_df, index_df, start_date, end_date, starting_balance=1000, **settings):
+    """
+    Backtest über alle Handelstage des Index (wie die GUI: die Tage kommen aus index_df).
+
+    Rückgabewert:
+    - equity, trades (siehe Backtest.run) und report: Dictionary {'bot': performance, 'index': performance}
+    """
+    dates = pd.to_datetime(index_df['Date'])
+    index_df = index_df[(dates >= pd.to_datetime(start_date)) & (dates <= pd.to_datetime(end_date))]
+    bot = Backtest(trading_bot_df, starting_balance=starting_balance, **settings)
+    equity, trades = bot.run(index_df['Date'].tolist())
+    report = {'bot': performance(equity['Value']), 'index': performance(index_df['Close'])}
+    return equity, trades, report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest the trading bot on predicted data without the GUI.")
+    parser.add_argument("--data", default='predicted_data/predicted_data_V1', help="predictions without file ending (parquet or csv)")
+    parser.add_argument("--index", default='../CNN/test_data/^GSPC', help="index prices, the trading days come from this file")
+    parser.add_argument("--start", default='2000-01-01')
+    parser.add_argument("--end", default='2100-01-01')
+    parser.add_argument("--balance", type=float, default=1000, help="starting balance ($)")
+    parser.add_argument("--threshhold", type=float, default=0.75, help="minimum CNN prediction probability to trade")
+    parser.add_argument("--mode", choices=MODES, default='buy1perDay')
+    parser.add_argument("--only-one", action='store_true', help="buy1perDay: hold maximum 1 of each stock or crypto")
+    parser.add_argument("--budget", type=int, default=3, help="buybyBudget_SellFriday: available budget per day (x/10)")
+    parser.add_argument("--membership", default=None, help="only buy tickers that were in the index on that day (membership csv)")
+    parser.add_argument("--equity", default=None, help="save the equity curve to this csv file")
+    parser.add_argument("--trades", default=None, help="save the trades to this csv file")
+    args = parser.parse_args()
+
+    trading_bot_df = sort_signals(load_table(args.data, columns=PREDICTION_COLUMNS))
+    index_df = load_table(args.index)
+
+    start = time.perf_counter()
+    equity, trades, report = run_backtest(trading_bot_df, index_df, args.start, args.end, args.balance,
+                                          threshhold=args.threshhold, mode=args.mode,
+                                          only_one_of_each_stock=args.only_one, available_per_day=args.budget,
+                                          membership=MembershipIndex.load(args.membership) if args.membership else None)
+    duration = time.perf_counter() - start
+
+    print(f"{len(equity)} days, {len(trades)} trades ({duration * 1000:.1f} ms)")
+    for name, metrics in report.items():
+        print(f"{name:>5}: return {metrics['return']:.2f} % | std {metrics['std']:.2f} % | "
+              f"sharpe {metrics['sharpe']:.2f} | max drawdown {metrics['max_drawdown']:.2f} %")
+    if args.equity:
+        equity.to_csv(args.equity, index=False)
+    if args.trades:
+        trades.to_csv(args.trades, index=False)
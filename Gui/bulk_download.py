@@ -0,0 +1,148 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from price_store import PriceStore, YFinanceSource
+
+
+REQUIRED_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+class DownloadError(Exception):
+    pass
+
+
+class RateLimiter:
+    """
+    Begrenzt die Anzahl Anfragen pro Sekunde über alle Threads (ein Limiter pro Datenquelle).
+    rate=None oder 0 bedeutet kein Limit.
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def check_frame(data):
+    """
+    Prüft einen heruntergeladenen DataFrame.
+
+    Rückgabewert:
+    - None falls die Daten brauchbar sind, sonst eine kurze Beschreibung des Problems
+    """
+    missing = [column for column in REQUIRED_COLUMNS if column not in data.columns]
+    if missing:
+        return f'missing columns {missing}'
+    prices = data[REQUIRED_COLUMNS].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    if np.isnan(prices[:, 3]).all():
+        return 'no close prices'
+    if (prices[:, :4] < 0).any():
+        return 'negative prices'
+    return None
+
+
+class ReliableSource:
+    """
+    Umhüllt eine Datenquelle (YFinanceSource, CSVDirectorySource, HTTPSource, ...) mit
+    Rate-Limit, Wiederholungen mit exponentiellem Backoff und einer Prüfung der Daten.
+
+    Leere Antworten sind gültig (z.B. keine neuen Tage); Exceptions und kaputte DataFrames werden
+    bis zu `retries` mal wiederholt, danach wird ein DownloadError ausgelöst.
+    """
+
+    def __init__(self, source, rate=None, retries=3, backoff=1.0):
+        self.source = source
+        self.limiter = RateLimiter(rate)
+        self.retries = retries
+        self.backoff = backoff
+
+    def fetch(self, symbol, start, end):
+        problem = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+            self.limiter.wait()
+            try:
+                data = self.source.fetch(symbol, start, end)
+            except Exception as error:
+                problem = f'{type(error).__name__}: {error}'
+                continue
+            if data is None or data.empty:
+                return pd.DataFrame()
+            problem = check_frame(data)
+            if problem is None:
+                return data
+        raise DownloadError(f'{problem} (after {self.retries + 1} attempts)')
+
+
+def bulk_refresh(symbols, store=None, source=None, start='2022-06-01', end='2024-04-24',
+                 workers=8, rate=None, retries=3, backoff=1.0):
+    """
+    Aktualisiert den PriceStore für viele Ticker gleichzeitig (ThreadPoolExecutor).
+
+    Parameter:
+    - symbols: Liste von Aktiensymbolen
+    - store: PriceStore (Standard: PriceStore('data'))
+    - source: Datenquelle mit fetch(symbol, start, end) (Standard: YFinanceSource())
+    - workers: maximale Anzahl gleichzeitiger Downloads
+    - rate: maximale Anzahl Anfragen pro Sekunde an die Datenquelle (None = kein Limit)
+    - retries, backoff: Wiederholungen pro Anfrage, Wartezeit backoff * 2^n Sekunden
+
+    Rückgabewert:
+    - report: Dictionary mit
+        'new_rows': erstes neues Datum pro Ticker (None falls nichts Neues)
+        'empty': Ticker ohne Daten
+        'failed': Dictionary Ticker -> Fehlermeldung
+    """
+    store = store if store is not None else PriceStore()
+    source = ReliableSource(source if source is not None else YFinanceSource(), rate, retries, backoff)
+    report = {'new_rows': {}, 'empty': [], 'failed': {}}
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {executor.submit(store.refresh, symbol, source, start, end): symbol for symbol in symbols}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                data, first_new_date = future.result()
+            except Exception as error:
+                report['failed'][symbol] = str(error)
+                print(f'Download für {symbol} fehlgeschlagen: {error}')
+                continue
+            if data is None:
+                report['empty'].append(symbol)
+                print(f'Aktiendaten für {symbol} nicht gespeichert (dataframe ist leer).')
+            elif first_new_date is None:
+                report['new_rows'][symbol] = None
+                print(f'Aktiendaten für {symbol} sind aktuell ({store.path(symbol)}).')
+            else:
+                report['new_rows'][symbol] = first_new_date
+                print(f'Aktiendaten für {symbol} ab {first_new_date.date()} heruntergeladen und in {store.path(symbol)} gespeichert.')
+
+    # keep the order of the symbol list in the report
+    report['new_rows'] = {symbol: report['new_rows'][symbol] for symbol in symbols if symbol in report['new_rows']}
+    report['empty'] = [symbol for symbol in symbols if symbol in report['empty']]
+    return report
+
+
+def print_download_summary(report):
+    updated = [symbol for symbol, date in report['new_rows'].items() if date is not None]
+    print(f"Download: {len(report['new_rows'])} ok ({len(updated)} updated) | "
+          f"{len(report['empty'])} empty | {len(report['failed'])} failed")
+    if report['empty']:
+        print('  empty:', ', '.join(report['empty']))
+    for symbol, error in report['failed'].items():
+        print(f'  failed: {symbol} ({error})')
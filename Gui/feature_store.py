@@ -0,0 +1,221 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+
+
+PREDICTION_COLUMNS = ['Ticker', 'Date', 'Close', 'Prediction_0', 'Prediction_1', 'Prediction_2']
+
+
+# prices used for trading and portfolio valuation stay float64
+FLOAT64_COLUMNS = ['Close']
+
+
+def to_float32(df):
+    # float64 columns -> float32 (halves the file size, the model works in float32 anyway)
+    float_columns = df.select_dtypes(include=[np.float64]).columns.difference(FLOAT64_COLUMNS)
+    return df.astype({column: np.float32 for column in float_columns})
+
+
+def write_table(df, path, partition_cols=None):
+    """
+    Speichert einen DataFrame als Parquet (spaltenweise, float32).
+
+    Parameter:
+    - df: DataFrame mit den Spalten Ticker und Date (kein Index)
+    - path: Datei (ohne partition_cols) oder Ordner (mit partition_cols)
+    - partition_cols: z.B. ['Ticker', 'year'] -> Ordner Ticker=AAPL/year=2023/...parquet
+      ('year' wird aus Date abgeleitet und beim Lesen wieder entfernt)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    df = to_float32(df)
+    if partition_cols and 'year' in partition_cols:
+        df = df.assign(year=pd.to_datetime(df['Date']).dt.year)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    if partition_cols:
+        # replace an existing dataset instead of adding files to it
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        pq.write_to_dataset(table, path, partition_cols=list(partition_cols))
+    else:
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+            print("Created Folder:", folder)
+        pq.write_table(table, path)
+
+
+def table_columns(path):
+    # column names of a parquet file or dataset without reading any data (in the written order)
+    import pyarrow.dataset as ds
+    names = [name for name in ds.dataset(path, partitioning='hive').schema.names if name != 'year']
+    return ['Ticker'] + [name for name in names if name != 'Ticker'] if 'Ticker' in names else names
+
+
+def find_table(base_path):
+    # {base_path}.parquet, parquet folder {base_path} or {base_path}.csv (in this order), None if nothing exists
+    for path in (base_path + '.parquet', base_path):
+        if os.path.exists(path) and (path.endswith('.parquet') or os.path.isdir(path)):
+            return path
+    if os.path.exists(base_path + '.csv'):
+        return base_path + '.csv'
+    print("Path:", base_path, "does not exist!")
+    return None
+
+
+def table_version(base_path):
+    """
+    Pfad und letzte Änderungszeit der Tabelle (bei einem Parquet-Ordner die neueste Datei), z.B. als Cache-Schlüssel:
+    ändert sich, sobald die Tabelle neu geschrieben wird. None falls keine Datei existiert.
+    """
+    path = find_table(base_path)
+    if path is None:
+        return None
+    mtime = os.path.getmtime(path)
+    if os.path.isdir(path):
+        for folder, _, files in os.walk(path):
+            mtime = max([mtime, os.path.getmtime(folder)] + [os.path.getmtime(os.path.join(folder, name)) for name in files])
+    return path, mtime
+
+
+def csv_usecols(path, columns):
+    if columns is None:
+        return None
+    header = pd.read_csv(path, nrows=0).columns
+    return [column for column in header if column in columns or (column == 'Unnamed: 0' and 'Ticker' in columns)]
+
+
+def read_table(path, columns=None, filters=None):
+    """
+    Liest eine Parquet-Datei oder einen partitionierten Parquet-Ordner.
+
+    Parameter:
+    - columns: nur diese Spalten lesen (None = alle)
+    - filters: pyarrow Filter, z.B. [('Ticker', 'in', ['AAPL', 'MSFT'])] (liest nur die passenden Partitionen)
+    """
+    df = pd.read_parquet(path, columns=columns, filters=filters)
+    if 'year' in df.columns:
+        df = df.drop(columns='year')
+    # partition columns come back as categoricals
+    if 'Ticker' in df.columns and isinstance(df['Ticker'].dtype, pd.CategoricalDtype):
+        df['Ticker'] = df['Ticker'].astype(str)
+    # partition columns are appended at the end, restore the written column order
+    order = columns if columns is not None else ['Ticker'] + [column for column in df.columns if column != 'Ticker']
+    return df[[column for column in order if column in df.columns]]
+
+
+def load_table(base_path, columns=None):
+    """
+    Liest {base_path}.parquet, den Parquet-Ordner {base_path} oder {base_path}.csv (in dieser Reihenfolge).
+
+    Das Resultat sieht immer gleich aus wie bei pd.read_csv: Date als Text 'YYYY-MM-DD',
+    die Ticker-Spalte einer alten merged_data CSV ('Unnamed: 0') heisst 'Ticker'.
+
+    Rückgabewert:
+    - df: DataFrame oder None falls keine Datei existiert
+    """
+    path = find_table(base_path)
+    if path is None:
+        return None
+    if path.endswith('.csv'):
+        return as_csv_frame(pd.read_csv(path, usecols=csv_usecols(path, columns)))
+    return as_csv_frame(read_table(path, columns=columns))
+
+
+def as_csv_frame(df):
+    # same shape as pd.read_csv: Date as 'YYYY-MM-DD' text, 'Unnamed: 0' (old merged CSV) -> 'Ticker'
+    if 'Date' in df.columns and not pd.api.types.is_string_dtype(df['Date']):
+        df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
+    return df.rename(columns={'Unnamed: 0': 'Ticker'})
+
+
+def iter_table(base_path, chunk_size=100000, columns=None):
+    """
+    Wie load_table, liefert die Zeilen aber in DataFrames mit höchstens chunk_size Zeilen
+    (gleiche Reihenfolge wie load_table), damit nie die ganze Tabelle im Speicher ist.
+    """
+    path = find_table(base_path)
+    if path is None:
+        return
+    if path.endswith('.csv'):
+        for chunk in pd.read_csv(path, usecols=csv_usecols(path, columns), chunksize=chunk_size):
+            yield as_csv_frame(chunk)
+        return
+
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(path, partitioning='hive')
+    names = columns if columns is not None else table_columns(path)
+    batches, rows = [], 0
+    # one file of a partitioned dataset holds only ~250 rows, collect batches up to chunk_size
+    for batch in dataset.to_batches(columns=names, batch_size=chunk_size):
+        batches.append(batch)
+        rows += batch.num_rows
+        while rows >= chunk_size:
+            table = pa.Table.from_batches(batches)
+            yield to_frame(table.slice(0, chunk_size))
+            rest = table.slice(chunk_size)
+            batches, rows = rest.to_batches(), rest.num_rows
+    if rows:
+        yield to_frame(pa.Table.from_batches(batches))
+
+
+def to_frame(table):
+    df = table.to_pandas()
+    if 'Ticker' in df.columns and isinstance(df['Ticker'].dtype, pd.CategoricalDtype):
+        df['Ticker'] = df['Ticker'].astype(str)
+    return as_csv_frame(df)
+
+
+class TableWriter:
+    """
+    Schreibt einen DataFrame stückweise in eine Datei (parquet: eine Row-Group pro write, csv: anhängen).
+    """
+
+    def __init__(self, path, file_format='parquet'):
+        self.path = path
+        self.file_format = file_format
+        self.writer = None
+        self.rows = 0
+
+    def write(self, df):
+        if self.file_format == 'csv':
+            df.to_csv(self.path, mode='w' if self.rows == 0 else 'a', header=self.rows == 0, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(to_float32(df), preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            self.writer.write_table(table)
+        self.rows += len(df)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert CSV files (e.g. predicted_data/*.csv) to parquet.")
+    parser.add_argument("files", nargs='+', help="csv files, each is written next to it as .parquet")
+    args = parser.parse_args()
+
+    for file_path in args.files:
+        base_path = os.path.splitext(file_path)[0]
+        df = pd.read_csv(file_path).rename(columns={'Unnamed: 0': 'Ticker'})
+        write_table(df, base_path + '.parquet')
+        print(f"{file_path} -> {base_path}.parquet ({len(df)} rows)")
@@ -0,0 +1,419 @@
+import numpy as np
+import pandas as pd
+
+from indicator_engine import indicator_columns
+
+
+class PrefixSums:
+    """
+    Laufende Summe einer Reihe (wie np.cumsum in indicator_engine.rolling_sum) mit den letzten `size` Ständen.
+
+    Die Summe über die letzten w Werte ist cum[n] - cum[n - w], dieselbe Differenz wie in der
+    Batch-Berechnung, daher sind die Resultate bitgleich. NaN zählt als 0 und macht das Fenster ungültig.
+
+    Parameter:
+    - size: grösstes Fenster (plus Abstand für ago), das abgefragt wird
+    - width: Anzahl paralleler Reihen (z.B. eine pro Fenster)
+    """
+
+    def __init__(self, size, width=1):
+        self.length = size + 1
+        self.cum = np.zeros((self.length, width))
+        self.valid = np.zeros((self.length, width), dtype=np.int64)
+        self.columns = np.arange(width) if width > 1 else 0
+        self.n = 0
+
+    def push(self, x):
+        x = np.asarray(x, dtype=np.float64)
+        valid = ~np.isnan(x)
+        last = self.n % self.length
+        self.n += 1
+        self.cum[self.n % self.length] = self.cum[last] + np.where(valid, x, 0.0)
+        self.valid[self.n % self.length] = self.valid[last] + valid
+
+    def sum(self, windows, ago=0):
+        # sum of the `windows` values ending `ago` pushes back (NaN values count as 0), NaN if there are fewer values
+        end = self.n - ago
+        sums = self.cum[end % self.length] - self.cum[(end - windows) % self.length, self.columns]
+        return np.where(end >= windows, sums, np.nan)
+
+    def complete(self, windows, ago=0):
+        end = self.n - ago
+        counts = self.valid[end % self.length] - self.valid[(end - windows) % self.length, self.columns]
+        return (end >= windows) & (counts == windows)
+
+    def rolling_sum(self, windows):
+        # like indicator_engine.rolling_sum for the newest row
+        idx = (self.n - windows) % self.length
+        last = self.n % self.length
+        sums = self.cum[last] - self.cum[idx, self.columns]
+        complete = (self.n >= windows) & (self.valid[last] - self.valid[idx, self.columns] == windows)
+        return np.where(complete, sums, np.nan)
+
+
+class EWMState:
+    """
+    Zustand von indicator_engine.ewm für mehrere alpha gleichzeitig (gleiche Rekursion wie lfilter).
+
+    Führende NaN werden übersprungen, die ersten min_periods - 1 gültigen Werte liefern NaN.
+    """
+
+    def __init__(self, alpha, min_periods=0, adjust=False):
+        self.alpha = np.asarray(alpha, dtype=np.float64)
+        self.beta = 1.0 - self.alpha
+        self.skip = np.maximum(np.asarray(min_periods), 1) - 1
+        self.adjust = adjust
+        shape = self.alpha.shape
+        self.started = np.zeros(shape, dtype=bool)
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.z = np.zeros(shape)
+        self.z_denominator = np.zeros(shape)
+        self.ready = False
+
+    def update(self, x):
+        if not self.ready:
+            return self.warm_up(x)
+        # all values started and past min_periods
+        if self.adjust:
+            numerator = x + self.z
+            denominator = 1.0 + self.z_denominator
+            self.z = self.beta * numerator
+            self.z_denominator = self.beta * denominator
+            return numerator / denominator
+        y = self.alpha * x + self.z
+        self.z = self.beta * y
+        return y
+
+    def warm_up(self, x):
+        x = np.broadcast_to(np.asarray(x, dtype=np.float64), self.alpha.shape)
+        start = ~self.started & ~np.isnan(x)
+        if start.any():
+            # lfilter(..., zi=[beta * values[0]]) for adjust=False, zi = 0 for adjust=True
+            if not self.adjust:
+                self.z = np.where(start, self.beta * x, self.z)
+            self.started |= start
+        if self.adjust:
+            numerator = x + self.z
+            denominator = 1.0 + self.z_denominator
+            self.z = np.where(self.started, self.beta * numerator, self.z)
+            self.z_denominator = np.where(self.started, self.beta * denominator, self.z_denominator)
+            y = numerator / denominator
+        else:
+            y = self.alpha * x + self.z
+            self.z = np.where(self.started, self.beta * y, self.z)
+        self.count += self.started
+        valid = self.started & (self.count > self.skip)
+        self.ready = bool(valid.all())
+        return np.where(valid, y, np.nan)
+
+
+class RingBuffer:
+    """
+    Die letzten `size` Zeilen (Spalten z.B. High, Low, Close) für Extremwerte, ROC, CCI und Standardabweichung.
+    Fehlen noch Zeilen, liefert last() NaN davor, Fenster über die Historie hinaus ergeben damit NaN.
+    """
+
+    def __init__(self, size, width):
+        self.size = size
+        self.values = np.full((size, width), np.nan)
+        self.n = 0
+
+    def push(self, row):
+        self.values[self.n % self.size] = row
+        self.n += 1
+
+    def last(self, count):
+        # the newest `count` rows in chronological order (NaN rows in front if there are fewer)
+        return self.values[np.arange(self.n - count, self.n) % self.size] if self.n >= count else \
+            np.concatenate((np.full((count - self.n, self.values.shape[1]), np.nan), self.values[:self.n]))
+
+
+class WilderState:
+    """
+    Wilder-Glättung von ADX bzw. ATR für ein Fenster, wie in indicator_engine.adx/atr.
+
+    Die ersten Werte werden gesammelt, bis die Startsumme bzw. der Startmittelwert feststeht
+    (np.sum/np.mean über dieselben Werte wie in der Batch-Berechnung), danach läuft die Rekursion
+    y = x + (1 - 1/window) * y_prev.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.beta = 1.0 - 1.0 / window
+        self.first_values = []
+        self.value = None
+
+    def update(self, x, start=np.sum):
+        if self.value is None:
+            self.first_values.append(x)
+            if len(self.first_values) == self.window:
+                self.value = start(np.array(self.first_values))
+                self.first_values = None
+            return self.value
+        self.value = x + self.beta * self.value
+        return self.value
+
+
+class IncrementalIndicators:
+    """
+    Technische Indikatoren einer Aktie, Zeile für Zeile fortgeschrieben (Paper Trading: ein neuer Tag pro Ticker).
+
+    Der Zustand (laufende Summen, EWM- und Wilder-Zustände, die letzten max(func_windows) + 1 Kurse) wird pro
+    neuer Zeile in O(Anzahl Fenster) aktualisiert, statt die ganze Historie neu zu berechnen.
+    Die Werte entsprechen compute_indicators über die ganze Historie:
+    - alle Indikatoren ausser den Bollinger Bändern bitgleich
+    - Bollinger Bänder: Standardabweichung über das Fenster (die Batch-Berechnung zentriert mit dem Mittelwert
+      der ganzen Historie, der hier nicht bekannt ist); Unterschiede im Bereich ihrer Rundungsfehler
+    - Warm-up: ADX (erste 2 * window Zeilen) und TRIX (erste Zeile) wie bei einer langen Historie
+      (die Batch-Berechnung gibt dort NaN, falls die ganze Historie kürzer ist)
+    Die Zeilen müssen lückenlos sein (keine NaN-Kurse); der Zustand lässt sich mit pickle speichern.
+
+    Parameter:
+    - func_windows: Liste der Fenstergrössen (wie add_technical_indicators)
+    """
+
+    def __init__(self, func_windows=[3,5,7,9,11,13,15,17,19,21]):
+        self.func_windows = list(func_windows)
+        self.columns = indicator_columns(self.func_windows)
+        windows = np.array(self.func_windows)
+        self.windows = windows
+        self.half_windows = np.array([int(i / 2) for i in self.func_windows])
+        self.sqrt_windows = np.array([int(np.sqrt(i)) for i in self.func_windows])
+        self.pairs = np.column_stack((windows, windows))  # same windows for two parallel series
+        size = int(windows.max()) + 1
+        self.size = size
+        self.rows = 0
+
+        self.close_sums = PrefixSums(size)
+        self.weighted_sums = PrefixSums(size)  # position * close for WMA
+        self.hma_sums = PrefixSums(int(self.sqrt_windows.max()), width=len(windows))
+        self.mfi_sums = PrefixSums(size, width=2)  # positive and negative money flow
+        self.rsi_sums = PrefixSums(size + 1, width=2)  # gains and losses
+        self.cmf_sums = PrefixSums(size, width=2)  # money flow volume and volume
+        self.prices = RingBuffer(size, 4)  # high, low, close, typical price
+
+        alpha = 2.0 / (windows + 1)
+        self.ema = EWMState(alpha)
+        self.trix = [EWMState(alpha, windows) for _ in range(3)]
+        self.trix_prev = np.full(len(windows), np.nan)
+        self.cmo = [EWMState(1.0 / windows, windows, adjust=True) for _ in range(2)]
+        self.macd_fast = EWMState(2.0 / 13, 12)
+        self.macd_slow = EWMState(2.0 / 27, 26)
+        self.macd_signal = EWMState(2.0 / 10, 9)
+        self.ppo_signal = EWMState(2.0 / 10, 9)
+
+        self.prev_high = self.prev_low = self.prev_close = self.prev_typical = np.nan
+        self.adx_sums = [[WilderState(i) for _ in range(3)] for i in self.func_windows]  # true range, +DM, -DM
+        self.adx_start = [[] for _ in self.func_windows]
+        self.adx = [None] * len(self.func_windows)
+        self.atr = [WilderState(i) for i in self.func_windows]
+
+    @classmethod
+    def from_history(cls, data, func_windows=[3,5,7,9,11,13,15,17,19,21]):
+        """
+        Baut den Zustand aus der bisherigen Historie auf (jede Zeile wird einmal fortgeschrieben).
+
+        Parameter:
+        - data: DataFrame mit Open, High, Low, Close, Volume in zeitlicher Reihenfolge
+
+        Rückgabewert:
+        - (state, features): Zustand nach der letzten Zeile und die Indikatoren aller Zeilen (n_rows, n_features)
+        """
+        state = cls(func_windows)
+        ohlcv = data[['Open', 'High', 'Low', 'Close', 'Volume']].to_numpy(dtype=np.float64)
+        features = np.empty((len(ohlcv), len(state.columns)))
+        for k, row in enumerate(ohlcv):
+            features[k] = state.update(*row)
+        return state, features
+
+    def update(self, open, high, low, close, volume):
+        """
+        Schreibt alle Indikatoren mit einer neuen Zeile fort.
+
+        Rückgabewert:
+        - features: Array mit den Indikatoren der neuen Zeile, Spalten wie self.columns
+        """
+        # numpy scalars: divisions by zero (e.g. high == low) give inf/NaN like the batch calculation
+        open, high, low, close, volume = np.float64((open, high, low, close, volume))
+        t = self.rows
+        windows = self.windows
+        typical_price = (high + low + close) / 3.0
+        self.close_sums.push(close)
+        self.weighted_sums.push(t * close)
+        self.prices.push((high, low, close, typical_price))
+        recent = self.prices.last(self.size)
+        columns = []
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # SMA, EMA
+            sma = self.close_sums.rolling_sum(windows) / windows
+            columns.append(sma)
+            columns.append(self.ema.update(close))
+
+            # TRIX
+            ema3 = close
+            for ewm_state in self.trix:
+                ema3 = ewm_state.update(ema3)
+            columns.append((ema3 - self.trix_prev) / self.trix_prev * 100)
+            self.trix_prev = ema3
+
+            # MFI
+            up_down = 1 if typical_price > self.prev_typical else -1 if typical_price < self.prev_typical else 0
+            money_flow = typical_price * volume * up_down
+            if np.isnan(money_flow):
+                self.mfi_sums.push((np.nan, np.nan))
+            else:
+                self.mfi_sums.push((money_flow if money_flow >= 0.0 else 0.0, money_flow if money_flow < 0.0 else 0.0))
+            sums = self.mfi_sums.rolling_sum(self.pairs)
+            ratio = sums[:, 0] / np.abs(sums[:, 1])
+            columns.append(100 - (100 / (1 + ratio)))
+
+            # RSI (smoothed with the previous window's averages, see indicator_engine.rsi_smooth)
+            rsi = np.full(len(windows), np.nan)
+            if t >= 1:
+                diff = close - self.prev_close
+                gain = diff if diff >= 0 else 0.0
+                loss = abs(diff if diff < 0 else 0.0)
+                self.rsi_sums.push((gain, loss) if not np.isnan(diff) else (np.nan, np.nan))
+                complete = self.rsi_sums.complete(self.pairs).all(axis=1)
+                avg = self.rsi_sums.sum(self.pairs) / self.pairs
+                avg_prev = self.rsi_sums.sum(self.pairs, ago=1) / self.pairs
+                first = 100 - (100 / (1 + (avg[:, 0] / avg[:, 1])))
+                smoothed = 100 - (100 / (1 + ((avg_prev[:, 0] * (windows - 1) + gain) /
+                                              (avg_prev[:, 1] * (windows - 1) + loss))))
+                rsi = np.where(t == windows, first, np.where(t > windows, smoothed, np.nan))
+                rsi[~complete] = np.nan
+            columns.append(rsi)
+
+            # Williams %R (rolling extremes from the newest values backwards)
+            highest_high = np.maximum.accumulate(recent[::-1, 0])[windows - 1]
+            lowest_low = np.minimum.accumulate(recent[::-1, 1])[windows - 1]
+            columns.append(((highest_high - close) / (highest_high - lowest_low)) * (-100))
+
+            # WMA
+            numerator = self.weighted_sums.rolling_sum(windows) - (t - windows) * self.close_sums.rolling_sum(windows)
+            columns.append(numerator * 2 / (windows * (windows + 1)))
+
+            # HMA
+            diff = 2 * (self.close_sums.rolling_sum(self.half_windows) / self.half_windows) - sma
+            self.hma_sums.push(diff)
+            columns.append(self.hma_sums.rolling_sum(self.sqrt_windows) / self.sqrt_windows)
+
+            # CCI (mean absolute deviation over the window values)
+            cci = np.full(len(windows), np.nan)
+            for k, i in enumerate(self.func_windows):
+                view = recent[-i:, 3]  # NaN in front until the window is full
+                mean = view.sum() / i  # = view.mean(), same reduction as in the batch calculation
+                mad = np.abs(view - mean).sum() / i
+                cci[k] = (typical_price - mean) / (0.015 * mad)
+            columns.append(cci)
+
+            # CMO
+            momentum = close - self.prev_close
+            positive = momentum if momentum > 0 else np.nan if np.isnan(momentum) else 0.0
+            negative = -momentum if momentum < 0 else np.nan if np.isnan(momentum) else 0.0
+            pos = self.cmo[0].update(positive)
+            neg = self.cmo[1].update(negative)
+            columns.append(100 * (pos - neg) / (pos + neg))
+
+            # MACD, PPO
+            ema_fast = self.macd_fast.update(close)
+            ema_slow = self.macd_slow.update(close)
+            macd_line = ema_fast - ema_slow
+            signal = self.macd_signal.update(macd_line)
+            columns.append([macd_line, signal, macd_line - signal])
+            ppo_line = ((ema_fast - ema_slow) / ema_slow) * 100
+            signal = self.ppo_signal.update(ppo_line)
+            columns.append([ppo_line, ppo_line - signal, signal])
+
+            # ROC
+            prev = recent[-1 - windows, 2]
+            columns.append(((close - prev) / prev) * 100)
+
+            # CMF
+            money_flow_volume = ((close - low) - (high - close)) / (high - low)
+            money_flow_volume = (0.0 if np.isnan(money_flow_volume) else money_flow_volume) * volume
+            self.cmf_sums.push((money_flow_volume, volume))
+            sums = self.cmf_sums.rolling_sum(self.pairs)
+            columns.append(sums[:, 0] / sums[:, 1])
+
+            # ADX, ATR
+            true_range = np.fmax(np.fmax(high - low, np.abs(high - self.prev_close)), np.abs(low - self.prev_close))
+            columns.append(self.update_adx(high, low, close, t))
+            columns.append(self.update_atr(true_range, t))
+
+            # Bollinger Bands (standard deviation of the window, centered on the newest close against cancellation)
+            centered = recent[::-1, 2] - close
+            mean = np.cumsum(centered)[windows - 1] / windows
+            mstd = np.sqrt(np.maximum(np.cumsum(centered * centered)[windows - 1] / windows - mean * mean, 0.0))
+            columns.append(np.column_stack((sma, sma + 2 * mstd, sma - 2 * mstd)))
+
+        self.prev_high, self.prev_low, self.prev_close, self.prev_typical = high, low, close, typical_price
+        self.rows += 1
+        return np.concatenate([np.ravel(column) for column in columns])
+
+    def update_adx(self, high, low, close, t):
+        # same recursion as indicator_engine.adx, one row at a time (zeros in the warm-up rows)
+        values = np.zeros(3 * len(self.func_windows))
+        if t == 0:
+            return values
+        directional_movement = max(high, self.prev_close) - min(low, self.prev_close)
+        diff_up = high - self.prev_high
+        diff_down = self.prev_low - low
+        pos = abs(((diff_up > diff_down) and (diff_up > 0)) * diff_up)
+        neg = abs(((diff_down > diff_up) and (diff_down > 0)) * diff_down)
+
+        for k, i in enumerate(self.func_windows):
+            trs, dip, din = [state.update(x) for state, x in zip(self.adx_sums[k], (directional_movement, pos, neg))]
+            if trs is None:
+                continue
+            dip_ratio = 100 * (dip / trs) if trs != 0 else 0
+            din_ratio = 100 * (din / trs) if trs != 0 else 0
+            directional_index = 100 * abs((dip_ratio - din_ratio) / (dip_ratio + din_ratio)) if dip_ratio + din_ratio != 0 else 0
+            if t > i:
+                values[3 * k + 1] = dip_ratio
+                values[3 * k + 2] = din_ratio
+            if self.adx[k] is None:
+                self.adx_start[k].append(directional_index)
+                if len(self.adx_start[k]) == i:
+                    self.adx[k] = np.mean(np.array(self.adx_start[k]))
+                    self.adx_start[k] = None
+            else:
+                self.adx[k] = directional_index / i + (1.0 - 1.0 / i) * self.adx[k]
+            if self.adx[k] is not None:
+                values[3 * k] = self.adx[k]
+        return values
+
+    def update_atr(self, true_range, t):
+        values = np.zeros(len(self.func_windows))
+        for k, i in enumerate(self.func_windows):
+            state = self.atr[k]
+            value = state.update(true_range if state.value is None else true_range / i, start=np.mean)
+            if value is not None:
+                values[k] = value
+        return values
+
+
+def update_frame(states, bars, func_windows=[3,5,7,9,11,13,15,17,19,21]):
+    """
+    Nimmt pro Ticker eine neue Zeile auf und gibt die Features in der Form von merged_data zurück.
+
+    Parameter:
+    - states: Dictionary Ticker -> IncrementalIndicators (wird ergänzt, neue Ticker starten ohne Historie)
+    - bars: DataFrame mit Ticker, Date und den Kursspalten (Open, High, Low, Close, Adj Close, Volume), eine Zeile pro Ticker
+
+    Rückgabewert:
+    - features: DataFrame mit Ticker, Date, den Kursspalten und allen Indikatoren (eine Zeile pro Ticker)
+    """
+    price_columns = [column for column in bars.columns if column not in ('Ticker', 'Date')]
+    rows = []
+    for bar in bars.itertuples(index=False):
+        bar = bar._asdict()
+        state = states.get(bar['Ticker'])
+        if state is None:
+            state = states[bar['Ticker']] = IncrementalIndicators(func_windows)
+        rows.append(state.update(bar['Open'], bar['High'], bar['Low'], bar['Close'], bar['Volume']))
+
+    columns = indicator_columns(func_windows)
+    indicators = pd.DataFrame(np.array(rows).reshape(len(rows), len(columns)), index=bars.index, columns=columns)
+    return pd.concat([bars[['Ticker', 'Date'] + price_columns], indicators], axis=1)
@@ -0,0 +1,464 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+
+OHLCV_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+#Rolling window helpers
+def rolling_sum(x, window):
+    """
+    Rolling sum over `window` values taken from one cumulative sum.
+    Like pandas rolling(window).sum(): NaN until the window is full and for windows containing NaN.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), np.nan)
+    if window > len(x):
+        return out
+    valid = ~np.isnan(x)
+    cum = np.concatenate(([0.0], np.cumsum(np.where(valid, x, 0.0))))
+    count = np.concatenate(([0], np.cumsum(valid)))
+    sums = cum[window:] - cum[:-window]
+    out[window - 1:] = np.where(count[window:] - count[:-window] == window, sums, np.nan)
+    return out
+
+
+def rolling_mean(x, window):
+    return rolling_sum(x, window) / window
+
+
+def rolling_max(x, window):
+    """
+    Rolling maximum in O(n) independent of the window size (van Herk/Gil-Werman).
+
+    The series is cut into blocks of `window` values. Every window covers the end of one block
+    and the start of the next, so its maximum is the max of a suffix maximum and a prefix maximum.
+    This is the vectorized counterpart of a monotonic deque.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    n = len(x)
+    out = np.full(n, np.nan)
+    if window > n:
+        return out
+    padded = np.concatenate((x, np.full((-n) % window, -np.inf)))
+    blocks = padded.reshape(-1, window)
+    prefix = np.maximum.accumulate(blocks, axis=1).ravel()
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    out[window - 1:] = np.maximum(suffix[:n - window + 1], prefix[window - 1:n])
+    return out
+
+
+def rolling_min(x, window):
+    return -rolling_max(-np.asarray(x, dtype=np.float64), window)
+
+
+def rolling_std(x, window):
+    """
+    Rolling population standard deviation (ddof=0) from cumulative sums of x and x^2.
+    The series is shifted by its mean first to keep the cancellation error small.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    centered = x - np.nanmean(x) if np.any(~np.isnan(x)) else x
+    mean = rolling_mean(centered, window)
+    var = rolling_mean(centered * centered, window) - mean * mean
+    return np.sqrt(np.maximum(var, 0.0))
+
+
+def shift(x, periods, fill_value=np.nan):
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), fill_value, dtype=np.float64)
+    if periods < len(x):
+        out[periods:] = x[:len(x) - periods]
+    return out
+
+
+def ewm(x, alpha, min_periods=0, adjust=False):
+    """
+    Exponentially weighted mean like pandas Series.ewm(alpha=alpha, min_periods=min_periods, adjust=adjust).mean().
+
+    The recursion runs as a first order IIR filter (scipy.signal.lfilter) instead of a Python loop.
+    Leading NaNs are skipped. NaNs after the first valid value are handled like pandas (ignore_na=False):
+    the last mean is carried over the gap and the next value is weighted by the time since the last one.
+    min_periods counts valid values.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), np.nan)
+    valid = np.flatnonzero(~np.isnan(x))
+    if len(valid) == 0:
+        return out
+    first = valid[0]
+    values = x[first:]
+    observed = ~np.isnan(values)
+    beta = 1.0 - alpha
+
+    if adjust:
+        # weights beta ** (t - s) of all valid values s <= t, gaps only add decay
+        numerator = lfilter([1.0], [1.0, -beta], np.where(observed, values, 0.0))
+        denominator = lfilter([1.0], [1.0, -beta], observed.astype(np.float64))
+        result = numerator / denominator
+    else:
+        result = np.empty(len(values))
+        # runs of valid values [start, end), inside a run the recursion is y = alpha * x + beta * y_prev
+        starts = np.flatnonzero(observed & ~np.concatenate(([False], observed[:-1])))
+        ends = np.flatnonzero(observed & ~np.concatenate((observed[1:], [False]))) + 1
+        result[:ends[0]] = lfilter([alpha], [1.0, -beta], values[:ends[0]], zi=[beta * values[0]])[0]
+        for start, end, previous_end in zip(starts[1:], ends[1:], ends[:-1]):
+            last = result[previous_end - 1]
+            result[previous_end:start] = last
+            # pandas: the old mean has the weight beta ** (rows since the last value), the new value alpha
+            old = beta ** (start - previous_end + 1)
+            result[start] = (old * last + alpha * values[start]) / (old + alpha)
+            result[start + 1:end] = lfilter([alpha], [1.0, -beta], values[start + 1:end], zi=[beta * result[start]])[0]
+        result[ends[-1]:] = result[ends[-1] - 1]
+
+    out[first:] = np.where(np.cumsum(observed) >= max(min_periods, 1), result, np.nan)
+    return out
+
+
+def wilder_recursion(first_value, inputs, window):
+    """
+    y[0] = first_value, y[k] = y[k-1] * (window - 1) / window + inputs[k-1] (running Wilder sum).
+    """
+    if len(inputs) == 0:
+        return np.array([first_value], dtype=np.float64)
+    beta = 1.0 - 1.0 / window
+    rest = lfilter([1.0], [1.0, -beta], inputs, zi=[beta * first_value])[0]
+    return np.concatenate(([first_value], rest))
+
+
+#Relative Strength Index - RSI
+def rsi_smooth(close, windows):
+    """
+    Vectorized version of the former get_RSI_smooth (rolling().apply with a closure, see test_indicator_engine.py).
+
+    The first value per window is the plain RSI over the first `window` price changes.
+    Every following value smooths the previous window's average gain/loss with the
+    current gain/loss: RS = (prev_avg_gain * (window - 1) + gain) / (prev_avg_loss * (window - 1) + loss).
+    Windows containing NaN stay NaN and are skipped like in rolling().apply(): after a leading NaN run the
+    first full window is a plain RSI again, after a gap in the series the previous window is the last full
+    window before the gap. The rolling sums are taken from one cumulative sum, so all windows are computed
+    in a single pass over the close prices.
+
+    Parameter:
+    - close: 1D array with close prices
+    - windows: list of window sizes (e.g. [3, 5, 7])
+
+    Rückgabewert:
+    - rsi: array with shape (len(close), len(windows)), NaN where the RSI is not defined
+    """
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    rsi = np.full((n, len(windows)), np.nan)
+    if n < 2:
+        return rsi
+
+    diff = np.diff(close)
+    gains = np.where(diff >= 0, diff, 0.0)
+    losses = np.abs(np.where(diff < 0, diff, 0.0))
+
+    # cumulative sums with a leading zero: sum(x[a:b]) = cum[b] - cum[a]
+    cum_gains = np.concatenate(([0.0], np.cumsum(gains)))
+    cum_losses = np.concatenate(([0.0], np.cumsum(losses)))
+    cum_nan = np.concatenate(([0], np.cumsum(np.isnan(diff))))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for k, window in enumerate(windows):
+            if window > len(diff):
+                continue
+            # average gain/loss of every full window, indexed by the last diff in the window
+            avg_gain = (cum_gains[window:] - cum_gains[:-window]) / window
+            avg_loss = (cum_losses[window:] - cum_losses[:-window]) / window
+            complete = np.flatnonzero((cum_nan[window:] - cum_nan[:-window]) == 0)
+            if len(complete) == 0:
+                continue
+
+            values = np.full(len(avg_gain), np.nan)
+            # first RSI calculation
+            first = complete[0]
+            values[first] = 100 - (100 / (1 + (avg_gain[first] / avg_loss[first])))
+            # smoothed RSI with the current gain and loss and the averages of the previous full window
+            previous, current = complete[:-1], complete[1:]
+            values[current] = 100 - (100 / (1 + ((avg_gain[previous] * (window - 1) + gains[current + window - 1]) /
+                                                 (avg_loss[previous] * (window - 1) + losses[current + window - 1]))))
+
+            # diff[j] belongs to row j + 1 of the close prices
+            rsi[window:, k] = values
+    return rsi
+
+
+#Simple Moving Average - SMA
+def sma(close, windows):
+    return np.column_stack([rolling_mean(close, i) for i in windows])
+
+#Exponential Moving Average - EMA
+def ema(close, windows):
+    return np.column_stack([ewm(close, 2.0 / (i + 1)) for i in windows])
+
+#Triple Exponential Moving Average
+def trix(close, windows):
+    columns = []
+    for i in windows:
+        alpha = 2.0 / (i + 1)
+        ema3 = ewm(ewm(ewm(close, alpha, i), alpha, i), alpha, i)
+        fill = np.nanmean(ema3) if np.any(~np.isnan(ema3)) else np.nan
+        prev = shift(ema3, 1, fill_value=fill)
+        columns.append((ema3 - prev) / prev * 100)
+    return np.column_stack(columns)
+
+#Money FLow Index - MFI
+def mfi(high, low, close, volume, windows):
+    typical_price = (high + low + close) / 3.0
+    prev = shift(typical_price, 1)
+    up_down = np.where(typical_price > prev, 1, np.where(typical_price < prev, -1, 0))
+    money_flow = typical_price * volume * up_down
+    missing = np.isnan(money_flow)
+    positive = np.where(missing, np.nan, np.where(money_flow >= 0.0, money_flow, 0.0))
+    negative = np.where(missing, np.nan, np.where(money_flow < 0.0, money_flow, 0.0))
+    columns = []
+    for i in windows:
+        ratio = rolling_sum(positive, i) / np.abs(rolling_sum(negative, i))
+        columns.append(100 - (100 / (1 + ratio)))
+    return np.column_stack(columns)
+
+#Williams %R
+def williams_r(high, low, close, windows):
+    columns = []
+    for i in windows:
+        highest_high = rolling_max(high, i)
+        lowest_low = rolling_min(low, i)
+        columns.append(((highest_high - close) / (highest_high - lowest_low)) * (-100))
+    return np.column_stack(columns)
+
+#Weighted Moving Average - WMA
+def wma(close, windows):
+    """
+    Linearly weighted moving average (weights 1..window) from two cumulative sums:
+    sum(k * x) over a window = sum(j * x_j) - (t - window) * sum(x_j) with absolute positions j.
+    """
+    n = len(close)
+    positions = np.arange(n, dtype=np.float64)
+    weighted = positions * close
+    columns = []
+    for i in windows:
+        offset = positions - i
+        numerator = rolling_sum(weighted, i) - offset * rolling_sum(close, i)
+        columns.append(numerator * 2 / (i * (i + 1)))
+    return np.column_stack(columns)
+
+#Hull Moving Average - HMA
+def hma(close, windows):
+    columns = []
+    for i in windows:
+        diff = 2 * rolling_mean(close, int(i / 2)) - rolling_mean(close, i)
+        columns.append(rolling_mean(diff, int(np.sqrt(i))))
+    return np.column_stack(columns)
+
+#Commondity Channel Index - CCI
+def cci(high, low, close, windows, constant=0.015):
+    typical_price = (high + low + close) / 3.0
+    columns = []
+    for i in windows:
+        column = np.full(len(close), np.nan)
+        if i <= len(close):
+            # mean absolute deviation has no prefix-sum form, it is computed on a strided view
+            view = sliding_window_view(typical_price, i)
+            mean = view.mean(axis=1)
+            mad = np.abs(view - mean[:, None]).mean(axis=1)
+            column[i - 1:] = (typical_price[i - 1:] - mean) / (constant * mad)
+        columns.append(column)
+    return np.column_stack(columns)
+
+#Chande Momentum Oscillator - CMO
+def cmo(close, windows):
+    momentum = close - shift(close, 1)
+    positive = np.where(momentum > 0, momentum, np.where(np.isnan(momentum), np.nan, 0.0))
+    negative = np.where(momentum < 0, -momentum, np.where(np.isnan(momentum), np.nan, 0.0))
+    columns = []
+    for i in windows:
+        # Wilder's moving average as used by pandas_ta.cmo
+        pos = ewm(positive, 1.0 / i, i, adjust=True)
+        neg = ewm(negative, 1.0 / i, i, adjust=True)
+        columns.append(100 * (pos - neg) / (pos + neg))
+    return np.column_stack(columns)
+
+#Moving Average Convergence Divergence - MACD
+def macd(close, window_slow=26, window_fast=12, window_sign=9):
+    macd_line = ewm(close, 2.0 / (window_fast + 1), window_fast) - ewm(close, 2.0 / (window_slow + 1), window_slow)
+    signal = ewm(macd_line, 2.0 / (window_sign + 1), window_sign)
+    return np.column_stack([macd_line, signal, macd_line - signal])
+
+#Percentage Price Oscillator - PPO
+def ppo(close, window_slow=26, window_fast=12, window_sign=9):
+    ema_fast = ewm(close, 2.0 / (window_fast + 1), window_fast)
+    ema_slow = ewm(close, 2.0 / (window_slow + 1), window_slow)
+    ppo_line = ((ema_fast - ema_slow) / ema_slow) * 100
+    signal = ewm(ppo_line, 2.0 / (window_sign + 1), window_sign)
+    return np.column_stack([ppo_line, ppo_line - signal, signal])
+
+#Rate of Change - ROC
+def roc(close, windows):
+    columns = []
+    for i in windows:
+        prev = shift(close, i)
+        columns.append(((close - prev) / prev) * 100)
+    return np.column_stack(columns)
+
+#Chaikin Money Flow - CMF
+def cmf(high, low, close, volume, windows):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        money_flow_volume = ((close - low) - (high - close)) / (high - low)
+    money_flow_volume = np.where(np.isnan(money_flow_volume), 0.0, money_flow_volume) * volume
+    return np.column_stack([rolling_sum(money_flow_volume, i) / rolling_sum(volume, i) for i in windows])
+
+#Average Directional Movement Index - ADX
+def adx(high, low, close, windows):
+    """
+    Same values as ta.trend.ADXIndicator (adx, adx_pos, adx_neg per window, zeros in the warm-up rows).
+    The Wilder sums run through wilder_recursion instead of three Python loops per indicator.
+    """
+    n = len(close)
+    close_shift = shift(close, 1)
+    directional_movement = np.maximum(high, close_shift) - np.minimum(low, close_shift)
+    diff_up = high - shift(high, 1)
+    diff_down = shift(low, 1) - low
+    with np.errstate(invalid='ignore'):
+        pos = np.abs(((diff_up > diff_down) & (diff_up > 0)) * diff_up)
+        neg = np.abs(((diff_down > diff_up) & (diff_down > 0)) * diff_down)
+
+    columns = []
+    for i in windows:
+        adx_column, pos_column, neg_column = np.full((3, n), np.nan)
+        m = n - (i - 1)  # length of the smoothed series
+        if m > i:
+            smoothed = []
+            for values in (directional_movement, pos, neg):
+                series = np.zeros(m)
+                first = values[~np.isnan(values)][:i].sum()
+                series[:m - 1] = wilder_recursion(first, values[i + 1:i + m - 1], i)
+                smoothed.append(series)
+            trs, dip, din = smoothed
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dip_ratio = np.where(trs != 0, 100 * (dip / trs), 0)
+                din_ratio = np.where(trs != 0, 100 * (din / trs), 0)
+                directional_index = np.where(dip_ratio + din_ratio != 0,
+                                             100 * np.abs((dip_ratio - din_ratio) / (dip_ratio + din_ratio)), 0)
+
+            adx_series = np.zeros(m)
+            adx_series[i:] = wilder_recursion(directional_index[0:i].mean(), directional_index[i:m - 1] / i, i)
+            adx_column = np.concatenate((np.zeros(i - 1), adx_series))
+
+            pos_column = np.zeros(n)
+            neg_column = np.zeros(n)
+            pos_column[i + 1:i + m - 1] = dip_ratio[1:m - 1]
+            neg_column[i + 1:i + m - 1] = din_ratio[1:m - 1]
+        columns.extend([adx_column, pos_column, neg_column])
+    return np.column_stack(columns)
+
+#Average True Range - ATR
+def atr(high, low, close, windows):
+    close_shift = shift(close, 1)
+    true_range = np.fmax(np.fmax(high - low, np.abs(high - close_shift)), np.abs(low - close_shift))
+    columns = []
+    for i in windows:
+        column = np.zeros(len(close))
+        if i <= len(close):
+            # start like ta: mean of the valid true ranges of the first window (pandas mean skips NaN)
+            first = np.nanmean(true_range[0:i]) if np.any(~np.isnan(true_range[0:i])) else np.nan
+            column[i - 1:] = wilder_recursion(first, true_range[i:] / i, i)
+        columns.append(column)
+    return np.column_stack(columns)
+
+#Bollinger Bands
+def bollinger_bands(close, windows, window_dev=2):
+    columns = []
+    for i in windows:
+        mavg = rolling_mean(close, i)
+        mstd = rolling_std(close, i)
+        columns.extend([mavg, mavg + window_dev * mstd, mavg - window_dev * mstd])
+    return np.column_stack(columns)
+
+
+def indicator_columns(func_windows=[3,5,7,9,11,13,15,17,19,21]):
+    """
+    Column names in the order add_technical_indicators creates them.
+    """
+    columns = []
+    columns += [f"SMA_{i}" for i in func_windows]
+    columns += [f"EMA_{i}" for i in func_windows]
+    columns += [f"TRIX_{i}" for i in func_windows]
+    columns += [f"money_flow_index_{i}" for i in func_windows]
+    columns += ['rsi_' + str(i) for i in func_windows]
+    columns += [f"williams_r_{i}" for i in func_windows]
+    columns += [f"wma_{i}" for i in func_windows]
+    columns += [f"hma_{i}" for i in func_windows]
+    columns += [f"cci_{i}" for i in func_windows]
+    columns += [f"cmo_{i}" for i in func_windows]
+    columns += ['MACD', 'MACD_Signal', 'MACD_Diff']
+    columns += ['PPO', 'PPO_Histogram', 'PPO_Signal']
+    columns += [f"ROC_{i}" for i in func_windows]
+    columns += [f"cmf_{i}" for i in func_windows]
+    for i in func_windows:
+        columns += [f"adx_{i}", f"adx_pos_{i}", f"adx_neg_{i}"]
+    columns += [f"atr_{i}" for i in func_windows]
+    for i in func_windows:
+        columns += [f"bb_bbm_{i}", f"bb_bbh_{i}", f"bb_bbl_{i}"]
+    return columns
+
+
+def compute_indicators(ohlcv, func_windows=[3,5,7,9,11,13,15,17,19,21], out=None, dtype=np.float64):
+    """
+    Berechnet alle technischen Indikatoren für alle Fenster in einem Durchlauf.
+
+    Parameter:
+    - ohlcv: Array mit Shape (n_rows, 5) in der Reihenfolge Open, High, Low, Close, Volume
+    - func_windows: Liste der Fenstergrössen
+    - out: optional vorallozierte Matrix mit Shape (n_rows, len(indicator_columns(func_windows)))
+    - dtype: Datentyp der Matrix, falls `out` nicht übergeben wird
+
+    Rückgabewert:
+    - out: Matrix mit den Indikatoren, Spalten wie indicator_columns(func_windows)
+    """
+    ohlcv = np.asarray(ohlcv, dtype=np.float64)
+    high, low, close, volume = ohlcv[:, 1], ohlcv[:, 2], ohlcv[:, 3], ohlcv[:, 4]
+    n_features = len(indicator_columns(func_windows))
+    if out is None:
+        out = np.empty((len(ohlcv), n_features), dtype=dtype)
+    elif out.shape != (len(ohlcv), n_features):
+        raise ValueError(f"out has shape {out.shape}, expected {(len(ohlcv), n_features)}")
+
+    families = [
+        lambda: sma(close, func_windows),
+        lambda: ema(close, func_windows),
+        lambda: trix(close, func_windows),
+        lambda: mfi(high, low, close, volume, func_windows),
+        lambda: rsi_smooth(close, func_windows),
+        lambda: williams_r(high, low, close, func_windows),
+        lambda: wma(close, func_windows),
+        lambda: hma(close, func_windows),
+        lambda: cci(high, low, close, func_windows),
+        lambda: cmo(close, func_windows),
+        lambda: macd(close),
+        lambda: ppo(close),
+        lambda: roc(close, func_windows),
+        lambda: cmf(high, low, close, volume, func_windows),
+        lambda: adx(high, low, close, func_windows),
+        lambda: atr(high, low, close, func_windows),
+        lambda: bollinger_bands(close, func_windows),
+    ]
+
+    col = 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for family in families:
+            values = family()
+            out[:, col:col + values.shape[1]] = values
+            col += values.shape[1]
+    return out
+
+
+def ohlcv_array(df):
+    """
+    Extracts the Open, High, Low, Close, Volume columns of a DataFrame as float64 array.
+    """
+    return df[OHLCV_COLUMNS].to_numpy(dtype=np.float64)
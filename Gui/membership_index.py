@@ -0,0 +1,286 @@
+import os
+import sys
+import argparse
+
+import numpy as np
+import pandas as pd
+
+
+MEMBERSHIP_FILE = 'sp500_membership.csv'
+OPEN_END = np.datetime64('9999-12-31', 'D')  # still a member at the last snapshot
+SP500_URL = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+
+
+def to_days(dates):
+    # strings 'YYYY-MM-DD', Timestamps or datetime64 -> datetime64[D] array
+    return pd.to_datetime(np.atleast_1d(np.asarray(dates))).to_numpy().astype('datetime64[D]')
+
+
+def to_day(date):
+    # single date -> datetime64[D]
+    return pd.Timestamp(date).to_datetime64().astype('datetime64[D]')
+
+
+def yahoo_symbols(tickers):
+    # Wikipedia writes share classes with a dot (BRK.B, BF.B), Yahoo Finance and the price store with a dash (BRK-B)
+    return np.array([ticker.strip().replace('.', '-') if isinstance(ticker, str) else ticker for ticker in tickers], dtype=object)
+
+
+class MembershipIndex:
+    """
+    Zusammensetzung des S&P 500 über die Zeit als Intervalle: Ticker ist Mitglied für start <= Datum < end.
+
+    Die Zeitachse wird an allen Start- und Enddaten geteilt; die Mitglieder jedes Abschnitts liegen
+    zusammenhängend in einem Array (nach Ticker sortiert). "Mitglieder am Datum D" ist damit eine binäre Suche
+    über die Abschnittsgrenzen plus ein Slice, "ist Ticker T am Datum D Mitglied" eine binäre Suche in den
+    Intervallen von T.
+
+    Parameter:
+    - tickers, starts, ends: ein Eintrag pro Intervall (ends NaT = bis heute Mitglied);
+      überlappende Intervalle eines Tickers werden zusammengefasst
+    """
+
+    def __init__(self, tickers, starts, ends):
+        tickers = np.asarray(tickers).astype(str)
+        starts = to_days(starts) if len(tickers) else np.array([], dtype='datetime64[D]')
+        ends = to_days(ends) if len(tickers) else np.array([], dtype='datetime64[D]')
+        ends = np.where(np.isnat(ends), OPEN_END, ends)
+
+        # sorted by ticker and start, overlapping or touching intervals of a ticker merged
+        merged = []
+        for k in np.lexsort((starts, tickers)).tolist():
+            if merged and merged[-1][0] == tickers[k] and starts[k] <= merged[-1][2]:
+                merged[-1][2] = max(merged[-1][2], ends[k])
+            elif starts[k] < ends[k]:
+                merged.append([tickers[k], starts[k], ends[k]])
+        self.tickers = np.array([interval[0] for interval in merged], dtype=str)
+        self.starts = np.array([interval[1] for interval in merged], dtype='datetime64[D]')
+        self.ends = np.array([interval[2] for interval in merged], dtype='datetime64[D]')
+
+        # intervals of each ticker: rows first:last of the arrays
+        names, first = np.unique(self.tickers, return_index=True)
+        last = np.append(first[1:], len(self.tickers))
+        self.ticker_rows = {name: (int(a), int(b)) for name, a, b in zip(names.tolist(), first, last)}
+
+        # segment i = bounds[i] <= date < bounds[i + 1], members[offsets[i]:offsets[i + 1]] are its intervals
+        self.bounds = np.unique(np.concatenate([self.starts, self.ends]))
+        first_segment = np.searchsorted(self.bounds, self.starts)
+        counts = np.searchsorted(self.bounds, self.ends) - first_segment
+        intervals = np.repeat(np.arange(len(self.tickers)), counts)
+        segments = np.repeat(first_segment, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        order = np.argsort(segments, kind='stable')  # intervals are sorted by ticker already
+        self.members_flat = intervals[order]
+        self.offsets = np.searchsorted(segments[order], np.arange(len(self.bounds) + 1))
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def members(self, date):
+        """
+        Rückgabewert:
+        - Liste der Ticker, die am Datum Mitglied waren (sortiert)
+        """
+        i = int(np.searchsorted(self.bounds, to_day(date), side='right')) - 1
+        if i < 0 or i >= len(self.bounds) - 1:
+            return []
+        return self.tickers[self.members_flat[self.offsets[i]:self.offsets[i + 1]]].tolist()
+
+    def is_member(self, ticker, date):
+        return bool(self.ticker_mask(ticker, date)[0])
+
+    def ticker_mask(self, ticker, dates):
+        """
+        Rückgabewert:
+        - bool array: war ticker an den einzelnen Daten Mitglied
+        """
+        dates = to_days(dates)
+        if ticker not in self.ticker_rows:
+            return np.zeros(len(dates), dtype=bool)
+        first, last = self.ticker_rows[ticker]
+        j = np.searchsorted(self.starts[first:last], dates, side='right') - 1
+        return (j >= 0) & (dates < self.ends[first:last][np.maximum(j, 0)])
+
+    def mask(self, tickers, dates):
+        """
+        Mitgliedschaft pro Zeile, z.B. für die Spalten Ticker und Date eines DataFrames.
+
+        Rückgabewert:
+        - bool array mit einem Wert pro Zeile
+        """
+        tickers = np.asarray(tickers).astype(str)
+        dates = to_days(dates)
+        codes, names = pd.factorize(tickers)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.append(0, np.cumsum(np.bincount(codes, minlength=len(names))))
+        mask = np.zeros(len(tickers), dtype=bool)
+        for code, name in enumerate(names):
+            rows = order[bounds[code]:bounds[code + 1]]
+            mask[rows] = self.ticker_mask(name, dates[rows])
+        return mask
+
+    def filter(self, df):
+        # rows of df (columns Ticker and Date) whose ticker was a member on that date
+        return df[self.mask(df['Ticker'], df['Date'])]
+
+    def tickers_between(self, start, end):
+        """
+        Rückgabewert:
+        - sortierte Liste der Ticker, die zwischen start und end (inklusive) mindestens einen Tag Mitglied waren
+        """
+        start, end = to_day(start), to_day(end)
+        return sorted(set(self.tickers[(self.starts <= end) & (self.ends > start)].tolist()))
+
+    def to_frame(self):
+        ends = np.where(self.ends == OPEN_END, np.datetime64('NaT'), self.ends)
+        return pd.DataFrame({'Ticker': self.tickers, 'Start': self.starts, 'End': ends})
+
+    def save(self, path=MEMBERSHIP_FILE):
+        frame = self.to_frame()
+        frame['Start'] = frame['Start'].dt.strftime('%Y-%m-%d')
+        frame['End'] = frame['End'].dt.strftime('%Y-%m-%d')  # empty = still a member
+        frame.to_csv(path, index=False)
+
+    @classmethod
+    def load(cls, path=MEMBERSHIP_FILE):
+        frame = pd.read_csv(path, dtype={'Ticker': str})
+        return cls(yahoo_symbols(frame['Ticker']), frame['Start'], frame['End'])  # files built with Wikipedia symbols
+
+    @classmethod
+    def from_snapshots(cls, snapshots):
+        """
+        Aus mehreren Ständen der Liste: ein Ticker ist Mitglied ab dem ersten Stand, in dem er vorkommt,
+        bis zum ersten späteren Stand ohne ihn (Genauigkeit = Abstand der Stände).
+
+        Parameter:
+        - snapshots: Dictionary Datum -> Ticker der Liste an diesem Datum
+        """
+        dates = sorted(snapshots, key=to_day)
+        tickers, starts, ends = [], [], []
+        since = {}
+        for date in dates:
+            current = set(snapshots[date])
+            for ticker in sorted(set(since) - current):
+                tickers.append(ticker)
+                starts.append(since.pop(ticker))
+                ends.append(date)
+            for ticker in sorted(current - set(since)):
+                since[ticker] = date
+        for ticker, start in since.items():
+            tickers.append(ticker)
+            starts.append(start)
+            ends.append(None)
+        return cls(tickers, starts, pd.to_datetime(pd.Series(ends, dtype=object)))
+
+    @classmethod
+    def from_changes(cls, members, changes, as_of=None):
+        """
+        Aus einem Stand der Liste und der Tabelle der Änderungen, rückwärts ab dem Stand: ein "Added" beginnt
+        die Mitgliedschaft am Datum der Änderung, ein "Removed" beendet sie. Ticker, die schon vor der ersten
+        Änderung Mitglied waren, sind es ab 1900-01-01.
+
+        Parameter:
+        - members: Ticker der Liste am Datum as_of
+        - changes: DataFrame mit Date, Added, Removed (siehe changes_from_wikipedia)
+        - as_of: Datum des Stands, spätere Änderungen werden ignoriert (None = alle)
+        """
+        changes = changes.assign(Date=pd.to_datetime(changes['Date']))
+        if as_of is not None:
+            changes = changes[changes['Date'] <= pd.Timestamp(as_of)]
+        ends = {ticker: None for ticker in members}  # open intervals, walking back in time
+        tickers, starts, interval_ends = [], [], []
+        for date, day in changes.sort_values('Date', ascending=False, kind='stable').groupby('Date', sort=False):
+            for ticker in day['Added'].dropna().astype(str):
+                if ticker in ends:
+                    tickers.append(ticker)
+                    starts.append(date)
+                    interval_ends.append(ends.pop(ticker))
+            for ticker in day['Removed'].dropna().astype(str):
+                if ticker not in ends:
+                    ends[ticker] = date
+        for ticker, end in ends.items():
+            tickers.append(ticker)
+            starts.append(np.datetime64('1900-01-01'))
+            interval_ends.append(end)
+        return cls(tickers, starts, pd.to_datetime(pd.Series(interval_ends, dtype=object)))
+
+
+def changes_from_wikipedia(table):
+    """
+    Tabelle "Selected changes to the list of S&P 500 components" (pd.read_html) -> DataFrame mit Date, Added, Removed
+    (Ticker wie bei Yahoo Finance, siehe yahoo_symbols).
+    """
+    if isinstance(table.columns, pd.MultiIndex):
+        table = table.set_axis([' '.join(dict.fromkeys(column)) for column in table.columns], axis=1)
+    return pd.DataFrame({
+        'Date': pd.to_datetime(table['Date'], errors='coerce'),
+        'Added': yahoo_symbols(table['Added Ticker']),
+        'Removed': yahoo_symbols(table['Removed Ticker']),
+    }).dropna(subset=['Date'])
+
+
+def build_from_archive(start_date, end_date, snapshots=False, cache='wayback_cache', fixtures=None, offline=False,
+                       workers=8, rate=2.0):
+    """
+    Baut den Index aus archivierten Ständen von List_of_S&P_500_companies (web.archive.org).
+
+    Parameter:
+    - start_date, end_date: Zeitraum der Stände, Format yyyymmddhhmmss
+    - snapshots: False = letzter Stand im Zeitraum mit seiner Tabelle der Änderungen (taggenau),
+                 True = alle unterschiedlichen Stände, Intervalle aus den Unterschieden (siehe from_snapshots)
+    - cache: Ordner für CDX-Liste und geparste Stände, ein zweiter Lauf lädt nichts mehr herunter
+    - fixtures: aufgenommene Antworten aus diesem Ordner abspielen statt web.archive.org (offline)
+    - offline: nur der Cache
+    - workers, rate: parallele Downloads und maximale Anfragen pro Sekunde
+    """
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Historic_Data_SP500'))
+    from Get_SP500_Tickers import get_archive_urls_timestamps, fetch_snapshots, snapshot_cache
+
+    snapshot_store = snapshot_cache(cache, fixtures, offline=offline, rate=rate)
+    timestamps = sorted(get_archive_urls_timestamps(SP500_URL, start_date, end_date, snapshot_store))
+    if not timestamps:
+        raise ValueError(f"no archived snapshots between {start_date} and {end_date}")
+    if not snapshots:
+        tables, failed = fetch_snapshots(timestamps[-1:], snapshot_store, workers=1)
+        if failed:
+            raise RuntimeError(f"snapshot {timestamps[-1]} failed: {failed[timestamps[-1]]}")
+        tables = tables[timestamps[-1]]
+        return MembershipIndex.from_changes(yahoo_symbols(tables[0]['Symbol']).tolist(), changes_from_wikipedia(tables[1]),
+                                            as_of=pd.to_datetime(timestamps[-1][:8]))
+    tables, failed = fetch_snapshots(timestamps, snapshot_store, workers=workers)
+    if not tables:
+        raise RuntimeError(f"all {len(failed)} snapshots failed")
+    return MembershipIndex.from_snapshots({pd.to_datetime(timestamp[:8]): yahoo_symbols(snapshot[0]['Symbol']).tolist()
+                                           for timestamp, snapshot in tables.items()})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Point-in-time S&P 500 membership (ticker x date intervals).")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--file", default=MEMBERSHIP_FILE, help=f"membership csv (default: {MEMBERSHIP_FILE})")
+    build = subparsers.add_parser('build', parents=[common], help="build the index from archived Wikipedia constituent tables")
+    build.add_argument("--start", default='20230101000000', help="first archived snapshot (yyyymmddhhmmss)")
+    build.add_argument("--end", default='20231231000000', help="last archived snapshot (yyyymmddhhmmss)")
+    build.add_argument("--snapshots", action='store_true', help="use every distinct snapshot instead of the changes table")
+    build.add_argument("--cache", default='wayback_cache', help="folder for the CDX listing and parsed snapshots (default: wayback_cache)")
+    build.add_argument("--fixtures", default=None, help="replay recorded Wayback responses from this folder (offline)")
+    build.add_argument("--offline", action='store_true', help="only use the snapshot cache")
+    build.add_argument("--workers", type=int, default=8, help="parallel snapshot downloads (default: 8)")
+    build.add_argument("--rate", type=float, default=2.0, help="maximum requests per second to web.archive.org (default: 2)")
+    members = subparsers.add_parser('members', parents=[common], help="list the members on a date")
+    members.add_argument("date")
+    between = subparsers.add_parser('tickers', parents=[common], help="list all tickers that were members between two dates")
+    between.add_argument("start")
+    between.add_argument("end")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        membership = build_from_archive(args.start, args.end, args.snapshots, args.cache, args.fixtures, args.offline,
+                                        args.workers, args.rate)
+        membership.save(args.file)
+        print(f"{len(membership)} intervals of {len(membership.ticker_rows)} tickers saved to: {args.file}")
+    else:
+        membership = MembershipIndex.load(args.file)
+        tickers = membership.members(args.date) if args.command == 'members' else membership.tickers_between(args.start, args.end)
+        print(len(tickers), "tickers:")
+        print(' '.join(tickers))
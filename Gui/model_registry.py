@@ -0,0 +1,348 @@
+import os
+import json
+import shutil
+import hashlib
+import argparse
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import pandas as pd
+from tensorflow import keras
+keras.backend.set_image_data_format('channels_first')
+
+from indicator_engine import indicator_columns
+
+
+REGISTRY_FOLDER = 'registry'
+BUNDLE_FORMAT = 1
+BUNDLE_FILES = ['model.json', 'weights.npy', 'scaler_min.npy', 'scaler_scale.npy']
+CLASSES = ['BUY', 'SELL', 'HOLD']
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Adj Close', 'Volume']
+
+
+class MinMaxTransform:
+    """
+    transform von sklearn MinMaxScaler (X * scale_ + min_) auf gespeicherten Arrays,
+    damit ein Bundle ohne Pickle geladen werden kann. Das Resultat ist bitgleich zum Scaler.
+    """
+
+    def __init__(self, scale, min, feature_range=(0, 1), clip=False):
+        self.scale_ = scale
+        self.min_ = min
+        self.feature_range = tuple(feature_range)
+        self.clip = clip
+        self.n_features_in_ = len(scale)
+
+    def transform(self, x):
+        # like sklearn: float32 input stays float32, everything else is converted to float64
+        x = np.array(x)
+        x = x.astype(np.float32 if x.dtype == np.float32 else np.float64, copy=False)
+        if x.ndim != 2 or x.shape[1] != self.n_features_in_:
+            raise ValueError(f"expected {self.n_features_in_} features, got shape {x.shape}")
+        x *= self.scale_
+        x += self.min_
+        if self.clip:
+            np.clip(x, self.feature_range[0], self.feature_range[1], out=x)
+        return x
+
+
+class SelectedFeatureScaler:
+    """
+    Scaler und Feature-Auswahl in einem Schritt. scale_ und min_ werden einmal auf die ausgewählten Spalten
+    reduziert, skaliert werden nur diese Spalten (statt alle 202 skalieren und danach 100 auswählen).
+    Jede Spalte wird in einem Puffer vom Datentyp, den MinMaxScaler.transform verwenden würde, skaliert
+    (float32 wenn alle Spalten des Scalers float32 sind, sonst float64) und direkt in den float32 Puffer
+    für das Modell geschrieben; das Resultat ist bytegleich zu
+    scaler.transform(...)[:, feature_indices] mit anschliessendem image_creation.
+
+    Parameter:
+    - scaler: gefitteter MinMaxScaler oder MinMaxTransform
+    - feature_indices: ausgewählte Spalten (leer = alle)
+    - feature_columns: Namen aller Spalten des Scalers, nötig für transform mit einem DataFrame
+    - dtype: Datentyp aller Spalten des Scalers in der Quelle (None = aus den übergebenen Daten)
+    """
+
+    def __init__(self, scaler, feature_indices, feature_columns=None, dtype=None):
+        self.n_features_in_ = len(scaler.scale_)
+        if feature_indices is None or len(feature_indices) == 0:
+            feature_indices = range(self.n_features_in_)
+        self.feature_indices = np.asarray(feature_indices, dtype=np.intp)
+        self.scale = np.asarray(scaler.scale_, dtype=np.float64)[self.feature_indices]
+        self.min = np.asarray(scaler.min_, dtype=np.float64)[self.feature_indices]
+        self.clip = bool(getattr(scaler, 'clip', False))
+        self.feature_range = tuple(scaler.feature_range)
+        self.dtype = dtype
+        self.columns = None
+        if feature_columns is not None:
+            if len(feature_columns) != self.n_features_in_:
+                raise ValueError(f"{len(feature_columns)} feature columns for a scaler with {self.n_features_in_} features")
+            self.columns = [feature_columns[i] for i in self.feature_indices]
+
+    def transform(self, data, out=None):
+        """
+        Parameter:
+        - data: DataFrame mit (mindestens) den ausgewählten Spalten oder Array mit allen Spalten des Scalers
+        - out: float32 Puffer (n, Anzahl Features), z.B. um ihn pro Chunk wiederzuverwenden
+
+        Rückgabewert:
+        - out: skalierte Features float32 (n, Anzahl Features)
+        """
+        if isinstance(data, pd.DataFrame):
+            if self.columns is None:
+                raise ValueError("feature_columns are needed to transform a DataFrame")
+            columns = [data[column].to_numpy() for column in self.columns]
+            dtype = np.result_type(*[column.dtype for column in columns])
+        else:
+            data = np.asarray(data)
+            if data.ndim != 2 or data.shape[1] != self.n_features_in_:
+                raise ValueError(f"expected {self.n_features_in_} features, got shape {data.shape}")
+            columns = [data[:, i] for i in self.feature_indices]
+            dtype = data.dtype
+        # MinMaxScaler keeps float32 input and converts everything else to float64
+        dtype = np.float32 if (self.dtype or dtype) == np.float32 else np.float64
+        rows = len(data)
+        if out is None:
+            out = np.empty((rows, len(self.feature_indices)), dtype=np.float32)
+        values = np.empty(rows, dtype=dtype)
+        for j, column in enumerate(columns):
+            np.copyto(values, column)
+            values *= self.scale[j]
+            values += self.min[j]
+            if self.clip:
+                np.clip(values, self.feature_range[0], self.feature_range[1], out=values)
+            out[:, j] = values
+        return out
+
+
+class ModelBundle:
+    """
+    Modell, Scaler und ausgewählte Features einer Version.
+
+    Parameter:
+    - version: Name, z.B. 'V1_Model1_ohneSmote'
+    - model: Keras Modell mit Input (None, dim, dim, 3)
+    - scaler: MinMaxScaler oder MinMaxTransform
+    - feature_indices: Spalten nach dem Skalieren, die das Modell bekommt
+    - manifest: Manifest des Bundles (None bei losen Dateien)
+    """
+
+    def __init__(self, version, model, scaler, feature_indices, manifest=None):
+        self.version = version
+        self.model = model
+        self.scaler = scaler
+        self.feature_indices = list(feature_indices)
+        self.manifest = manifest
+        self.dim = int(np.sqrt(len(self.feature_indices)))
+        self.selected = SelectedFeatureScaler(scaler, self.feature_indices)
+
+    @classmethod
+    def from_files(cls, version, folder='models'):
+        # the three loose files of the notebooks: model .keras, scaler .pkl, selected features .txt
+        model_path = os.path.join(folder, f'stock_prediction_model_{version}.keras')
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Model {model_path} not found!")
+        model = keras.models.load_model(model_path)
+        scaler = joblib.load(os.path.join(folder, f'scaler_{version}.pkl'))
+        feature_indices = np.loadtxt(os.path.join(folder, f'selected_features_{version}.txt'), dtype=int).tolist()
+        return cls(version, model, scaler, feature_indices)
+
+    @classmethod
+    def load(cls, version, registry=REGISTRY_FOLDER, verify=True):
+        """
+        Lädt ein Bundle aus der Registry; Gewichte und Scaler-Arrays werden als Memmap gelesen.
+
+        Parameter:
+        - verify: Prüfsummen aller Dateien mit dem Manifest vergleichen (ValueError bei Abweichung)
+        """
+        path = os.path.join(registry, version)
+        if not os.path.exists(os.path.join(path, 'manifest.json')):
+            raise FileNotFoundError(f"Bundle {path} not found!")
+        if verify:
+            problem = verify_bundle(path)
+            if problem:
+                raise ValueError(f"Bundle {path}: {problem}")
+        manifest = read_manifest(path)
+
+        weights = np.load(os.path.join(path, 'weights.npy'), mmap_mode='r')
+        with open(os.path.join(path, 'model.json')) as f:
+            try:
+                model = keras.models.model_from_json(f.read())
+            except (TypeError, ValueError) as e:
+                # the architecture is only readable with the Keras version it was saved with (or newer)
+                raise ValueError(f"Bundle {path} was saved with Keras {manifest.get('keras_version', 'unknown')} and cannot be "
+                                 f"read with Keras {keras.version()}, rebuild it with: python model_registry.py build {version}") from e
+        model.set_weights([weights[w['offset']:w['offset'] + int(np.prod(w['shape']))].reshape(w['shape'])
+                           for w in manifest['weights']])
+        scaler = MinMaxTransform(np.load(os.path.join(path, 'scaler_scale.npy'), mmap_mode='r'),
+                                 np.load(os.path.join(path, 'scaler_min.npy'), mmap_mode='r'),
+                                 manifest['scaler']['feature_range'], manifest['scaler']['clip'])
+        return cls(manifest['version'], model, scaler, manifest['feature_indices'], manifest)
+
+    def images(self, rows):
+        # same result as SelectedFeatureScaler.transform followed by image_creation in predict_test_data.py
+        x = self.selected.transform(rows).reshape(len(rows), self.dim, self.dim)
+        return np.broadcast_to(x[..., np.newaxis], x.shape + (3,))
+
+    def predict(self, rows, batch_size=8192):
+        """
+        Rückgabewert:
+        - y_pred: Wahrscheinlichkeiten (n, 3) für BUY: 0 | SELL: 1 | HOLD: 2
+        """
+        x = self.images(rows)
+        return np.concatenate([self.model.predict_on_batch(np.ascontiguousarray(x[i:i + batch_size]))
+                               for i in range(0, len(x), batch_size)])
+
+
+def open_bundle(version, registry=REGISTRY_FOLDER, folder='models'):
+    # registry bundle if it exists, otherwise the loose files in folder
+    if os.path.exists(os.path.join(registry, version, 'manifest.json')):
+        return ModelBundle.load(version, registry)
+    return ModelBundle.from_files(version, folder)
+
+
+def file_checksum(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def bundle_checksum(files):
+    # one checksum for the whole bundle, from the checksums of its files
+    return hashlib.sha256(''.join(f'{name}:{files[name]}\n' for name in sorted(files)).encode()).hexdigest()
+
+
+def read_manifest(path):
+    with open(os.path.join(path, 'manifest.json'), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def verify_bundle(path):
+    """
+    Rückgabewert:
+    - Beschreibung des Problems oder None, falls alle Dateien zum Manifest passen
+    """
+    try:
+        manifest = read_manifest(path)
+    except (OSError, ValueError) as e:
+        return f"manifest not readable ({e})"
+    if manifest.get('format') != BUNDLE_FORMAT:
+        return f"unknown bundle format {manifest.get('format')}"
+    files = manifest.get('files', {})
+    for name in BUNDLE_FILES:
+        file_path = os.path.join(path, name)
+        if not os.path.exists(file_path):
+            return f"{name} is missing"
+        if files.get(name) != file_checksum(file_path):
+            return f"checksum of {name} does not match the manifest"
+    if manifest.get('checksum') != bundle_checksum(files):
+        return "bundle checksum does not match the manifest"
+    return None
+
+
+def save_bundle(version, model, scaler, feature_indices, registry=REGISTRY_FOLDER, feature_columns=None, info=None):
+    """
+    Speichert Modell, Scaler und Features als ein Bundle registry/{version}:
+    manifest.json (Version, Keras-Version, Input-Shape, Spaltennamen, Feature-Indizes, Prüfsummen), model.json (Architektur),
+    weights.npy (alle Gewichte float32 hintereinander), scaler_min.npy und scaler_scale.npy.
+
+    Parameter:
+    - scaler: gefitteter MinMaxScaler (oder MinMaxTransform)
+    - feature_columns: Namen der Spalten vor dem Skalieren (Standard: feature_names_in_ des Scalers,
+      sonst Kursspalten + indicator_columns())
+    - info: zusätzliche Angaben fürs Manifest (z.B. Trainingsparameter)
+
+    Rückgabewert:
+    - manifest: Dictionary wie in manifest.json
+    """
+    if feature_columns is None:
+        feature_columns = getattr(scaler, 'feature_names_in_', None)
+    if feature_columns is None:
+        feature_columns = PRICE_COLUMNS + indicator_columns()
+    feature_columns = [str(column) for column in feature_columns]
+    feature_indices = [int(i) for i in feature_indices]
+    if len(feature_columns) != len(scaler.scale_):
+        raise ValueError(f"{len(feature_columns)} feature columns for a scaler with {len(scaler.scale_)} features")
+
+    weights = model.get_weights()
+    if any(w.dtype != np.float32 for w in weights):
+        raise ValueError("only float32 weights are supported")
+    offsets = np.cumsum([0] + [w.size for w in weights])
+
+    # write into a temporary folder first, an existing bundle is only replaced by a complete one
+    path = os.path.join(registry, version)
+    tmp_path = os.path.join(registry, f'.{version}.tmp')
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    with open(os.path.join(tmp_path, 'model.json'), 'w') as f:
+        f.write(model.to_json())
+    np.save(os.path.join(tmp_path, 'weights.npy'),
+            np.concatenate([w.ravel() for w in weights]) if weights else np.zeros(0, dtype=np.float32))
+    np.save(os.path.join(tmp_path, 'scaler_min.npy'), np.asarray(scaler.min_, dtype=np.float64))
+    np.save(os.path.join(tmp_path, 'scaler_scale.npy'), np.asarray(scaler.scale_, dtype=np.float64))
+
+    files = {name: file_checksum(os.path.join(tmp_path, name)) for name in BUNDLE_FILES}
+    manifest = {
+        'version': version,
+        'format': BUNDLE_FORMAT,
+        'keras_version': keras.version(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'input_shape': list(model.input_shape[1:]),
+        'classes': CLASSES,
+        'feature_columns': feature_columns,
+        'feature_indices': feature_indices,
+        'selected_features': [feature_columns[i] for i in feature_indices],
+        'scaler': {'type': 'MinMaxScaler', 'feature_range': list(scaler.feature_range), 'clip': bool(scaler.clip)},
+        'weights': [{'shape': list(w.shape), 'offset': int(offset)} for w, offset in zip(weights, offsets)],
+        'info': info or {},
+        'files': files,
+        'checksum': bundle_checksum(files),
+    }
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def build_bundle(version, folder='models', registry=REGISTRY_FOLDER):
+    # bundle from the three loose files of a version
+    bundle = ModelBundle.from_files(version, folder)
+    return save_bundle(version, bundle.model, bundle.scaler, bundle.feature_indices, registry)
+
+
+def list_bundles(registry=REGISTRY_FOLDER):
+    if not os.path.isdir(registry):
+        return []
+    return [read_manifest(os.path.join(registry, name)) for name in sorted(os.listdir(registry))
+            if os.path.exists(os.path.join(registry, name, 'manifest.json'))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Versioned model bundles (model, scaler, features) in one folder per version.")
+    parser.add_argument("command", choices=['build', 'list', 'verify'])
+    parser.add_argument("versions", nargs='*', help="build: versions in --folder (default: all), verify: versions (default: all)")
+    parser.add_argument("--folder", default='models', help="folder with the loose model, scaler and feature files")
+    parser.add_argument("--registry", default=REGISTRY_FOLDER)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        versions = args.versions or sorted(name[len('stock_prediction_model_'):-len('.keras')] for name in os.listdir(args.folder)
+                                           if name.startswith('stock_prediction_model_') and name.endswith('.keras'))
+        for version in versions:
+            manifest = build_bundle(version, args.folder, args.registry)
+            print(f"{version}: {manifest['checksum'][:12]} -> {os.path.join(args.registry, version)}")
+    elif args.command == 'list':
+        for manifest in list_bundles(args.registry):
+            print(f"{manifest['version']}: {manifest['checksum'][:12]} | input {manifest['input_shape']} | "
+                  f"{len(manifest['feature_indices'])} of {len(manifest['feature_columns'])} features | {manifest['created']}")
+    else:
+        versions = args.versions or [manifest['version'] for manifest in list_bundles(args.registry)]
+        for version in versions:
+            problem = verify_bundle(os.path.join(args.registry, version))
+            print(f"{version}: {problem or 'ok'}")
@@ -0,0 +1,243 @@
+import json
+import time
+import queue
+import argparse
+import threading
+import urllib.request
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from model_registry import open_bundle, REGISTRY_FOLDER
+
+
+FIRST_FEATURE, LAST_FEATURE = 'Open', 'bb_bbl_21'  # model input = merged_df.loc[:, 'Open':'bb_bbl_21']
+
+
+def feature_rows(features):
+    # DataFrame (merged_data layout) or array-like with 202 values per row -> float64 array (n, 202)
+    if isinstance(features, pd.DataFrame):
+        features = features.loc[:, FIRST_FEATURE:LAST_FEATURE].to_numpy(dtype=np.float64)
+    return np.atleast_2d(np.asarray(features, dtype=np.float64))
+
+
+class ModelServer:
+    """
+    Lokaler Vorhersage-Dienst: Modelle bleiben geladen, Anfragen werden zu Micro-Batches zusammengefasst.
+
+    Ein Worker-Thread nimmt die erste wartende Anfrage und sammelt weitere, bis max_batch_size Zeilen
+    erreicht sind oder max_latency Sekunden seit der ersten Anfrage vergangen sind. Pro Version wird
+    dann ein einziger Modellaufruf gemacht. Einzelne Zeilen aus vielen Threads (Dashboard, Paper Trading)
+    kosten damit einen Batch statt je einen Modellaufruf.
+
+    Parameter:
+    - registry: Ordner mit den Bundles (siehe model_registry.py), wird bevorzugt
+    - folder: Ordner mit den losen Modell-, Scaler- und Feature-Dateien für Versionen ohne Bundle
+    - max_batch_size: maximale Anzahl Zeilen pro Micro-Batch (grössere Anfragen laufen allein)
+    - max_latency: Latenzbudget in Sekunden, so lange wird nach der ersten Anfrage auf weitere gewartet
+    - max_stats: Anzahl der letzten Batches, über die latency_report Median und Quantile berechnet
+    """
+
+    def __init__(self, folder='models', max_batch_size=256, max_latency=0.01, registry=REGISTRY_FOLDER, max_stats=10000):
+        self.folder = folder
+        self.registry = registry
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.bundles = {}
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.batches = deque(maxlen=max_stats)  # per batch: version, rows, requests, wait_ms, predict_ms
+        self.total_batches = 0
+        self.total_rows = 0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def bundle(self, version):
+        # loaded once per version, on first use
+        with self.lock:
+            if version not in self.bundles:
+                start = time.perf_counter()
+                self.bundles[version] = open_bundle(version, self.registry, self.folder)
+                print(f"Model {version} loaded ({time.perf_counter() - start:.1f}s)")
+            return self.bundles[version]
+
+    def submit(self, features, version):
+        """
+        Reiht Zeilen zur Vorhersage ein. Zeilen mit falscher Anzahl Features sind ein ValueError für diesen
+        Aufrufer, sie kommen nie in einen Batch mit anderen Anfragen.
+
+        Rückgabewert:
+        - future: liefert die Wahrscheinlichkeiten (n, 3) der Zeilen
+        """
+        rows = feature_rows(features)
+        bundle = self.bundle(version)  # load errors are raised to the caller, not in the worker
+        n_features = bundle.selected.n_features_in_
+        if rows.ndim != 2 or rows.shape[1] != n_features:
+            raise ValueError(f"expected rows with {n_features} features ('{FIRST_FEATURE}':'{LAST_FEATURE}'), got shape {rows.shape}")
+        future = Future()
+        self.requests.put((version, rows, future, time.perf_counter()))
+        return future
+
+    def predict(self, features, version, timeout=None):
+        return self.submit(features, version).result(timeout)
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                return
+            pending = [request]
+            rows = len(request[1])
+            deadline = request[3] + self.max_latency
+            while rows < self.max_batch_size:
+                try:
+                    request = self.requests.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if request is None:
+                    self.requests.put(None)  # stop after this batch
+                    break
+                pending.append(request)
+                rows += len(request[1])
+            self.predict_pending(pending)
+
+    def predict_pending(self, pending):
+        versions = {}
+        for request in pending:
+            versions.setdefault(request[0], []).append(request)
+        for version, requests in versions.items():
+            start = time.perf_counter()
+            try:
+                y_pred = self.bundle(version).predict(np.concatenate([rows for _, rows, _, _ in requests]))
+            except Exception as e:
+                if len(requests) == 1:
+                    requests[0][2].set_exception(e)
+                else:
+                    # one bad request must not fail the others: predict each request alone
+                    for request in requests:
+                        self.predict_pending([request])
+                continue
+            end = time.perf_counter()
+            offset = 0
+            for _, rows, future, _ in requests:
+                future.set_result(y_pred[offset:offset + len(rows)])
+                offset += len(rows)
+            self.total_batches += 1
+            self.total_rows += offset
+            self.batches.append({
+                'version': version,
+                'rows': offset,
+                'requests': len(requests),
+                'wait_ms': (start - min(arrival for _, _, _, arrival in requests)) * 1000,
+                'predict_ms': (end - start) * 1000,
+            })
+
+    def latency_report(self):
+        """
+        Rückgabewert:
+        - Dictionary mit Anzahl Batches/Zeilen seit dem Start und Median/95%-Quantil von Wartezeit und Modellzeit
+          pro Batch (ms) über die letzten max_stats Batches
+        """
+        if not self.batches:
+            return {'batches': 0, 'rows': 0}
+        batches = pd.DataFrame(list(self.batches))
+        return {
+            'batches': self.total_batches,
+            'rows': self.total_rows,
+            'mean_batch_rows': float(batches['rows'].mean()),
+            'wait_ms_p50': float(batches['wait_ms'].median()),
+            'wait_ms_p95': float(batches['wait_ms'].quantile(0.95)),
+            'predict_ms_p50': float(batches['predict_ms'].median()),
+            'predict_ms_p95': float(batches['predict_ms'].quantile(0.95)),
+        }
+
+    def close(self):
+        self.requests.put(None)
+        self.thread.join()
+
+
+def serve_http(server, host='127.0.0.1', port=8000):
+    """
+    HTTP-Endpunkt für einen ModelServer (nur lokal gedacht).
+
+    - POST /predict/<version> mit {"features": [[202 Werte], ...]} -> {"predictions": [[p0, p1, p2], ...]}
+    - GET /stats -> latency_report()
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            parts = self.path.strip('/').split('/')
+            if len(parts) != 2 or parts[0] != 'predict':
+                return self.reply(404, {'error': 'use POST /predict/<version>'})
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                y_pred = server.predict(body['features'], parts[1])
+            except FileNotFoundError as e:
+                return self.reply(404, {'error': str(e)})
+            except (KeyError, ValueError) as e:
+                return self.reply(400, {'error': str(e)})
+            self.reply(200, {'predictions': y_pred.tolist()})
+
+        def do_GET(self):
+            if self.path.strip('/') != 'stats':
+                return self.reply(404, {'error': 'use GET /stats'})
+            self.reply(200, server.latency_report())
+
+        def reply(self, status, content):
+            body = json.dumps(content).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ThreadingHTTPServer((host, port), Handler)
+
+
+class ModelClient:
+    """
+    Client für serve_http, gleiche predict-Schnittstelle wie ModelServer.
+    """
+
+    def __init__(self, url='http://127.0.0.1:8000', timeout=30):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def predict(self, features, version):
+        body = json.dumps({'features': feature_rows(features).tolist()}).encode()
+        request = urllib.request.Request(f'{self.url}/predict/{version}', data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return np.array(json.load(response)['predictions'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve CNN predictions over a local HTTP endpoint.")
+    parser.add_argument("--models", nargs='+', default=['V1_Model1_ohneSmote'], help="model versions to load at start")
+    parser.add_argument("--folder", default='models', help="loose model files, used for versions without a registry bundle")
+    parser.add_argument("--registry", default=REGISTRY_FOLDER)
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch", type=int, default=256, help="maximum rows per micro-batch (default: 256)")
+    parser.add_argument("--latency-ms", type=float, default=10, help="latency budget for collecting a micro-batch (default: 10)")
+    args = parser.parse_args()
+
+    model_server = ModelServer(args.folder, max_batch_size=args.max_batch, max_latency=args.latency_ms / 1000,
+                               registry=args.registry)
+    for version in args.models:
+        model_server.bundle(version)
+    http_server = serve_http(model_server, args.host, args.port)
+    print(f"Serving on http://{args.host}:{args.port} (POST /predict/<version>, GET /stats)")
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        http_server.server_close()
+        model_server.close()
+        print(model_server.latency_report())
@@ -1,51 +1,74 @@
 # Imports
 import pandas as pd
 import numpy as np
-import joblib
 import os
+import time
+import argparse
 from tensorflow import keras
 import matplotlib.pyplot as plt
+from feature_store import load_table, iter_table, write_table, TableWriter, PREDICTION_COLUMNS, find_table, table_columns
+from model_registry import open_bundle, SelectedFeatureScaler, REGISTRY_FOLDER
 keras.backend.set_image_data_format('channels_first')
 
 
-def preprocess_data(merged_df, scaler_path):
-    merged_df = merged_df.loc[:, 'Open':'bb_bbl_21']
+def feature_columns(data_path):
+    """
+    Spalten 'Open':'bb_bbl_21' (Eingabe des Scalers) in der Reihenfolge der gespeicherten Tabelle, ohne Daten zu lesen.
 
-    if os.path.exists(scaler_path):
-        scaler = joblib.load(scaler_path)
-    else:
-        print(f"Scaler {scaler_path} not found!")
+    Rückgabewert:
+    - columns: Spaltennamen
+    - dtype: np.float32 wenn alle diese Spalten float32 sind (Parquet), sonst np.float64
+    """
+    path = find_table(data_path)
+    if path is None:
+        raise FileNotFoundError(f"no feature table at {data_path} (.parquet, parquet folder or .csv)")
+    if path.endswith('.csv'):
+        columns = list(pd.read_csv(path, nrows=0).columns)
+        columns = columns[columns.index('Open'):columns.index('bb_bbl_21') + 1]
+        return columns, np.float64
 
-    # Transform the data using the loaded scaler
-    scaled_data = scaler.transform(merged_df.to_numpy())
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    columns = table_columns(path)
+    columns = columns[columns.index('Open'):columns.index('bb_bbl_21') + 1]
+    schema = ds.dataset(path, partitioning='hive').schema
+    dtype = np.float32 if all(schema.field(column).type == pa.float32() for column in columns) else np.float64
+    return columns, dtype
 
-    print("Data preprocessed..")
 
-    return scaled_data
+def selected_scaler(data_path, scaler, feature_indices):
+    """
+    Scaler und Feature-Auswahl in einem Schritt (siehe SelectedFeatureScaler), für die Spalten von data_path.
 
+    Rückgabewert:
+    - selected: SelectedFeatureScaler, selected.columns sind die einzigen Feature-Spalten, die gelesen werden müssen
+    """
+    columns, dtype = feature_columns(data_path)
+    selected = SelectedFeatureScaler(scaler, feature_indices, columns, dtype)
+    print(f"Scaling {len(selected.columns)} of {selected.n_features_in_} features..")
+    return selected
 
-def select_features(preprocessed_data, feature_indices):
-    if feature_indices:
-        preprocessed_data = preprocessed_data[:, feature_indices]
-    
-    print("Features selected..")
-    print(preprocessed_data.shape)
 
-    return preprocessed_data
+def read_columns(selected):
+    # Ticker, Date, Close for the output plus the selected features
+    return ['Ticker', 'Date', 'Close'] + [column for column in selected.columns if column != 'Close']
 
 
 def image_creation(x, number_of_features=100):
+    """
+    Formt die Feature-Zeilen in Bilder (n, dim, dim, 3) für das CNN um.
 
-    dim = int(np.sqrt(number_of_features))
-    img_height = dim
-    img_width = dim
+    Ohne Kopie pro Zeile: reshape ist eine View, die 3 (identischen) Kanäle werden mit
+    np.broadcast_to nur als View angelegt (Stride 0) und erst batchweise in get_predictions kopiert.
+    float32 reicht, das Modell rechnet ohnehin in float32.
 
-    x_temp = np.zeros((len(x), img_height, img_width))
-    for i in range(x.shape[0]):
-        # print(type(x), type(x_temp), x.shape)
-        x_temp[i] = np.reshape(x[i], (img_height, img_width))
+    Rückgabewert:
+    - x: schreibgeschützte View mit Shape (n, dim, dim, 3)
+    """
+    dim = int(np.sqrt(number_of_features))
 
-    x = np.stack((x_temp,) * 3, axis=-1)
+    x = np.ascontiguousarray(x, dtype=np.float32).reshape(len(x), dim, dim)
+    x = np.broadcast_to(x[..., np.newaxis], x.shape + (3,))
 
     print("Image creation done..")
     print(f'Shape of x: {x.shape}')
@@ -67,51 +90,104 @@ def plot_images(x, save_path="test_image.png"):
     plt.savefig(save_path)
 
 
-def get_predictions(x, model_path):
-    if os.path.exists(model_path):
-        model = keras.models.load_model(model_path)
-        print(model.summary())
-    else:
-        print(f"Model {model_path} not found!")
-        return
-
-    y_pred = model.predict(x)
+def get_predictions(x, model, batch_size=8192):
+    # materialize the broadcast channels only for one batch at a time
+    y_pred = np.concatenate([model.predict(np.ascontiguousarray(x[i:i + batch_size]), verbose=0)
+                             for i in range(0, len(x), batch_size)])
     print("Prediction of model done..")
     return y_pred
 
 
-def add_predictions_to_df(df, y_pred, folder_name='predicted_data', file_name='predicted_data.csv'):
-    print("Creating Dataframe with predictions..")
-    for i, row in df.iterrows():
-        for j, pred in enumerate(y_pred[i]):
-            column_name = f'Prediction_{j}'
-            if column_name not in df.columns:
-                df[column_name] = None  # Initialize the column if it doesn't exist
-            df.at[i, column_name] = pred
+def add_predictions_to_df(df, y_pred):
+    # one float32 column per class, assigned in one block (row i of y_pred belongs to row i of df)
+    y_pred = np.asarray(y_pred, dtype=np.float32)
+    predictions = pd.DataFrame(y_pred, index=df.index, columns=[f'Prediction_{j}' for j in range(y_pred.shape[1])])
+    df = pd.concat([df.drop(columns=predictions.columns, errors='ignore'), predictions], axis=1)
+    df = df.rename(columns={'Unnamed: 0': 'Ticker'})
+    return df[PREDICTION_COLUMNS]
+
 
+def save_predictions(df, folder_name='predicted_data', file_name='predicted_data', file_format='parquet'):
     if not os.path.exists(folder_name):
         os.makedirs(folder_name)
         print("Created Folder:", folder_name)
 
-    df = df.rename(columns={'Unnamed: 0': 'Ticker'})
-    df = df[['Ticker', 'Date', 'Close', 'Prediction_0', 'Prediction_1', 'Prediction_2']]
-    df.to_csv(os.path.join(folder_name, file_name), index=False)
+    if file_format == 'csv':
+        df.to_csv(os.path.join(folder_name, file_name + '.csv'), index=False)
+    else:
+        write_table(df, os.path.join(folder_name, file_name + '.parquet'))
 
     print("DataFrame saved to:", folder_name)
     print("BUY: 0 | SELL: 1 | HOLD: 2")
-    return df
-
-
-# Load data
-merged_df = pd.read_csv('merged_data/merged_data_large.csv')
-feature_indices = np.loadtxt('models/selected_features_V1_Model1_ohneSmote.txt', dtype=int).tolist()
-#feature_indices = [3, 4, 26, 27, 28, 36, 37, 38, 39, 40, 41, 42, 43, 44, 45, 46, 47, 48, 49, 50, 51, 52, 53, 54, 55, 56, 57, 58, 59, 60, 61, 62, 63, 64, 65, 76, 86, 87, 88, 89, 90, 91, 92, 93, 94, 95, 96, 97, 98, 99, 100, 101, 102, 103, 104, 105, 109, 110, 112, 113, 114, 115, 116, 117, 118, 119, 120, 121, 122, 123, 124, 125, 126, 127, 128, 129, 130, 131, 132, 133, 134, 135, 136, 137, 139, 140, 142, 143, 145, 146, 148, 149, 151, 152, 154, 155, 157, 158, 160, 161]
-
-# Preprocessing and prediction
-preprocessed_data = preprocess_data(merged_df, scaler_path='models/scaler_V1_Model1_ohneSmote.pkl')
-preprocessed_data = select_features(preprocessed_data, feature_indices)
-image_data = image_creation(preprocessed_data, number_of_features=len(feature_indices))
-plot_images(image_data)
-y_pred = get_predictions(image_data, model_path='models/stock_prediction_model_V1_Model1_ohneSmote.keras')
-predicted_df = add_predictions_to_df(merged_df, y_pred, file_name='predicted_data_V1.csv')
-print(predicted_df)
+
+
+def predict_batch(data_path, scaler, feature_indices, model, file_name, file_format='parquet'):
+    """
+    Liest alle Features auf einmal, sagt voraus und speichert das Resultat (braucht Speicher für die ganze Tabelle).
+    Gelesen und skaliert werden nur die ausgewählten Features.
+    """
+    selected = selected_scaler(data_path, scaler, feature_indices)
+    merged_df = load_table(data_path, columns=read_columns(selected))
+    image_data = image_creation(selected.transform(merged_df), number_of_features=len(selected.columns))
+    plot_images(image_data)
+    y_pred = get_predictions(image_data, model)
+    print("Creating Dataframe with predictions..")
+    predicted_df = add_predictions_to_df(merged_df, y_pred)
+    save_predictions(predicted_df, file_name=file_name, file_format=file_format)
+    return predicted_df
+
+
+def predict_streaming(data_path, scaler, feature_indices, model, file_name, file_format='parquet',
+                      chunk_size=100000, folder_name='predicted_data'):
+    """
+    Gleiche Schritte wie predict_batch, aber für je chunk_size Zeilen: ausgewählte Features lesen und skalieren,
+    Bilder erstellen, vorhersagen und an die Ausgabedatei anhängen. Der Speicherbedarf hängt nur von
+    chunk_size ab, nicht von der Anzahl Ticker oder Tage. Die Ausgabe ist identisch zu predict_batch.
+
+    Rückgabewert:
+    - rows: Anzahl vorhergesagter Zeilen
+    """
+    if not os.path.exists(folder_name):
+        os.makedirs(folder_name)
+        print("Created Folder:", folder_name)
+    output_path = os.path.join(folder_name, f'{file_name}.{file_format}')
+
+    selected = selected_scaler(data_path, scaler, feature_indices)
+    start = time.perf_counter()
+    with TableWriter(output_path, file_format) as writer:
+        for chunk in iter_table(data_path, chunk_size=chunk_size, columns=read_columns(selected)):
+            x = image_creation(selected.transform(chunk), number_of_features=len(selected.columns))
+            if writer.rows == 0:
+                plot_images(x)
+            writer.write(add_predictions_to_df(chunk.reset_index(drop=True), get_predictions(x, model)))
+            print(f'{writer.rows} rows predicted ({time.perf_counter() - start:.1f}s)')
+
+    print("DataFrame saved to:", output_path)
+    print("BUY: 0 | SELL: 1 | HOLD: 2")
+    return writer.rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add CNN predictions to the merged features from prepare_test_data.py.")
+    parser.add_argument("--model", default='V1_Model1_ohneSmote', help="model name in /models (default: V1_Model1_ohneSmote)")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="rows per chunk, 0 = read everything at once (default: 100000)")
+    parser.add_argument("--format", choices=['parquet', 'csv'], default='parquet', help="file format of the predictions (default: parquet)")
+    parser.add_argument("--registry", default=REGISTRY_FOLDER, help="model bundles, versions without a bundle are loaded from /models")
+    args = parser.parse_args()
+
+    # Load model, scaler and selected features (registry bundle or the files in /models)
+    bundle = open_bundle(args.model, args.registry)
+    scaler = bundle.scaler
+    feature_indices = bundle.feature_indices
+    #feature_indices = [3, 4, 26, 27, 28, 36, 37, 38, 39, 40, 41, 42, 43, 44, 45, 46, 47, 48, 49, 50, 51, 52, 53, 54, 55, 56, 57, 58, 59, 60, 61, 62, 63, 64, 65, 76, 86, 87, 88, 89, 90, 91, 92, 93, 94, 95, 96, 97, 98, 99, 100, 101, 102, 103, 104, 105, 109, 110, 112, 113, 114, 115, 116, 117, 118, 119, 120, 121, 122, 123, 124, 125, 126, 127, 128, 129, 130, 131, 132, 133, 134, 135, 136, 137, 139, 140, 142, 143, 145, 146, 148, 149, 151, 152, 154, 155, 157, 158, 160, 161]
+    model = bundle.model
+    file_name = 'predicted_data_' + args.model.split('_')[0]
+
+    # Preprocessing and prediction
+    # parquet dataset from prepare_test_data.py (falls back to merged_data_large.csv)
+    data_path = 'merged_data/merged_data_large'
+    if args.chunk_size > 0:
+        predict_streaming(data_path, scaler, feature_indices, model, file_name, args.format, chunk_size=args.chunk_size)
+    else:
+        predicted_df = predict_batch(data_path, scaler, feature_indices, model, file_name, args.format)
+        print(predicted_df)
@@ -1,7 +1,6 @@
 # Imports
 import numpy as np
 import pandas as pd
-import yfinance as yf
 
 from ta.trend import TRIXIndicator
 from ta.trend import WMAIndicator
@@ -15,54 +14,65 @@ from ta.volume import ChaikinMoneyFlowIndicator
 from ta.trend import ADXIndicator
 
 import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Import preprocessing script
-from add_technical_indicators import add_technical_indicators
+from add_technical_indicators import add_technical_indicators, update_technical_indicators
+from price_store import PriceStore, YFinanceSource, CSVDirectorySource, HTTPSource
+from bulk_download import bulk_refresh, print_download_summary
+from feature_store import write_table
+from membership_index import MembershipIndex
 
 import warnings
 warnings.filterwarnings("ignore")
 
 
-def download_stock_data(symbols, folder_name='data', start='2022-06-01', end='2024-04-24'):
+def download_stock_data(symbols, folder_name='data', start='2022-06-01', end='2024-04-24', source=None,
+                        workers=8, rate=None, retries=3):
     """
-    Herunterladen von Aktiendaten mit yfinance und Speichern in CSV-Dateien.
+    Herunterladen von Aktiendaten und Speichern in CSV-Dateien (ein PriceStore pro Ordner).
+    Bereits gespeicherte Tage werden nicht erneut geladen, nur die fehlenden Tage werden angehängt.
+    Die Downloads laufen parallel (bulk_download.bulk_refresh) mit Rate-Limit und Wiederholungen.
 
     Parameter:
     - symbols: Eine Liste von Aktiensymbolen (z.B. ['AAPL', 'MSFT', 'GOOGL'])
+    - source: Datenquelle mit fetch(symbol, start, end), Standard ist YFinanceSource()
+              (CSVDirectorySource(ordner) oder HTTPSource(url) für Offline-Läufe)
+    - workers: Anzahl gleichzeitiger Downloads
+    - rate: maximale Anzahl Anfragen pro Sekunde (None = kein Limit)
+    - retries: Wiederholungen pro Anfrage bei Fehlern oder kaputten Daten
 
     Rückgabewert:
-    - None
+    - new_rows: Dictionary mit dem ersten neuen Datum pro Aktie (None falls nichts Neues geladen wurde)
     """
-    # Check if folder exists
-    if not os.path.exists(folder_name):
-        os.makedirs(folder_name)
-        print("Created Folder:", folder_name)
+    report = bulk_refresh(symbols, PriceStore(folder_name), source, start, end,
+                          workers=workers, rate=rate, retries=retries)
+    print_download_summary(report)
+    return report['new_rows']
 
-    for symbol in symbols:
-        data = yf.download(symbol, start=start, end=end)
-        if len(data > 1):
-            file_path = os.path.join(folder_name, f'{symbol}.csv')
-            data.to_csv(file_path)
-            print(f'Aktiendaten für {symbol} heruntergeladen und in {file_path} gespeichert.')
-        else:
-            print(f'Aktiendaten für {symbol} nicht gespeichert (dataframe ist leer).')
 
-
-def create_dataframes(data_folder = 'data'):
+def create_dataframes(data_folder = 'data', symbols=None):
     """
     Erstellt pro CSV-Datei einen DataFrame mit dem Namen der Aktie.
 
+    Parameter:
+    - symbols: nur diese Aktien (None = alle CSV-Dateien im Ordner)
+
     Rückgabewert:
     - dataframes: Ein Dictionary, das die DataFrames enthält, wobei die Schlüssel die Aktiennamen sind.
     """
     dataframes = {}
 
     # Durchlaufen aller CSV-Dateien im `data`-Ordner
-    for file_name in os.listdir(data_folder):
+    for file_name in sorted(os.listdir(data_folder)):
         if file_name.endswith('.csv'):
             # Aktienname aus dem Dateinamen extrahieren (ohne '.csv')
             stock_name = os.path.splitext(file_name)[0]
-            
+            if symbols is not None and stock_name not in symbols:
+                continue
+
             # DataFrame aus der CSV-Datei erstellen und im Dictionary speichern
             df = pd.read_csv(os.path.join(data_folder, file_name))
             dataframes[stock_name] = df
@@ -85,13 +95,76 @@ def date_format_dataframes(dataframes):
         dataframes[df].set_index('Date', inplace=True)
 
 
-def preprocess_dataframes(dataframes):
-    for df in dataframes:
-        print(f'Calculating features for {df}...')
-        dataframes[df] = add_technical_indicators(dataframes[df])
-        print(f'Features for {df} calculated.')
+def calculate_features(stock_name, df, feature_folder=None):
+    """
+    Berechnet die Features einer Aktie; läuft bei workers > 1 in einem eigenen Prozess.
+
+    Mit feature_folder werden die Features pro Aktie zwischengespeichert. Beim nächsten Lauf
+    werden dann nur die neu heruntergeladenen Zeilen (plus Warm-up) neu berechnet.
+
+    Rückgabewert:
+    - (stock_name, df, Rechenzeit in Sekunden)
+    """
+    start = time.perf_counter()
+    cache_path = os.path.join(feature_folder, f'{stock_name}.pkl') if feature_folder else None
+
+    if cache_path and os.path.exists(cache_path):
+        df = update_technical_indicators(pd.read_pickle(cache_path), df)
+    else:
+        df = add_technical_indicators(df)
+
+    if cache_path:
+        df.to_pickle(cache_path)
+    return stock_name, df, time.perf_counter() - start
+
+
+def print_timing_report(timings, top=10):
+    if not timings:
+        return
+    seconds = np.array(list(timings.values()))
+    print(f'Feature timing: {len(seconds)} tickers | total {seconds.sum():.2f}s | '
+          f'mean {seconds.mean():.3f}s | max {seconds.max():.3f}s')
+    for stock_name, duration in sorted(timings.items(), key=lambda item: item[1], reverse=True)[:top]:
+        print(f'  {stock_name}: {duration:.3f}s')
+
+
+def preprocess_dataframes(dataframes, workers=1, feature_folder=None):
+    """
+    Berechnet die Features für alle DataFrames.
+
+    Parameter:
+    - dataframes: Dictionary mit den DataFrames pro Aktie
+    - workers: Anzahl Prozesse; bei workers > 1 werden die Ticker auf einen ProcessPoolExecutor verteilt
+    - feature_folder: Ordner für zwischengespeicherte Features (None = immer alles neu berechnen)
+
+    Rückgabewert:
+    - dataframes: Dictionary in derselben Reihenfolge wie die Eingabe
+    """
+    timings = {}
+    if feature_folder and not os.path.exists(feature_folder):
+        os.makedirs(feature_folder)
+        print("Created Folder:", feature_folder)
+
+    if workers > 1:
+        results = {}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(calculate_features, stock_name, dataframes[stock_name], feature_folder) for stock_name in dataframes]
+            # results arrive in completion order
+            for future in as_completed(futures):
+                stock_name, df, duration = future.result()
+                results[stock_name] = df
+                timings[stock_name] = duration
+                print(f'Features for {stock_name} calculated ({duration:.2f}s, {len(results)}/{len(dataframes)}).')
+        # restore the input order so the merged dataframe is deterministic
+        dataframes = {stock_name: results[stock_name] for stock_name in dataframes}
+    else:
+        for df in dataframes:
+            print(f'Calculating features for {df}...')
+            _, dataframes[df], timings[df] = calculate_features(df, dataframes[df], feature_folder)
+            print(f'Features for {df} calculated.')
 
     print('All features calculated.')
+    print_timing_report(timings)
     return dataframes
 
 
@@ -102,20 +175,57 @@ def clean_dataframes(dataframes):
         dataframes[i] = dataframes[i][dataframes[i]['Close'] != 0.00]
     return dataframes
 
-def merge_dataframes(dataframes, folder_name='merged_data', file_name='merged_data_large.csv'):
-    # merge the dataframes to one dataframe
-    # save it as a csv file
-    merged_df = pd.concat(dataframes)
+def keep_members(dataframes, membership):
+    """
+    Behält pro Aktie nur die Tage, an denen sie im Index war (nach den Features, die Indikatoren brauchen
+    die Tage davor). Aktien ohne einen Tag im Index fallen weg.
+
+    Parameter:
+    - membership: MembershipIndex
+
+    Rückgabewert:
+    - dataframes: Dictionary in derselben Reihenfolge wie die Eingabe
+    """
+    members = {}
+    for stock_name, df in dataframes.items():
+        df = df[membership.ticker_mask(stock_name, df.index)]
+        if len(df):
+            members[stock_name] = df
+    print(f"Index members: {len(members)} of {len(dataframes)} tickers")
+    dropped = [stock_name for stock_name in dataframes if stock_name not in members]
+    if dropped:
+        print(f"Dropped (no day in the index): {', '.join(dropped)}")
+    return members
+
+
+def merge_dataframes(dataframes, folder_name='merged_data', file_name='merged_data_large', file_format='parquet'):
+    """
+    Fügt alle DataFrames zu einem DataFrame zusammen und speichert ihn.
+
+    Parameter:
+    - file_name: Name ohne Endung
+    - file_format: 'parquet' (Ordner partitioniert nach Ticker und Jahr, float32 Spalten) oder 'csv'
+
+    Rückgabewert:
+    - merged_df: DataFrame mit den Spalten Ticker, Date und allen Features
+    """
+    merged_df = pd.concat(dataframes, names=['Ticker', 'Date'])
 
     if not os.path.exists(folder_name):
         os.makedirs(folder_name)
         print("Created Folder:", folder_name)
 
     merged_df = merged_df.dropna()  # Deletes rows wit nan values (for example first entries until indicator window is reached)
-    merged_df.to_csv(os.path.join(folder_name, file_name))
+    merged_df = merged_df.reset_index()
+    if file_format == 'csv':
+        path = os.path.join(folder_name, file_name + '.csv')
+        merged_df.to_csv(path, index=False)
+    else:
+        path = os.path.join(folder_name, file_name)
+        write_table(merged_df, path, partition_cols=['Ticker', 'year'])
 
     print('Merged Dataframes')
-    print(f"DataFrame saved to: /{folder_name}/{file_name}")
+    print(f"DataFrame saved to: /{path}")
     return merged_df
 
 
@@ -123,17 +233,47 @@ def merge_dataframes(dataframes, folder_name='merged_data', file_name='merged_da
 stocks = ['MMM', 'ABT', 'ABBV', 'ACN', 'AYI', 'ADBE', 'AMD', 'AAP', 'AES', 'AET', 'AMG', 'AFL', 'A', 'APD', 'AKAM', 'ALK', 'ALB', 'ARE', 'ALGN', 'ALLE', 'LNT', 'ALL', 'GOOGL', 'GOOG', 'MO', 'AMZN', 'AEE', 'AAL', 'AEP', 'AXP', 'AIG', 'AMT', 'AWK', 'AMP', 'AME', 'AMGN', 'APH', 'ADI', 'ANDV', 'ANSS', 'AON', 'AOS', 'APA', 'AIV', 'AAPL', 'AMAT', 'ADM', 'AJG', 'AIZ', 'T', 'ADSK', 'ADP', 'AZO', 'AVB', 'AVY', 'BAC', 'BK', 'BAX', 'BDX', 'BBY', 'BIIB', 'BLK', 'HRB', 'BA', 'BWA', 'BXP', 'BSX', 'BHF', 'BMY', 'AVGO', 'CHRW', 'CPB', 'COF', 'CAH', 'CBOE', 'KMX', 'CCL', 'CAT', 'CNC', 'CNP', 'CF', 'SCHW', 'CHTR', 'CHK', 'CVX', 'CMG', 'CB', 'CHD', 'CI', 'CINF', 'CTAS', 'CSCO', 'C', 'CFG', 'CLX', 'CME', 'CMS', 'KO', 'CTSH', 'CL', 'CMCSA', 'CMA', 'CAG', 'COP', 'ED', 'STZ', 'COO', 'GLW', 'COST', 'COTY', 'CCI', 'CSRA', 'CSX', 'CMI', 'CVS', 'DHI', 'DHR', 'DRI', 'DVA', 'DE', 'DAL', 'XRAY', 'DVN', 'DLR', 'DFS', 'DG', 'DLTR', 'D', 'DOV', 'DOW', 'DTE', 'DD', 'DUK', 'DXC', 'EMN', 'ETN', 'EBAY', 'ECL', 'EIX', 'EW', 'EA', 'EMR', 'ETR', 'EVHC', 'EOG', 'EQT', 'EFX', 'EQIX', 'EQR', 'ESS', 'EL', 'ES', 'EXC', 'EXPE', 'EXPD', 'ESRX', 'EXR', 'XOM', 'FFIV', 'FAST', 'FRT', 'FDX', 'FIS', 'FITB', 'FE', 'FLS', 'FLR', 'FMC', 'FL', 'F', 'FTV', 'BEN', 'FCX', 'GPS', 'GRMN', 'IT', 'GD', 'GE', 'GIS', 'GM', 'GPC', 'GILD', 'GPN', 'GS', 'GT', 'GWW', 'HAL', 'HBI', 'HOG', 'HIG', 'HAS', 'HCA', 'HCP', 'HP', 'HSIC', 'HSY', 'HES', 'HPE', 'HLT', 'HOLX', 'HD', 'HON', 'HRL', 'HST', 'HPQ', 'HUM', 'HBAN', 'IDXX', 'ITW', 'ILMN', 'IR', 'INTC', 'ICE', 'IBM', 'INCY', 'IP', 'IPG', 'IFF', 'INTU', 'ISRG', 'IVZ', 'IRM', 'JBHT', 'SJM', 'JNJ', 'JCI', 'JPM', 'JNPR', 'K', 'KEY', 'KMB', 'KIM', 'KMI', 'KLAC', 'KSS', 'KHC', 'KR', 'LH', 'LRCX', 'LEG', 'LEN', 'LLY', 'LNC', 'LKQ', 'LMT', 'L', 'LOW', 'LYB', 'MTB', 'MAC', 'M', 'MRO', 'MPC', 'MAR', 'MMC', 'MLM', 'MAS', 'MA', 'MAT', 'MKC', 'MCD', 'MCK', 'MDT', 'MRK', 'MET', 'MTD', 'MGM', 'MCHP', 'MU', 'MSFT', 'MAA', 'MHK', 'TAP', 'MDLZ', 'MNST', 'MCO', 'MS', 'MOS', 'MSI', 'NDAQ', 'NOV', 'NAVI', 'NTAP', 'NFLX', 'NWL', 'NFX', 'NEM', 'NWSA', 'NWS', 'NEE', 'NKE', 'NI', 'JWN', 'NSC', 'NTRS', 'NOC', 'NRG', 'NUE', 'NVDA', 'ORLY', 'OXY', 'OMC', 'OKE', 'ORCL', 'PCAR', 'PKG', 'PH', 'PDCO', 'PAYX', 'PYPL', 'PNR', 'PEP', 'PRGO', 'PFE', 'PCG', 'PM', 'PSX', 'PNW', 'PXD', 'PNC', 'RL', 'PPG', 'PPL', 'PX', 'PFG', 'PG', 'PGR', 'PLD', 'PRU', 'PEG', 'PSA', 'PHM', 'PVH', 'QRVO', 'PWR', 'QCOM', 'DGX', 'RRC', 'RJF', 'O', 'REG', 'REGN', 'RF', 'RSG', 'RMD', 'RHI', 'ROK', 'COL', 'ROP', 'ROST', 'RCL', 'CRM', 'SCG', 'SLB', 'SNI', 'STX', 'SEE', 'SRE', 'SHW', 'SIG', 'SPG', 'SWKS', 'SLG', 'SNA', 'SO', 'LUV', 'SPGI', 'SWK', 'SBUX', 'STT', 'SRCL', 'SYK', 'STI', 'SYF', 'SNPS', 'SYY', 'TROW', 'TGT', 'TEL', 'FTI', 'TXN', 'TXT', 'TMO', 'TWX', 'TJX', 'TSCO', 'TDG', 'TRV', 'TRIP', 'FOXA', 'FOX', 'TSN', 'UDR', 'ULTA', 'USB', 'UA', 'UAA', 'UNP', 'UAL', 'UNH', 'UPS', 'URI', 'UHS', 'UNM', 'VFC', 'VLO', 'VTR', 'VRSN', 'VRSK', 'VZ', 'VRTX', 'V', 'VNO', 'VMC', 'WMT', 'WBA', 'DIS', 'WM', 'WAT', 'WEC', 'WFC', 'WDC', 'WU', 'WRK', 'WY', 'WHR', 'WMB', 'WYNN', 'XEL', 'XRX', 'XYL', 'YUM', 'ZBH', 'ZION', 'ZTS']
 crypto = ['BTC-USD', 'ETH-USD', 'BNB-USD', 'SOL-USD', 'XRP-USD', 'DOGE-USD', 'ADA-USD', 'AVAX-USD', 'SHIB-USD', 'DOT-USD', 'LINK-USD', 'TRX-USD', 'BCH-USD', 'HBAR-USD', 'ATOM-USD']
 
-# Settings
-tickers = stocks
-folder_name = 'data'
-file_name = 'merged_data_large.csv'
-
-# Run Pipeline
-print("Preparing Test Data for:", len(tickers), "tickers..")
-download_stock_data(tickers, folder_name=folder_name)
-dataframes = create_dataframes(data_folder=folder_name)
-print(dataframes.keys())
-date_format_dataframes(dataframes)
-dataframes = preprocess_dataframes(dataframes)
-dataframes = clean_dataframes(dataframes)
-merged_df = merge_dataframes(dataframes, file_name=file_name)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download stock data and calculate the features for the CNN.")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes for the feature calculation (default: 1)")
+    parser.add_argument("--source-dir", default=None, help="read prices from a folder with {ticker}.csv files instead of Yahoo Finance")
+    parser.add_argument("--source-url", default=None, help="read prices from an HTTP server serving {ticker}.csv (e.g. a local fake server)")
+    parser.add_argument("--download-workers", type=int, default=8, help="number of parallel downloads (default: 8)")
+    parser.add_argument("--rate", type=float, default=2.0, help="maximum requests per second to the price source (default: 2, 0 = no limit)")
+    parser.add_argument("--format", choices=['parquet', 'csv'], default='parquet', help="file format of the merged data (default: parquet)")
+    parser.add_argument("--feature-cache", default=None,
+                        help="folder for cached features per ticker, only new rows are recalculated (incremental values "
+                             "of EMA/TRIX/CMO/MACD/PPO/ADX/ATR differ slightly from a full run; default: no cache)")
+    parser.add_argument("--start", default='2022-06-01', help="first day to download (default: 2022-06-01)")
+    parser.add_argument("--end", default='2024-04-24', help="last day to download (default: 2024-04-24)")
+    parser.add_argument("--membership", default=None,
+                        help="membership csv (membership_index.py): only tickers and days in the index instead of the ticker list")
+    args = parser.parse_args()
+
+    # Settings
+    tickers = stocks
+    membership = None
+    if args.membership:
+        membership = MembershipIndex.load(args.membership)
+        tickers = membership.tickers_between(args.start, args.end)
+    folder_name = 'data'
+    file_name = 'merged_data_large'
+
+    # Run Pipeline
+    print("Preparing Test Data for:", len(tickers), "tickers..")
+    if args.source_dir:
+        source = CSVDirectorySource(args.source_dir)
+    elif args.source_url:
+        source = HTTPSource(args.source_url)
+    else:
+        source = YFinanceSource()
+    download_stock_data(tickers, folder_name=folder_name, start=args.start, end=args.end, source=source,
+                        workers=args.download_workers, rate=args.rate)
+    dataframes = create_dataframes(data_folder=folder_name, symbols=set(tickers) if membership is not None else None)
+    print(dataframes.keys())
+    date_format_dataframes(dataframes)
+    dataframes = preprocess_dataframes(dataframes, workers=args.workers, feature_folder=args.feature_cache)
+    dataframes = clean_dataframes(dataframes)
+    if membership is not None:
+        dataframes = keep_members(dataframes, membership)
+    merged_df = merge_dataframes(dataframes, file_name=file_name, file_format=args.format)
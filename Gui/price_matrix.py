@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+
+
+class PriceMatrix:
+    """
+    Dichte Matrix der Schlusskurse (Datum x Ticker), einmal pro Datensatz aufgebaut.
+
+    Ersetzt das Filtern von trading_bot_df nach (Ticker, Date) für jede Position an jedem Tag:
+    der Wert eines Portfolios ist ein Skalarprodukt aus Mengen-Vektor und einer Zeile der Matrix.
+    Gibt es für (Date, Ticker) mehrere Zeilen, zählt wie bisher die erste Zeile in trading_bot_df.
+    """
+
+    def __init__(self, trading_bot_df):
+        df = trading_bot_df.drop_duplicates(subset=['Date', 'Ticker'], keep='first')
+        date_codes, self.dates = pd.factorize(df['Date'], sort=True)
+        ticker_codes, self.tickers = pd.factorize(df['Ticker'], sort=True)
+        self.date_index = {date: i for i, date in enumerate(self.dates)}
+        self.ticker_index = {ticker: j for j, ticker in enumerate(self.tickers)}
+
+        # NaN = no price on that day; such holdings add nothing to the portfolio value
+        self.prices = np.full((len(self.dates), len(self.tickers)), np.nan)
+        self.prices[date_codes, ticker_codes] = df['Close'].to_numpy(dtype=np.float64)
+        self.values = np.nan_to_num(self.prices)
+
+    @classmethod
+    def from_arrays(cls, dates, tickers, prices):
+        # rebuild from saved arrays (e.g. memory mapped in a worker process) without the dataframe
+        price_matrix = cls.__new__(cls)
+        price_matrix.dates = dates
+        price_matrix.tickers = tickers
+        price_matrix.date_index = {date: i for i, date in enumerate(dates.tolist())}
+        price_matrix.ticker_index = {ticker: j for j, ticker in enumerate(tickers.tolist())}
+        price_matrix.prices = prices
+        price_matrix.values = np.nan_to_num(prices)
+        return price_matrix
+
+    def price(self, ticker, date):
+        i = self.date_index.get(date)
+        j = self.ticker_index.get(ticker)
+        if i is None or j is None:
+            return np.nan
+        return self.prices[i, j]
+
+    def portfolio_value(self, portfolio, cash_balance, date):
+        """
+        Rückgabewert:
+        - cash_balance + Summe(Menge * Schlusskurs am Datum) über alle Positionen im Portfolio
+        """
+        i = self.date_index.get(date)
+        if i is None or not portfolio:
+            return cash_balance
+        columns = [self.ticker_index.get(ticker, -1) for ticker in portfolio]
+        quantities = np.fromiter(portfolio.values(), dtype=np.float64, count=len(portfolio))
+        known = np.array(columns) >= 0
+        return cash_balance + float(np.dot(self.values[i, np.array(columns)[known]], quantities[known]))
@@ -0,0 +1,139 @@
+import io
+import os
+import urllib.error
+import urllib.parse
+import urllib.request
+import pandas as pd
+
+
+class YFinanceSource:
+    """
+    Lädt Kursdaten von Yahoo Finance (end ist exklusiv, wie bei yf.download).
+    """
+
+    def fetch(self, symbol, start, end):
+        import yfinance as yf
+        # Ticker.history keeps no shared state between calls (yf.download does), so it is safe in threads
+        return yf.Ticker(symbol).history(start=start, end=end, auto_adjust=False, actions=False)
+
+
+class CSVDirectorySource:
+    """
+    Liest Kursdaten aus einem Ordner mit {symbol}.csv Dateien (z.B. Fixtures für Tests oder Offline-Läufe).
+    Gleiche Schnittstelle wie YFinanceSource.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def fetch(self, symbol, start, end):
+        file_path = os.path.join(self.folder, f'{symbol}.csv')
+        if not os.path.exists(file_path):
+            return pd.DataFrame()
+        data = pd.read_csv(file_path, index_col='Date', parse_dates=True)
+        return data[(data.index >= pd.Timestamp(start)) & (data.index < pd.Timestamp(end))]
+
+
+class HTTPSource:
+    """
+    Lädt {base_url}/{symbol}.csv?start=...&end=... (z.B. von einem lokalen Fake-Server für Tests).
+    Die CSV-Datei hat dasselbe Format wie die Dateien im PriceStore; 404 bedeutet keine Daten.
+    """
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def fetch(self, symbol, start, end):
+        query = urllib.parse.urlencode({'start': start, 'end': end})
+        url = f'{self.base_url}/{urllib.parse.quote(symbol)}.csv?{query}'
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                text = response.read().decode('utf-8')
+        except urllib.error.HTTPError as error:
+            if error.code == 404:
+                return pd.DataFrame()
+            raise
+        if not text.strip():
+            return pd.DataFrame()
+        return pd.read_csv(io.StringIO(text), index_col='Date', parse_dates=True)
+
+
+class PriceStore:
+    """
+    Lokaler Speicher für OHLCV Daten: eine CSV-Datei pro Ticker, Zeilen nach Datum sortiert.
+
+    refresh() lädt nur die fehlenden Tage vor dem ersten bzw. nach dem letzten gespeicherten Datum
+    und hängt sie an, statt jedes Mal die ganze Historie neu herunterzuladen.
+    """
+
+    def __init__(self, folder='data'):
+        self.folder = folder
+
+    def path(self, symbol):
+        return os.path.join(self.folder, f'{symbol}.csv')
+
+    def load(self, symbol):
+        file_path = self.path(symbol)
+        if not os.path.exists(file_path):
+            return None
+        return pd.read_csv(file_path, index_col='Date', parse_dates=True)
+
+    def save(self, symbol, data):
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+            print("Created Folder:", self.folder)
+        # write to a temporary file first so an interrupted run never leaves a truncated CSV
+        tmp_path = self.path(symbol) + '.tmp'
+        data.to_csv(tmp_path)
+        os.replace(tmp_path, self.path(symbol))
+
+    def refresh(self, symbol, source, start, end):
+        """
+        Ergänzt die gespeicherten Daten eines Tickers um die fehlenden Tage im Bereich [start, end).
+
+        Rückgabewert:
+        - data: alle gespeicherten Daten des Tickers (None falls keine Daten vorhanden sind)
+        - first_new_date: erstes neu angehängtes Datum am Ende (None falls keine neuen Zeilen am Ende)
+        """
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        stored = self.load(symbol)
+
+        if stored is None or stored.empty:
+            data = normalize(source.fetch(symbol, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')))
+            if data.empty:
+                return None, None
+            self.save(symbol, data)
+            return data, data.index[0]
+
+        head = pd.DataFrame()
+        tail = pd.DataFrame()
+
+        # missing history before the first stored bar
+        if start < stored.index[0]:
+            head = normalize(source.fetch(symbol, start.strftime('%Y-%m-%d'), stored.index[0].strftime('%Y-%m-%d')))
+            head = head[head.index < stored.index[0]]
+
+        # missing tail since the last stored bar
+        tail_start = stored.index[-1] + pd.Timedelta(days=1)
+        if tail_start < end:
+            tail = normalize(source.fetch(symbol, tail_start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')))
+            tail = tail[tail.index > stored.index[-1]]
+
+        if head.empty and tail.empty:
+            return stored, None
+
+        data = pd.concat([part for part in (head, stored, tail) if not part.empty])
+        self.save(symbol, data)
+        return data, (tail.index[0] if not tail.empty else None)
+
+
+def normalize(data):
+    # Date index without timezone, sorted and without duplicate days
+    if data is None or data.empty:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name='Date'))
+    data = data.copy()
+    data.index = pd.DatetimeIndex(data.index).tz_localize(None).normalize()
+    data.index.name = 'Date'
+    data = data[~data.index.duplicated(keep='last')]
+    return data.sort_index()
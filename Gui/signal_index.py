@@ -0,0 +1,94 @@
+import os
+import numpy as np
+import pandas as pd
+
+from price_matrix import PriceMatrix
+
+
+def sort_signals(trading_bot_df):
+    # Sort for best actions per day (same order as in the GUI)
+    trading_bot_df = trading_bot_df.copy()
+    trading_bot_df['max_prediction'] = trading_bot_df[['Prediction_0', 'Prediction_1', 'Prediction_2']].max(axis=1)
+    trading_bot_df = trading_bot_df.sort_values(by=['Date', 'max_prediction'], ascending=[True, False])
+    return trading_bot_df.drop(columns=['max_prediction'])
+
+
+class SignalIndex:
+    """
+    Signale eines Datensatzes, einmal nach Datum gruppiert statt jeden Tag trading_bot_df['Date'] == date.
+
+    Die Zeilen eines Tages liegen zusammenhängend in den Arrays (Reihenfolge innerhalb des Tages wie in
+    trading_bot_df), Aktion (argmax der Prediction-Spalten) und Wahrscheinlichkeit (Maximum) sind
+    vorberechnet. Ein Tag ist damit ein Slice plus eine vektorisierte Maske für den Threshold.
+
+    Alle Arrays sind Zahlen oder Text fester Länge und lassen sich mit save/load als Memmap
+    zwischen Prozessen teilen.
+    """
+
+    ARRAYS = ['dates', 'starts', 'fridays', 'tickers', 'close', 'action', 'max_prediction',
+              'price_dates', 'price_tickers', 'prices']
+
+    def __init__(self, trading_bot_df=None, arrays=None):
+        if arrays is None:
+            arrays = self.build_arrays(trading_bot_df)
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.date_index = {date: i for i, date in enumerate(self.dates.tolist())}
+        self.price_matrix = PriceMatrix.from_arrays(self.price_dates, self.price_tickers, self.prices)
+
+    @staticmethod
+    def build_arrays(trading_bot_df):
+        # contiguous rows per date (stable, keeps the order of trading_bot_df within a day)
+        dates = trading_bot_df['Date'].to_numpy().astype(str)
+        order = np.argsort(dates, kind='stable')
+        unique_dates, starts = np.unique(dates[order], return_index=True)
+        predictions = trading_bot_df[['Prediction_0', 'Prediction_1', 'Prediction_2']].to_numpy()[order]
+        price_matrix = PriceMatrix(trading_bot_df)
+        return {
+            'dates': unique_dates,
+            'starts': np.append(starts, len(order)),
+            'fridays': np.asarray(pd.to_datetime(unique_dates).weekday == 4),
+            'tickers': trading_bot_df['Ticker'].to_numpy().astype(str)[order],
+            'close': trading_bot_df['Close'].to_numpy(dtype=np.float64)[order],
+            'action': np.argmax(predictions, axis=1),  # first maximum wins, like max(dict, key=...)
+            'max_prediction': predictions.max(axis=1),
+            'price_dates': np.asarray(price_matrix.dates).astype(str),
+            'price_tickers': np.asarray(price_matrix.tickers).astype(str),
+            'prices': price_matrix.prices,
+        }
+
+    def save(self, folder):
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        for name in self.ARRAYS:
+            np.save(os.path.join(folder, f'{name}.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, folder):
+        # memory mapped and read-only: all processes share the same pages
+        return cls(arrays={name: np.load(os.path.join(folder, f'{name}.npy'), mmap_mode='r') for name in cls.ARRAYS})
+
+    def day(self, date):
+        """
+        Rückgabewert:
+        - (start, end): Zeilen start:end gehören zum Datum, (0, 0) falls es an diesem Tag keine Signale gibt
+        """
+        i = self.date_index.get(date)
+        if i is None:
+            return 0, 0
+        return int(self.starts[i]), int(self.starts[i + 1])
+
+    def is_friday(self, date):
+        i = self.date_index.get(date)
+        return i is not None and bool(self.fridays[i])
+
+    def signals(self, date, threshhold):
+        """
+        Rückgabewert:
+        - start: erste Zeile des Tages
+        - buy, sell: Masken für die Zeilen des Tages (beste Aktion Buy/Sell mit Wahrscheinlichkeit >= threshhold)
+        """
+        start, end = self.day(date)
+        confident = self.max_prediction[start:end] >= threshhold
+        action = self.action[start:end]
+        return start, confident & (action == 0), confident & (action == 1)
@@ -0,0 +1,150 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from feature_store import load_table, PREDICTION_COLUMNS
+from backtest import Backtest, MODES, performance
+from signal_index import SignalIndex, sort_signals
+from membership_index import MembershipIndex
+
+
+# Datasets of the GUI (app_V3.py)
+DATASETS = {
+    'V1_noSMOTE': 'predicted_data/predicted_data_V1',
+    'V2_withSMOTE': 'predicted_data/predicted_data_V2',
+    'V3_withSMOTE': 'predicted_data/predicted_data_V3',
+    'V1_crypto_noSMOTE': 'predicted_data/predicted_data_crypto_V1',
+    'V2_crypto_withSMOTE': 'predicted_data/predicted_data_crypto_V2',
+    'V3_crypto_withSMOTE': 'predicted_data/predicted_data_crypto_V3',
+}
+
+# signals per dataset and membership per file, loaded once per worker process (signals memory mapped, shared read-only)
+worker_signals = {}
+worker_membership = {}
+
+
+def parameter_grid(thresholds, modes=MODES, budgets=range(1, 11)):
+    """
+    Alle Einstellungen der GUI: buy1perDay mit/ohne only_one_of_each_stock,
+    buybyBudget_SellFriday mit jedem available_per_day.
+
+    Rückgabewert:
+    - Liste von Dictionaries mit den Argumenten für Backtest
+    """
+    grid = []
+    for threshhold, mode in itertools.product(thresholds, modes):
+        if mode == 'buy1perDay':
+            for only_one in (False, True):
+                grid.append({'threshhold': threshhold, 'mode': mode, 'only_one_of_each_stock': only_one, 'available_per_day': 3})
+        else:
+            for budget in budgets:
+                grid.append({'threshhold': threshhold, 'mode': mode, 'only_one_of_each_stock': False, 'available_per_day': budget})
+    return grid
+
+
+def run_setting(task):
+    # runs in a worker process: one backtest for one dataset and one setting
+    dataset, folder, dates, starting_balance, settings, membership_path = task
+    if dataset not in worker_signals:
+        worker_signals[dataset] = SignalIndex.load(folder)
+    membership = None
+    if membership_path:
+        if membership_path not in worker_membership:
+            worker_membership[membership_path] = MembershipIndex.load(membership_path)
+        membership = worker_membership[membership_path]
+    bot = Backtest(worker_signals[dataset], starting_balance=starting_balance, membership=membership, **settings)
+    equity, trades = bot.run(dates)
+    result = {'dataset': dataset, **settings, **performance(equity['Value']), 'trades': len(trades)}
+    return result
+
+
+def run_sweep(datasets, index_df, start_date, end_date, grid, starting_balance=1000, workers=None, membership_path=None):
+    """
+    Führt alle Einstellungen aus grid für alle Datensätze parallel aus.
+
+    Die Signale jedes Datensatzes werden einmal aufbereitet (SignalIndex) und als .npy Dateien gespeichert;
+    die Worker-Prozesse lesen sie als Memmap (geteilt, nur lesend) statt einer Kopie pro Aufgabe.
+
+    Parameter:
+    - datasets: Dictionary Name -> Pfad ohne Dateiendung (parquet oder csv)
+    - index_df: Index mit Date und Close, die Handelstage kommen wie in der GUI aus diesem DataFrame
+    - grid: Liste von Einstellungen (siehe parameter_grid)
+    - membership_path: Datei eines MembershipIndex, gekauft werden nur Ticker, die an diesem Tag im Index sind
+
+    Rückgabewert:
+    - results: DataFrame mit einer Zeile pro Datensatz und Einstellung, nach Sharpe Ratio sortiert
+      (FileNotFoundError, falls kein Datensatz geladen werden kann, ValueError bei leerem grid)
+    """
+    if not grid:
+        raise ValueError("empty parameter grid")
+    index_dates = pd.to_datetime(index_df['Date'])
+    index_df = index_df[(index_dates >= pd.to_datetime(start_date)) & (index_dates <= pd.to_datetime(end_date))]
+    dates = index_df['Date'].tolist()
+
+    shared_folder = tempfile.mkdtemp(prefix='sweep_')
+    try:
+        tasks = []
+        for name, path in datasets.items():
+            trading_bot_df = load_table(path, columns=PREDICTION_COLUMNS)
+            if trading_bot_df is None:
+                continue
+            folder = os.path.join(shared_folder, name)
+            SignalIndex(sort_signals(trading_bot_df)).save(folder)
+            tasks += [(name, folder, dates, starting_balance, settings, membership_path) for settings in grid]
+        if not tasks:
+            raise FileNotFoundError(f"none of the predicted datasets could be loaded: {', '.join(datasets.values())}")
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(tasks) // (4 * (workers or os.cpu_count() or 1)))
+            results = list(executor.map(run_setting, tasks, chunksize=chunksize))
+    finally:
+        shutil.rmtree(shared_folder, ignore_errors=True)
+
+    results = pd.DataFrame(results)
+    index = performance(index_df['Close'])
+    results['index_return'] = index['return']
+    results['index_sharpe'] = index['sharpe']
+    return results.sort_values(by='sharpe', ascending=False, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backtest all combinations of the GUI settings on all predicted datasets.")
+    parser.add_argument("--datasets", nargs='+', choices=list(DATASETS), default=list(DATASETS))
+    parser.add_argument("--index", default='../CNN/test_data/^GSPC', help="index prices, the trading days come from this file")
+    parser.add_argument("--start", default='2000-01-01')
+    parser.add_argument("--end", default='2100-01-01')
+    parser.add_argument("--balance", type=float, default=1000, help="starting balance ($)")
+    parser.add_argument("--thresholds", type=float, nargs=3, default=[0.34, 1.0, 0.02], metavar=('MIN', 'MAX', 'STEP'),
+                        help="risk threshholds from MIN to MAX (default: 0.34 1.0 0.02)")
+    parser.add_argument("--modes", nargs='+', choices=MODES, default=MODES)
+    parser.add_argument("--samples", type=int, default=0, help="only run a random sample of this many settings (0 = full grid)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (default: all CPUs)")
+    parser.add_argument("--membership", default=None, help="only buy tickers that were in the index on that day (membership csv)")
+    parser.add_argument("--output", default='sweep_results.csv')
+    args = parser.parse_args()
+
+    low, high, step = args.thresholds
+    thresholds = np.round(np.arange(low, high + step / 2, step), 4).tolist()
+    grid = parameter_grid(thresholds, args.modes)
+    if 0 < args.samples < len(grid):
+        rng = np.random.default_rng(args.seed)
+        grid = [grid[i] for i in sorted(rng.choice(len(grid), args.samples, replace=False))]
+
+    datasets = {name: DATASETS[name] for name in args.datasets}
+    print(f"Running {len(grid)} settings x {len(datasets)} datasets..")
+    start = time.perf_counter()
+    results = run_sweep(datasets, load_table(args.index), args.start, args.end, grid, args.balance, args.workers,
+                        args.membership)
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+    results.to_csv(args.output, index=False)
+    print(results.head(10).to_string())
+    print("Results saved to:", args.output)
@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicator_engine import rsi_smooth, compute_indicators, indicator_columns, OHLCV_COLUMNS
+
+
+WINDOWS = [3, 5, 7, 9, 11, 13, 15, 17, 19, 21]
+ENGINE_WINDOWS = [3, 4, 7, 11, 21]
+
+
+def get_RSI_smooth_rolling(df, window):
+    # previous implementation of add_technical_indicators.get_RSI_smooth (rolling().apply with a closure)
+    prev_avg_gain = np.inf
+    prev_avg_loss = np.inf
+    rolling_count = 0
+
+    def calculate_RSI(series, period):
+        nonlocal prev_avg_gain
+        nonlocal prev_avg_loss
+        nonlocal rolling_count
+
+        curr_gains = series.where(series >= 0, 0)
+        curr_losses = np.abs(series.where(series < 0, 0))
+        avg_gain = curr_gains.sum() / period
+        avg_loss = curr_losses.sum() / period
+
+        if rolling_count == 0:
+            rsi = 100 - (100 / (1 + (avg_gain / avg_loss)))
+        else:
+            rsi = 100 - (100 / (1 + ((prev_avg_gain * (period - 1) + curr_gains.iloc[-1]) /
+                                     (prev_avg_loss * (period - 1) + curr_losses.iloc[-1]))))
+
+        rolling_count = rolling_count + 1
+        prev_avg_gain = avg_gain
+        prev_avg_loss = avg_loss
+        return rsi
+
+    diff = df['Close'].diff()[1:]
+    for i in window:
+        df['rsi_' + str(i)] = np.nan
+        rolling_count = 0
+        res = diff.rolling(i).apply(calculate_RSI, args=(i,), raw=False)
+        df.loc[df.index[1:], 'rsi_' + str(i)] = res.to_numpy()
+    return df
+
+
+def close_prices(gaps=()):
+    close = 100 + np.cumsum(np.random.default_rng(0).normal(0, 1, 300))
+    for start, stop in gaps:
+        close[start:stop] = np.nan
+    return close
+
+
+@pytest.mark.parametrize("gaps", [(), ((0, 4),), ((100, 103),), ((0, 2), (50, 51), (200, 230))],
+                         ids=['clean', 'leading_nan', 'mid_series_nan', 'several_gaps'])
+def test_rsi_smooth_matches_rolling_apply(gaps):
+    close = close_prices(gaps)
+    expected = get_RSI_smooth_rolling(pd.DataFrame({'Close': close}), WINDOWS)[[f'rsi_{i}' for i in WINDOWS]]
+
+    np.testing.assert_allclose(rsi_smooth(close, WINDOWS), expected.to_numpy(), rtol=1e-10, atol=1e-10)
+
+
+def test_rsi_smooth_short_series():
+    close = close_prices()[:10]
+    rsi = rsi_smooth(close, WINDOWS)
+
+    assert rsi.shape == (10, len(WINDOWS))
+    assert np.isnan(rsi[:, WINDOWS.index(11):]).all()
+    assert np.isnan(rsi[:3, 0]).all() and not np.isnan(rsi[3:, 0]).any()
+
+
+def get_indicators_reference(df, window):
+    # previous implementation of add_technical_indicators: ta, pandas rolling/ewm and pandas_ta.cmo
+    ta = pytest.importorskip('ta')
+    close, high, low, volume = df['Close'], df['High'], df['Low'], df['Volume']
+    columns = {}
+    for i in window:
+        columns[f"SMA_{i}"] = close.rolling(window=i).mean()
+        columns[f"EMA_{i}"] = close.ewm(span=i, adjust=False).mean()
+        columns[f"TRIX_{i}"] = ta.trend.TRIXIndicator(close, i).trix()
+        columns[f"money_flow_index_{i}"] = ta.volume.money_flow_index(high, low, close, volume, window=i)
+        highest_high = high.rolling(window=i).max()
+        lowest_low = low.rolling(window=i).min()
+        columns[f"williams_r_{i}"] = ((highest_high - close) / (highest_high - lowest_low)) * (-100)
+        columns[f"wma_{i}"] = ta.trend.WMAIndicator(close, i).wma()
+        diff = 2 * close.rolling(window=int(i / 2)).mean() - close.rolling(window=i).mean()
+        columns[f"hma_{i}"] = diff.rolling(window=int(np.sqrt(i))).mean()
+        columns[f"cci_{i}"] = ta.trend.CCIIndicator(high, low, close, i).cci()
+        # pandas_ta.cmo (0.3.14b0, without talib): Wilder's moving average of the gains and losses
+        momentum = close.diff()
+        positive = momentum.clip(lower=0).ewm(alpha=1.0 / i, min_periods=i).mean()
+        negative = momentum.clip(upper=0).abs().ewm(alpha=1.0 / i, min_periods=i).mean()
+        columns[f"cmo_{i}"] = 100 * (positive - negative) / (positive + negative)
+        columns[f"ROC_{i}"] = ta.momentum.ROCIndicator(close, i).roc()
+        columns[f"cmf_{i}"] = ta.volume.ChaikinMoneyFlowIndicator(high, low, close, volume, i).chaikin_money_flow()
+        adx = ta.trend.ADXIndicator(high, low, close, i)
+        columns[f"adx_{i}"], columns[f"adx_pos_{i}"], columns[f"adx_neg_{i}"] = adx.adx(), adx.adx_pos(), adx.adx_neg()
+        columns[f"atr_{i}"] = ta.volatility.AverageTrueRange(high, low, close, i).average_true_range()
+        bb = ta.volatility.BollingerBands(close, window=i, window_dev=2)
+        columns[f"bb_bbm_{i}"], columns[f"bb_bbh_{i}"], columns[f"bb_bbl_{i}"] = \
+            bb.bollinger_mavg(), bb.bollinger_hband(), bb.bollinger_lband()
+    macd = ta.trend.MACD(close)
+    columns['MACD'], columns['MACD_Signal'], columns['MACD_Diff'] = macd.macd(), macd.macd_signal(), macd.macd_diff()
+    ppo = ta.momentum.PercentagePriceOscillator(close)
+    columns['PPO'], columns['PPO_Histogram'], columns['PPO_Signal'] = ppo.ppo(), ppo.ppo_hist(), ppo.ppo_signal()
+    rsi = get_RSI_smooth_rolling(df[['Close']].copy(), window)
+    columns.update({f'rsi_{i}': rsi[f'rsi_{i}'] for i in window})
+    return pd.DataFrame(columns)[indicator_columns(window)]
+
+
+def ohlcv_prices(case, n=400):
+    rng = np.random.default_rng(7)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    spread = np.abs(rng.normal(0, 1, n))
+    open = close + rng.normal(0, 0.5, n)
+    df = pd.DataFrame({'Open': open, 'High': np.maximum(open, close) + spread, 'Low': np.minimum(open, close) - spread,
+                       'Close': close, 'Volume': rng.integers(1000, 100000, n).astype(float)})
+    if case in ('flat', 'all'):
+        df.loc[150:170, ['Open', 'High', 'Low', 'Close']] = 100.0  # high == low, no price changes
+    if case in ('leading_nan', 'all'):
+        df.loc[:4, OHLCV_COLUMNS] = np.nan
+    if case in ('mid_series_nan', 'all'):
+        df.loc[250:253, OHLCV_COLUMNS] = np.nan
+    return df
+
+
+FAMILIES = ['SMA', 'EMA', 'TRIX', 'money_flow_index', 'rsi', 'williams_r', 'wma', 'hma', 'cci', 'cmo', 'MACD', 'PPO',
+            'ROC', 'cmf', 'adx', 'atr', 'bb']
+# pandas >= 3 weights the first value after NaN differently in ewm(adjust=False) (requirements.txt: pandas 2.2.1)
+ADJUST_FALSE_EWM = {'EMA', 'TRIX', 'MACD', 'PPO'}
+
+
+@pytest.fixture(scope='module')
+def engine_and_reference():
+    results = {}
+    for case in ('clean', 'flat', 'leading_nan', 'mid_series_nan', 'all'):
+        df = ohlcv_prices(case)
+        engine = pd.DataFrame(compute_indicators(df[OHLCV_COLUMNS].to_numpy(), ENGINE_WINDOWS),
+                              columns=indicator_columns(ENGINE_WINDOWS))
+        results[case] = engine, get_indicators_reference(df, ENGINE_WINDOWS)
+    return results
+
+
+@pytest.mark.parametrize("family", FAMILIES)
+@pytest.mark.parametrize("case", ['clean', 'flat', 'leading_nan', 'mid_series_nan', 'all'])
+def test_compute_indicators_matches_reference(engine_and_reference, case, family):
+    if family in ADJUST_FALSE_EWM and case in ('mid_series_nan', 'all') and int(pd.__version__.split('.')[0]) >= 3:
+        pytest.skip("pandas >= 3 changed ewm(adjust=False) after NaN")
+    engine, reference = engine_and_reference[case]
+    columns = [column for column in reference.columns if column.startswith(family)]
+
+    np.testing.assert_allclose(engine[columns].to_numpy(), reference[columns].to_numpy(), rtol=1e-6, atol=1e-6)
@@ -1,79 +1,289 @@
 import requests
 from bs4 import BeautifulSoup
-from urllib.parse import urlparse
+from urllib.parse import urlparse, unquote
 import re
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import pandas as pd
 
+# same rate limiter as the price downloads
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Gui'))
+from bulk_download import RateLimiter
 
-def get_archive_urls_timestamps(site_url, start_date, end_date):
-    # Extract the base URL
-    base_url = urlparse(site_url).netloc
-    
-    # Fetch the archive page for the website
-    archive_url = f"https://web.archive.org/cdx/search/cdx?url={base_url}&output=json"
-    response = requests.get(archive_url)
-    
-    # Parse the JSON response to get the archive URLs
-    if response.status_code == 200:
-        data = response.json()
-        
-        # Remove the header row
-        data = data[1:]
-
-        wayback_timestamps = []
-
-        for row in data:
-            timestamp = row[1]
-
-            if int(timestamp) > int(start_date) and int(timestamp) < int(end_date):
-                wayback_timestamps.append(timestamp)
-        
-        if wayback_timestamps:
-            return wayback_timestamps
-        else:
-            print("No Wayback timestamps in specified period")
-            return []
 
+SP500_URL = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
+CACHE_FOLDER = 'wayback_cache'
+
+
+class WaybackSource:
+    """
+    Lädt die CDX-Liste einer Seite und archivierte Seiten von web.archive.org.
+
+    Parameter:
+    - record: Ordner, in dem jede Antwort gespeichert wird (cdx.json, {timestamp}.html), abspielbar mit FixtureSource
+    """
+
+    def __init__(self, record=None, timeout=60):
+        self.record = record
+        self.timeout = timeout
+
+    def cdx(self, site_url):
+        # captures of the page itself (not of the whole domain): [timestamp, statuscode, digest] per row
+        parsed = urlparse(site_url)
+        params = {'url': unquote(parsed.netloc + parsed.path), 'output': 'json', 'fl': 'timestamp,statuscode,digest'}
+        response = requests.get("https://web.archive.org/cdx/search/cdx", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        rows = response.json()[1:]  # Remove the header row
+        self.save('cdx.json', json.dumps(rows))
+        return rows
+
+    def html(self, timestamp, site_url):
+        response = requests.get(f'https://web.archive.org/web/{timestamp}/{site_url}', timeout=self.timeout)
+        response.raise_for_status()
+        self.save(f'{timestamp}.html', response.text)
+        return response.text
+
+    def save(self, file_name, text):
+        if self.record:
+            os.makedirs(self.record, exist_ok=True)
+            with open(os.path.join(self.record, file_name), 'w', encoding='utf-8') as file:
+                file.write(text)
+
+
+class FixtureSource:
+    """
+    Spielt mit WaybackSource(record=ordner) aufgenommene Antworten aus dem Ordner ab (offline, z.B. für Tests).
+    Gleiche Schnittstelle wie WaybackSource; fehlende Snapshots sind ein FileNotFoundError.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def cdx(self, site_url):
+        with open(os.path.join(self.folder, 'cdx.json'), encoding='utf-8') as file:
+            return json.load(file)
+
+    def html(self, timestamp, site_url):
+        with open(os.path.join(self.folder, f'{timestamp}.html'), encoding='utf-8') as file:
+            return file.read()
+
+
+def flat_columns(table):
+    # ('Added', 'Ticker') -> 'Added Ticker', ('Date', 'Date') -> 'Date' (same names when read back from csv)
+    if isinstance(table.columns, pd.MultiIndex):
+        table = table.set_axis([' '.join(dict.fromkeys(str(part) for part in column)) for column in table.columns], axis=1)
+    return table
+
+
+class SnapshotCache:
+    """
+    Cache für die Wayback Snapshots einer Seite: CDX-Liste und geparste Tabellen liegen auf der Festplatte
+    ({folder}/cdx_<seite>.json, {folder}/<timestamp>/table_0.csv, table_1.csv). Jeder Snapshot wird nur
+    einmal geladen und mit pd.read_html geparst, spätere Läufe lesen nur noch die CSV-Dateien.
+
+    Parameter:
+    - source: WaybackSource (Standard) oder FixtureSource(ordner) für Offline-Läufe
+    - offline: nur der Cache, fehlende Einträge sind ein FileNotFoundError
+    - rate: maximale Anzahl Anfragen pro Sekunde an die Quelle (None = kein Limit), gilt für alle Threads
+    """
+
+    TABLES = 2  # [0] = companies in the S&P500, [1] = selected changes to the list
+
+    def __init__(self, folder=CACHE_FOLDER, source=None, offline=False, rate=None):
+        self.folder = folder
+        self.source = source if source is not None else WaybackSource()
+        self.offline = offline
+        self.limiter = RateLimiter(rate)
+
+    def listing(self, site_url=SP500_URL, until=None):
+        """
+        Rückgabewert:
+        - rows: CDX-Liste [timestamp, statuscode, digest], neu geladen falls until (yyyymmddhhmmss)
+          nach dem Ladezeitpunkt der gespeicherten Liste liegt
+        """
+        path = os.path.join(self.folder, f"cdx_{re.sub(r'[^A-Za-z0-9]+', '_', site_url)}.json")
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as file:
+                cached = json.load(file)
+            if self.offline or until is None or int(until) <= int(cached['fetched']):
+                return cached['rows']
+        if self.offline:
+            raise FileNotFoundError(f"no CDX listing for {site_url} in {self.folder}")
+
+        self.limiter.wait()
+        rows = self.source.cdx(site_url)
+        os.makedirs(self.folder, exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump({'site_url': site_url, 'fetched': time.strftime('%Y%m%d%H%M%S', time.gmtime()), 'rows': rows}, file)
+        os.replace(path + '.tmp', path)
+        return rows
+
+    def timestamps(self, start_date, end_date, site_url=SP500_URL):
+        """
+        Timestamps der erfolgreichen Captures (Status 200) mit start_date < timestamp < end_date, aufsteigend.
+        Captures mit demselben Inhalt (digest) wie der vorherige werden übersprungen: gleiche Seite, gleiche Liste.
+        """
+        timestamps = []
+        previous_digest = None
+        for timestamp, status, digest in sorted(self.listing(site_url, until=end_date)):
+            if status != '200' or not int(start_date) < int(timestamp) < int(end_date) or digest == previous_digest:
+                continue
+            previous_digest = digest
+            timestamps.append(timestamp)
+        return timestamps
+
+    def tables(self, timestamp, site_url=SP500_URL):
+        """
+        Rückgabewert:
+        - Liste der Tabellen des Snapshots ([0] = Unternehmen, [1] = Änderungen), Spalten ohne MultiIndex
+        """
+        folder = os.path.join(self.folder, timestamp)
+        if not os.path.exists(folder):
+            if self.offline:
+                raise FileNotFoundError(f"snapshot {timestamp} not in {self.folder}")
+            self.limiter.wait()
+            tables = pd.read_html(io.StringIO(self.source.html(timestamp, site_url)))[:self.TABLES]
+
+            # written to a temporary folder first, an interrupted run never leaves half a snapshot
+            tmp_folder = f'{folder}.{threading.get_ident()}.tmp'
+            os.makedirs(tmp_folder, exist_ok=True)
+            for i, table in enumerate(tables):
+                flat_columns(table).to_csv(os.path.join(tmp_folder, f'table_{i}.csv'), index=False)
+            try:
+                os.replace(tmp_folder, folder)
+            except OSError:  # saved by another thread in the meantime
+                shutil.rmtree(tmp_folder, ignore_errors=True)
+
+        # read back from csv in every case: cached and fresh snapshots look the same (text columns)
+        count = len([name for name in os.listdir(folder) if name.startswith('table_')])
+        return [pd.read_csv(os.path.join(folder, f'table_{i}.csv'), dtype=str, keep_default_na=False, na_values=[''])
+                for i in range(count)]
+
+
+def fetch_snapshots(timestamps, cache=None, workers=8, retries=3, backoff=1.0):
+    """
+    Lädt und parst viele Snapshots gleichzeitig (ThreadPoolExecutor mit höchstens workers Anfragen,
+    Rate-Limit des Caches). Snapshots im Cache kosten keine Anfrage.
+
+    Rückgabewert:
+    - tables: Dictionary timestamp -> Tabellen (siehe SnapshotCache.tables), in der Reihenfolge von timestamps
+    - failed: Dictionary timestamp -> Fehlermeldung
+    """
+    cache = cache if cache is not None else SnapshotCache()
+
+    def fetch(timestamp):
+        problem = None
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(backoff * 2 ** (attempt - 1))
+            try:
+                return cache.tables(timestamp)
+            except FileNotFoundError:
+                raise  # not in the cache or fixture, a retry does not help
+            except Exception as error:
+                problem = f'{type(error).__name__}: {error}'
+        raise RuntimeError(f'{problem} (after {retries + 1} attempts)')
+
+    timestamps = list(dict.fromkeys(timestamps))
+    tables, failed = {}, {}
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {executor.submit(fetch, timestamp): timestamp for timestamp in timestamps}
+        for future in as_completed(futures):
+            timestamp = futures[future]
+            try:
+                tables[timestamp] = future.result()
+            except Exception as error:
+                failed[timestamp] = str(error)
+                print(f"Snapshot {timestamp} failed: {error}")
+    print(f"Snapshots: {len(tables)} ok | {len(failed)} failed")
+    return {timestamp: tables[timestamp] for timestamp in timestamps if timestamp in tables}, failed
+
+
+def get_archive_urls_timestamps(site_url, start_date, end_date, cache=None):
+    # Timestamps of the archived page in the period, from the (cached) CDX listing
+    cache = cache if cache is not None else SnapshotCache()
+    try:
+        wayback_timestamps = cache.timestamps(start_date, end_date, site_url)
+    except (requests.RequestException, ValueError) as error:
+        print("Failed to fetch archive URLs:", error)
+        return []
+
+    if wayback_timestamps:
+        return wayback_timestamps
     else:
-        print("Failed to fetch archive URLs")
+        print("No Wayback timestamps in specified period")
         return []
 
 
-def getHTMLdocument(url): 
+def getHTMLdocument(url):
     response = requests.get(url)  # request for HTML document of given url
-    return response.text 
+    return response.text
+
+
+def get_sp500_tables(timestamp, cache=None):
+    # Tables of the archived page: [0] = companies in the S&P500, [1] = selected changes to the list
+    cache = cache if cache is not None else SnapshotCache()
+    return cache.tables(timestamp)
 
 
-def get_sp500_companies_table(timestamp):
+def get_sp500_companies_table(timestamp, cache=None):
     # Scrape tickers contained in S&P500 at given timestamp
-    html_document = getHTMLdocument(f'https://web.archive.org/web/{timestamp}/https://en.wikipedia.org/wiki/List_of_S%26P_500_companies')
-    tickers = pd.read_html(html_document)[0]
+    tickers = get_sp500_tables(timestamp, cache)[0]
 
     return tickers
 
 
+def snapshot_cache(folder=CACHE_FOLDER, fixtures=None, record=None, offline=False, rate=2.0):
+    """
+    SnapshotCache für die Kommandozeile: fixtures = aufgenommene Antworten abspielen (offline, ohne Rate-Limit),
+    record = Antworten von web.archive.org zusätzlich als Fixtures speichern.
+    """
+    if fixtures:
+        return SnapshotCache(folder, FixtureSource(fixtures), offline)
+    return SnapshotCache(folder, WaybackSource(record), offline, rate)
+
+
 if __name__ == "__main__":
-    timestamps_sets = []
+    parser = argparse.ArgumentParser(description="Symbols present in the S&P500 list at the start of several periods.")
+    parser.add_argument("--cache", default=CACHE_FOLDER, help=f"folder for the CDX listing and parsed snapshots (default: {CACHE_FOLDER})")
+    parser.add_argument("--fixtures", default=None, help="replay recorded responses from this folder instead of web.archive.org")
+    parser.add_argument("--record", default=None, help="also save the responses of web.archive.org to this folder")
+    parser.add_argument("--offline", action='store_true', help="only use the cache")
+    parser.add_argument("--workers", type=int, default=8, help="parallel snapshot downloads (default: 8)")
+    parser.add_argument("--rate", type=float, default=2.0, help="maximum requests per second to web.archive.org (default: 2, 0 = no limit)")
+    args = parser.parse_args()
+    cache = snapshot_cache(args.cache, args.fixtures, args.record, args.offline, args.rate)
+
+    first_timestamps = []
     for i in [('20230101000000', '20231231000000'), ('20230401000000', '20231231000000'), ('20230601000000', '20231231000000'), ('20230801000000', '20231231000000'), ('20231201000000', '20231231000000')]:
         start_date = i[0]  # Timestamp Format: yyyymmddhhmmss
         end_date = i[1]  # Timestamp Format: yyyymmddhhmmss
         site_url = "https://en.wikipedia.org/wiki/List_of_S%26P_500_companies"
-        timestamps = get_archive_urls_timestamps(site_url, start_date, end_date)
-        
+        timestamps = get_archive_urls_timestamps(site_url, start_date, end_date, cache)
+
         print(f"\nScraped {len(timestamps)} timestamps from web archive..")
-        print(f"First Timestamp: {timestamps[0]} | Last Timestamp: {timestamps[-1]}")
+        if timestamps:
+            print(f"First Timestamp: {timestamps[0]} | Last Timestamp: {timestamps[-1]}")
+            first_timestamps.append(timestamps[0])
 
-        tickers = get_sp500_companies_table(timestamps[0])
-        symbols = set(tickers['Symbol'].tolist())  # Convert to set for faster operations
-        timestamps_sets.append(symbols)  # Store symbols for this timestamp
+    # all snapshots at once (the CDX listing is fetched only once, see SnapshotCache)
+    snapshots, failed = fetch_snapshots(first_timestamps, cache, workers=args.workers)
+    timestamps_sets = [set(tables[0]['Symbol'].tolist()) for tables in snapshots.values()]  # Store symbols for each timestamp
 
     if timestamps_sets:  # Check if there are any timestamps
         timestamps_common_symbols = set.intersection(*timestamps_sets)  # Find common symbols
-        
+
         if timestamps_common_symbols:
             print("\nSymbols present in all timestamps:")
             print(timestamps_common_symbols)
         else:
             print("\nNo common symbols found.")
     else:
-        print("No timestamps available.")
\ No newline at end of file
+        print("No timestamps available.")